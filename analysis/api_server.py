@@ -0,0 +1,463 @@
+#!/usr/bin/env python3
+"""
+Analysis JSON API
+Asyncio HTTP service that answers parameterized sales queries and the named SQL reports from a pool of
+read-only connections, with a TTL result cache, ETag/304 responses and coalescing of identical requests
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import statistics
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from datetime import date
+from email.utils import formatdate
+from pathlib import Path
+from urllib.parse import parse_qsl, urlsplit
+import pandas as pd
+from execute_sql_analysis import SQL_QUERIES, QUERY_TIMEOUT_SECONDS, PROGRESS_OPCODES
+from date_keys import DATE_KEY_QUERIES, has_date_keys
+
+DB_PATH = '/home/ubuntu/fmcg-healthcare-portfolio/data/fmcg_healthcare.db'
+
+HOST, PORT = '127.0.0.1', 8000
+POOL_SIZE = min(8, os.cpu_count() or 4)
+CACHE_TTL_SECONDS = 300
+MAX_CACHE_ENTRIES = 256
+MAX_LIMIT = 1000
+MAX_REQUEST_BYTES = 16_384
+KEEP_ALIVE_SECONDS = 15
+
+# Optional query-string filters: name -> (SQL condition, parser)
+FILTERS = {
+    'start': ("s.sale_date >= ?", lambda v: date.fromisoformat(v).isoformat()),
+    'end': ("s.sale_date <= ?", lambda v: date.fromisoformat(v).isoformat()),
+    'category': ("p.category = ?", str),
+    'state': ("r.state = ?", str),
+    'retailer_type': ("r.retailer_type = ?", str),
+}
+
+# Ranking measures for the top-N endpoints (whitelisted ORDER BY columns)
+MEASURES = {'revenue': 'revenue', 'units': 'units_sold', 'transactions': 'transactions'}
+
+SALES_FROM = """
+FROM sales s
+JOIN products p ON s.product_id = p.product_id
+JOIN retailers r ON s.retailer_id = r.retailer_id
+"""
+
+# Parameterized endpoints mirroring the FMCGAnalyzer analyses
+ENDPOINTS = {
+    '/api/sales/by-category': {
+        'sql': """
+            SELECT p.category,
+                   COUNT(s.sale_id) as transactions,
+                   SUM(s.quantity_sold) as units_sold,
+                   SUM(s.total_amount) as revenue,
+                   ROUND(AVG(s.total_amount), 2) as avg_order_value
+            {from_} {where}
+            GROUP BY p.category
+            ORDER BY revenue DESC
+        """,
+        'filters': ['start', 'end', 'state', 'retailer_type'],
+    },
+    '/api/sales/monthly': {
+        'sql': """
+            SELECT strftime('%Y-%m', s.sale_date) as month,
+                   COUNT(s.sale_id) as transactions,
+                   SUM(s.quantity_sold) as units_sold,
+                   SUM(s.total_amount) as revenue,
+                   ROUND(AVG(s.total_amount), 2) as avg_order_value
+            {from_} {where}
+            GROUP BY month
+            ORDER BY month
+        """,
+        'filters': ['start', 'end', 'category', 'state', 'retailer_type'],
+    },
+    '/api/products/top': {
+        'sql': """
+            SELECT p.product_id, p.product_name, p.category,
+                   COUNT(s.sale_id) as transactions,
+                   SUM(s.quantity_sold) as units_sold,
+                   SUM(s.total_amount) as revenue,
+                   ROUND(AVG(s.total_amount), 2) as avg_order_value
+            {from_} {where}
+            GROUP BY p.product_id
+            ORDER BY {measure} DESC
+            LIMIT ?
+        """,
+        'filters': ['start', 'end', 'category', 'state', 'retailer_type'],
+        'top': 10,
+    },
+    '/api/retailers/top': {
+        'sql': """
+            SELECT r.retailer_id, r.retailer_name, r.retailer_type, r.city, r.state,
+                   COUNT(s.sale_id) as transactions,
+                   SUM(s.quantity_sold) as units_sold,
+                   SUM(s.total_amount) as revenue,
+                   ROUND(AVG(s.total_amount), 2) as avg_order_value,
+                   COUNT(DISTINCT s.product_id) as product_variety
+            {from_} {where}
+            GROUP BY r.retailer_id
+            ORDER BY {measure} DESC
+            LIMIT ?
+        """,
+        'filters': ['start', 'end', 'category', 'state', 'retailer_type'],
+        'top': 15,
+    },
+    '/api/regions': {
+        'sql': """
+            SELECT r.state,
+                   COUNT(DISTINCT r.retailer_id) as retailer_count,
+                   COUNT(s.sale_id) as transactions,
+                   SUM(s.total_amount) as revenue,
+                   ROUND(SUM(s.total_amount) / COUNT(DISTINCT r.retailer_id), 2) as revenue_per_retailer
+            {from_} {where}
+            GROUP BY r.state
+            ORDER BY revenue DESC
+        """,
+        'filters': ['start', 'end', 'category', 'retailer_type'],
+    },
+}
+
+REPORT_QUERIES = {name: sql for _, queries in SQL_QUERIES for name, sql in queries}
+
+class BadRequest(ValueError):
+    pass
+
+def build_query(path, params):
+    """SQL and bound parameters for a parameterized endpoint, validating the query string"""
+    spec = ENDPOINTS[path]
+    allowed = set(spec['filters']) | ({'limit', 'measure'} if 'top' in spec else set())
+    unknown = set(params) - allowed
+    if unknown:
+        raise BadRequest(f"unknown parameter(s): {', '.join(sorted(unknown))}")
+    conditions, args = [], []
+    for name in spec['filters']:
+        if name in params:
+            condition, parse = FILTERS[name]
+            try:
+                args.append(parse(params[name]))
+            except ValueError:
+                raise BadRequest(f"invalid {name}: {params[name]!r}")
+            conditions.append(condition)
+    measure = 'revenue'
+    if 'top' in spec:
+        measure = params.get('measure', 'revenue')
+        if measure not in MEASURES:
+            raise BadRequest(f"measure must be one of {', '.join(MEASURES)}")
+        try:
+            limit = int(params.get('limit', spec['top']))
+        except ValueError:
+            raise BadRequest("limit must be an integer")
+        if not 1 <= limit <= MAX_LIMIT:
+            raise BadRequest(f"limit must be between 1 and {MAX_LIMIT}")
+        args.append(limit)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+    return spec['sql'].format(from_=SALES_FROM, where=where, measure=MEASURES[measure]), args
+
+def data_version(db_path):
+    """Changes whenever the database file or its WAL is written"""
+    version = []
+    for path in (Path(db_path), Path(f'{db_path}-wal')):
+        if path.exists():
+            stat = path.stat()
+            version += [stat.st_size, stat.st_mtime_ns]
+    return tuple(version)
+
+class ReadOnlyPool:
+    """Fixed set of read-only connections, each used by one worker thread at a time"""
+    
+    def __init__(self, db_path, size=POOL_SIZE, timeout=QUERY_TIMEOUT_SECONDS):
+        self.db_path = db_path
+        self.timeout = timeout
+        self.executor = ThreadPoolExecutor(max_workers=size, thread_name_prefix='sqlite-ro')
+        self.idle = asyncio.Queue()
+        self._deadlines = {}
+        for _ in range(size):
+            conn = sqlite3.connect(f'file:{Path(db_path).resolve()}?mode=ro', uri=True, check_same_thread=False)
+            conn.execute("PRAGMA query_only = ON")
+            conn.set_progress_handler(self._progress(conn), PROGRESS_OPCODES)
+            self.idle.put_nowait(conn)
+        self.date_keys = has_date_keys(self.idle._queue[0])
+    
+    def _progress(self, conn):
+        def handler():
+            deadline = self._deadlines.get(id(conn))
+            return deadline is not None and time.monotonic() > deadline
+        return handler
+    
+    @asynccontextmanager
+    async def connection(self):
+        conn = await self.idle.get()
+        try:
+            yield conn
+        finally:
+            self.idle.put_nowait(conn)
+    
+    def _read(self, conn, sql, args):
+        self._deadlines[id(conn)] = time.monotonic() + self.timeout if self.timeout else None
+        try:
+            cursor = conn.execute(sql, args)
+            columns = [d[0] for d in cursor.description]
+            return pd.DataFrame.from_records(cursor.fetchall(), columns=columns, coerce_float=True)
+        finally:
+            self._deadlines[id(conn)] = None
+    
+    async def query(self, sql, args=()):
+        async with self.connection() as conn:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, self._read, conn, sql, args)
+    
+    def close(self):
+        while not self.idle.empty():
+            self.idle.get_nowait().close()
+        self.executor.shutdown(wait=False)
+
+class ResultCache:
+    """LRU of encoded responses with a TTL, keyed by request and invalidated when the data changes"""
+    
+    def __init__(self, ttl=CACHE_TTL_SECONDS, max_entries=MAX_CACHE_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.inflight = {}
+        self.stats = {'hits': 0, 'misses': 0, 'coalesced': 0}
+    
+    async def get(self, key, version, compute):
+        """Cached (etag, body), computing it once even when identical requests arrive together"""
+        entry = self.entries.get(key)
+        if entry and entry['version'] == version and entry['expires'] > time.monotonic():
+            self.entries.move_to_end(key)
+            self.stats['hits'] += 1
+            return entry
+        if key in self.inflight:
+            self.stats['coalesced'] += 1
+            return await asyncio.shield(self.inflight[key])
+        
+        self.stats['misses'] += 1
+        future = asyncio.get_running_loop().create_future()
+        self.inflight[key] = future
+        try:
+            body = await compute()
+            entry = {'etag': f'"{hashlib.sha1(body).hexdigest()[:20]}"', 'body': body, 'version': version,
+                     'expires': time.monotonic() + self.ttl}
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+            future.set_result(entry)
+            return entry
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # waiters re-raise it; mark it retrieved for the no-waiter case
+            raise
+        finally:
+            del self.inflight[key]
+
+def _encode(df, extra=None):
+    payload = {'columns': list(df.columns), 'rows': len(df)}
+    payload.update(extra or {})
+    # json.dumps keeps shortest-repr floats (to_json rounds to 10 significant places)
+    payload['data'] = df.astype(object).where(df.notna(), None).to_dict(orient='records')
+    return json.dumps(payload, separators=(',', ':'), default=str).encode()
+
+class AnalysisAPI:
+    def __init__(self, db_path=DB_PATH, pool_size=POOL_SIZE, ttl=CACHE_TTL_SECONDS):
+        self.db_path = db_path
+        self.pool = ReadOnlyPool(db_path, pool_size)
+        self.cache = ResultCache(ttl)
+    
+    async def resolve(self, path, params):
+        """(status, etag, body) for a GET request"""
+        version = data_version(self.db_path)
+        key = (path, tuple(sorted(params.items())))
+        if path == '/api/health':
+            return 200, None, json.dumps({'status': 'ok', 'cache': self.cache.stats,
+                                          'cached_entries': len(self.cache.entries)}).encode()
+        if path == '/api/reports':
+            return 200, None, json.dumps({'reports': list(REPORT_QUERIES)}).encode()
+        if path.startswith('/api/reports/'):
+            name = path[len('/api/reports/'):]
+            if name not in REPORT_QUERIES:
+                return 404, None, json.dumps({'error': f'unknown report {name}'}).encode()
+            if params:
+                raise BadRequest("named reports take no parameters")
+            sql = DATE_KEY_QUERIES[name] if self.pool.date_keys and name in DATE_KEY_QUERIES \
+                else REPORT_QUERIES[name]
+            args = ()
+        elif path in ENDPOINTS:
+            sql, args = build_query(path, params)
+        else:
+            return 404, None, json.dumps({'error': f'no endpoint {path}'}).encode()
+        
+        async def compute():
+            df = await self.pool.query(sql, args)
+            return _encode(df, {'endpoint': path, 'params': params})
+        
+        entry = await self.cache.get(key, version, compute)
+        return 200, entry['etag'], entry['body']
+    
+    async def handle(self, reader, writer):
+        """Serve HTTP/1.1 requests on one connection (GET and HEAD, keep-alive)"""
+        try:
+            while True:
+                try:
+                    head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), KEEP_ALIVE_SECONDS)
+                except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError):
+                    break
+                except asyncio.LimitOverrunError:
+                    await self._send(writer, 431, None, b'{"error":"headers too large"}', False)
+                    break
+                lines = head.decode('latin-1').split('\r\n')
+                try:
+                    method, target, version = lines[0].split(' ')
+                except ValueError:
+                    await self._send(writer, 400, None, b'{"error":"malformed request line"}', False)
+                    break
+                headers = {k.strip().lower(): v.strip() for k, _, v in (l.partition(':') for l in lines[1:] if l)}
+                keep_alive = headers.get('connection', '').lower() != 'close' and version == 'HTTP/1.1'
+                
+                if method not in ('GET', 'HEAD'):
+                    await self._send(writer, 405, None, b'{"error":"method not allowed"}', keep_alive)
+                    continue
+                url = urlsplit(target)
+                params = dict(parse_qsl(url.query))
+                try:
+                    status, etag, body = await self.resolve(url.path.rstrip('/') or '/', params)
+                except BadRequest as e:
+                    status, etag, body = 400, None, json.dumps({'error': str(e)}).encode()
+                except sqlite3.OperationalError as e:
+                    status, etag, body = 504 if 'interrupted' in str(e) else 500, None, \
+                        json.dumps({'error': str(e)}).encode()
+                if etag and etag in [t.strip() for t in headers.get('if-none-match', '').split(',')]:
+                    status, body = 304, b''
+                await self._send(writer, status, etag, b'' if method == 'HEAD' else body, keep_alive,
+                                 len(body))
+                if not keep_alive:
+                    break
+        finally:
+            writer.close()
+    
+    @staticmethod
+    async def _send(writer, status, etag, body, keep_alive, length=None):
+        reasons = {200: 'OK', 304: 'Not Modified', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+                   431: 'Request Header Fields Too Large', 500: 'Internal Server Error', 504: 'Gateway Timeout'}
+        headers = [f'HTTP/1.1 {status} {reasons.get(status, "")}', f'Date: {formatdate(usegmt=True)}',
+                   'Access-Control-Allow-Origin: *', f'Connection: {"keep-alive" if keep_alive else "close"}',
+                   f'Cache-Control: max-age=0, must-revalidate']
+        if status != 304:
+            headers += ['Content-Type: application/json', f'Content-Length: {len(body) if length is None else length}']
+        if etag:
+            headers.append(f'ETag: {etag}')
+        writer.write(('\r\n'.join(headers) + '\r\n\r\n').encode('latin-1') + body)
+        await writer.drain()
+    
+    async def serve(self, host=HOST, port=PORT):
+        return await asyncio.start_server(self.handle, host, port, limit=MAX_REQUEST_BYTES)
+    
+    def close(self):
+        self.pool.close()
+
+# ----------------------------------------------------------------------------
+# Latency benchmark
+# ----------------------------------------------------------------------------
+
+async def _request(host, port, target, etag=None):
+    reader, writer = await asyncio.open_connection(host, port)
+    extra = f'If-None-Match: {etag}\r\n' if etag else ''
+    writer.write(f'GET {target} HTTP/1.1\r\nHost: {host}\r\nConnection: close\r\n{extra}\r\n'.encode())
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    head, _, body = response.partition(b'\r\n\r\n')
+    lines = head.decode('latin-1').split('\r\n')
+    headers = {k.strip().lower(): v.strip() for k, _, v in (l.partition(':') for l in lines[1:])}
+    return int(lines[0].split(' ')[1]), headers.get('etag'), body
+
+def _percentiles(samples):
+    ordered = sorted(samples)
+    pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000
+    return {'p50_ms': round(pick(0.50), 2), 'p95_ms': round(pick(0.95), 2), 'p99_ms': round(pick(0.99), 2),
+            'mean_ms': round(statistics.fmean(ordered) * 1000, 2)}
+
+async def benchmark(db_path=DB_PATH, requests=200, concurrency=16):
+    """Latency of cold (uncached), warm (cached), conditional (304) and burst (coalesced) requests"""
+    api = AnalysisAPI(db_path)
+    server = await api.serve(HOST, 0)
+    port = server.sockets[0].getsockname()[1]
+    targets = ['/api/sales/by-category', '/api/sales/monthly?category=Vitamins%20%26%20Supplements',
+               '/api/products/top?limit=10&measure=units', '/api/retailers/top?start=2024-01-01',
+               '/api/regions', '/api/reports/top_retailers']
+    limit = asyncio.Semaphore(concurrency)
+    
+    async def timed(target, etag=None):
+        async with limit:
+            start = time.perf_counter()
+            status, tag, _ = await _request(HOST, port, target, etag)
+            return time.perf_counter() - start, status, tag
+    
+    results = {}
+    try:
+        cold = [await timed(t) for t in targets]
+        results['cold'] = _percentiles([t for t, _, _ in cold])
+        etags = {t: tag for t, (_, _, tag) in zip(targets, cold)}
+        warm = await asyncio.gather(*(timed(targets[i % len(targets)]) for i in range(requests)))
+        results['warm'] = _percentiles([t for t, _, _ in warm])
+        conditional = await asyncio.gather(*(timed(t, etags[t]) for t in
+                                             (targets[i % len(targets)] for i in range(requests))))
+        results['not_modified'] = _percentiles([t for t, _, _ in conditional])
+        results['not_modified']['all_304'] = all(status == 304 for _, status, _ in conditional)
+        api.cache.entries.clear()
+        before = api.cache.stats['misses']
+        burst = await asyncio.gather(*(timed(targets[0]) for _ in range(concurrency)))
+        results['burst'] = _percentiles([t for t, _, _ in burst])
+        results['burst']['queries_run'] = api.cache.stats['misses'] - before
+    finally:
+        server.close()
+        await server.wait_closed()
+        api.close()
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve analysis results as a JSON API')
+    parser.add_argument('--db', default=DB_PATH)
+    parser.add_argument('--host', default=HOST)
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--pool-size', type=int, default=POOL_SIZE)
+    parser.add_argument('--ttl', type=float, default=CACHE_TTL_SECONDS, help='result cache lifetime in seconds')
+    parser.add_argument('--benchmark', action='store_true', help='measure request latency and exit')
+    parser.add_argument('--requests', type=int, default=200, help='requests per benchmark phase')
+    parser.add_argument('--concurrency', type=int, default=16)
+    args = parser.parse_args()
+    
+    if args.benchmark:
+        results = asyncio.run(benchmark(args.db, args.requests, args.concurrency))
+        print("API latency:")
+        for phase, stats in results.items():
+            print(f"  ✓ {phase:<13} " + ', '.join(f"{k} {v}" for k, v in stats.items()))
+        return
+    
+    async def run():
+        api = AnalysisAPI(args.db, args.pool_size, args.ttl)
+        server = await api.serve(args.host, args.port)
+        print(f"✓ Analysis API on http://{args.host}:{args.port}/api "
+              f"({args.pool_size} read-only connections, {args.ttl:.0f}s cache)")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            api.close()
+    
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        print("\n✓ Stopped")
+
+if __name__ == '__main__':
+    main()
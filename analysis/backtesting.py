@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+"""
+Rolling-Origin Backtesting
+Evaluates forecasters out of sample over rolling origins for revenue, category and product series
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import time
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from predictive_analytics import fit_arima_model, load_monthly_data, load_product_monthly_data, load_from_snapshot
+
+OUTPUT_DIR = Path('/home/ubuntu/fmcg-healthcare-portfolio/analysis')
+BACKTEST_DIR = OUTPUT_DIR / 'backtests'
+CACHE_DIR = BACKTEST_DIR / 'cache'
+
+DEFAULT_HORIZON = 3
+DEFAULT_MIN_TRAIN = 12
+SEASON_LENGTH = 12
+
+def arima_forecaster(train, horizon):
+    """ARIMA(1,1,1), the production model in predictive_analytics"""
+    model = fit_arima_model(train, order=(1, 1, 1))
+    if model is None:
+        return np.full(horizon, np.nan)
+    return np.asarray(model.get_forecast(steps=horizon).predicted_mean, dtype=float)
+
+def naive_forecaster(train, horizon):
+    """Repeat the last observation"""
+    return np.full(horizon, float(train[-1]))
+
+def seasonal_naive_forecaster(train, horizon):
+    """Repeat the value from one season earlier, falling back to naive"""
+    if len(train) < SEASON_LENGTH:
+        return naive_forecaster(train, horizon)
+    last_season = np.asarray(train[-SEASON_LENGTH:], dtype=float)
+    return np.resize(last_season, horizon)
+
+def mean_forecaster(train, horizon):
+    """Repeat the historical mean"""
+    return np.full(horizon, float(np.mean(train)))
+
+def drift_forecaster(train, horizon):
+    """Extend the line between the first and last observations"""
+    if len(train) < 2:
+        return naive_forecaster(train, horizon)
+    slope = (train[-1] - train[0]) / (len(train) - 1)
+    return train[-1] + slope * np.arange(1, horizon + 1)
+
+# Forecasters must be module-level functions so worker processes can unpickle them;
+# bump a version when a model changes so its cached folds are recomputed
+FORECASTERS = {
+    'arima': (arima_forecaster, 1),
+    'naive': (naive_forecaster, 1),
+    'seasonal_naive': (seasonal_naive_forecaster, 1),
+    'mean': (mean_forecaster, 1),
+    'drift': (drift_forecaster, 1),
+}
+
+def build_series(monthly_data, product_data, top_products=10):
+    """Collect the revenue, category revenue and top-product unit series to evaluate"""
+    months = pd.DatetimeIndex(monthly_data['month'])
+    series = {'revenue/total': monthly_data.set_index('month')['revenue'].reindex(months).fillna(0.0)}
+    
+    category_revenue = product_data.pivot_table(index='month', columns='category', values='revenue',
+                                                aggfunc='sum', observed=True)
+    for category in category_revenue.columns:
+        series[f'category/{category}'] = category_revenue[category].reindex(months).fillna(0.0)
+    
+    top = product_data.groupby('product_id')['units_sold'].sum().nlargest(top_products).index
+    product_units = product_data[product_data['product_id'].isin(top)] \
+        .pivot_table(index='month', columns='product_id', values='units_sold', aggfunc='sum')
+    for product_id in product_units.columns:
+        series[f'product/{product_id}'] = product_units[product_id].reindex(months).fillna(0.0)
+    
+    return {name: s.astype(float) for name, s in series.items()}
+
+def rolling_origins(n_obs, horizon, min_train, step=1):
+    """Return the training lengths of every fold with a full horizon of actuals"""
+    return list(range(min_train, n_obs - horizon + 1, step))
+
+def fold_key(model_name, train, horizon):
+    """Cache key for one fitted fold: model, model version, training data and horizon"""
+    _, version = FORECASTERS[model_name]
+    digest = hashlib.sha1(np.ascontiguousarray(train, dtype=np.float64).tobytes())
+    digest.update(f'{model_name}:{version}:{horizon}'.encode())
+    return digest.hexdigest()
+
+def _run_fold(task):
+    """Fit one model on one fold in a worker process"""
+    model_name, train, horizon = task
+    forecaster, _ = FORECASTERS[model_name]
+    start = time.process_time()
+    forecast = forecaster(train, horizon)
+    cpu_seconds = time.process_time() - start
+    return {'forecast': [float(v) for v in forecast], 'cpu_seconds': cpu_seconds}
+
+class Backtester:
+    def __init__(self, series, models=None, horizon=DEFAULT_HORIZON, min_train=DEFAULT_MIN_TRAIN,
+                 step=1, workers=None, cache_dir=CACHE_DIR):
+        self.series = series
+        self.models = models or list(FORECASTERS)
+        self.horizon = horizon
+        self.min_train = min_train
+        self.step = step
+        self.workers = workers or os.cpu_count()
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        self.cache_hits = 0
+    
+    def _cache_path(self, key):
+        return self.cache_dir / key[:2] / f'{key}.json'
+    
+    def _read_cache(self, key):
+        if self.cache_dir is None:
+            return None
+        path = self._cache_path(key)
+        if not path.exists():
+            return None
+        with open(path) as f:
+            return json.load(f)
+    
+    def _write_cache(self, key, result):
+        if self.cache_dir is None:
+            return
+        path = self._cache_path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix('.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(result, f)
+        tmp_path.replace(path)
+    
+    def plan(self):
+        """List every (series, model, origin) fold with its training window and actuals"""
+        folds = []
+        for series_name, values in self.series.items():
+            y = values.to_numpy()
+            for origin in rolling_origins(len(y), self.horizon, self.min_train, self.step):
+                for model_name in self.models:
+                    folds.append({
+                        'series': series_name,
+                        'model': model_name,
+                        'origin': values.index[origin - 1],
+                        'train': y[:origin],
+                        'actual': y[origin:origin + self.horizon],
+                    })
+        return folds
+    
+    def run(self):
+        """Fit every fold, reusing cached folds, and return one row per forecast step"""
+        folds = self.plan()
+        keys = [fold_key(f['model'], f['train'], self.horizon) for f in folds]
+        results = [self._read_cache(key) for key in keys]
+        pending = [i for i, result in enumerate(results) if result is None]
+        self.cache_hits = len(folds) - len(pending)
+        
+        if pending:
+            tasks = [(folds[i]['model'], folds[i]['train'], self.horizon) for i in pending]
+            if self.workers > 1 and len(tasks) > 1:
+                with ProcessPoolExecutor(max_workers=self.workers) as pool:
+                    fitted = list(pool.map(_run_fold, tasks, chunksize=max(1, len(tasks) // (self.workers * 4))))
+            else:
+                fitted = [_run_fold(task) for task in tasks]
+            for i, result in zip(pending, fitted):
+                results[i] = result
+                self._write_cache(keys[i], result)
+        
+        rows = []
+        for fold, result in zip(folds, results):
+            for step, (actual, forecast) in enumerate(zip(fold['actual'], result['forecast']), start=1):
+                rows.append({
+                    'series': fold['series'],
+                    'model': fold['model'],
+                    'origin': fold['origin'],
+                    'step': step,
+                    'actual': actual,
+                    'forecast': forecast,
+                    'cpu_seconds': result['cpu_seconds'] / len(fold['actual']),
+                })
+        return pd.DataFrame(rows)
+
+def error_table(forecasts):
+    """Per-series, per-model error metrics over all origins and horizon steps"""
+    df = forecasts.copy()
+    df['error'] = df['forecast'] - df['actual']
+    df['abs_error'] = df['error'].abs()
+    df['sq_error'] = df['error'] ** 2
+    # Percentage errors are undefined for zero actuals (e.g. months a product did not sell)
+    nonzero_actual = df['actual'].abs().where(df['actual'] != 0)
+    df['ape'] = df['abs_error'] / nonzero_actual * 100
+    
+    grouped = df.groupby(['series', 'model'])
+    table = pd.DataFrame({
+        'folds': grouped['origin'].nunique(),
+        'forecasts': grouped['forecast'].count(),
+        'failed': grouped['forecast'].apply(lambda s: int(s.isna().sum())),
+        'mae': grouped['abs_error'].mean(),
+        'rmse': np.sqrt(grouped['sq_error'].mean()),
+        'mape': grouped['ape'].mean(),
+        'bias': grouped['error'].mean(),
+        'cpu_seconds': grouped['cpu_seconds'].sum(),
+    }).reset_index()
+    
+    # Scale-free comparison against the naive forecast of the same series
+    if 'naive' in table['model'].values:
+        naive_mae = table[table['model'] == 'naive'].set_index('series')['mae']
+        table['relative_mae'] = table['mae'] / table['series'].map(naive_mae).replace(0, np.nan)
+    return table
+
+def horizon_table(forecasts):
+    """MAE by model and horizon step, showing how error grows with lead time"""
+    df = forecasts.assign(abs_error=(forecasts['forecast'] - forecasts['actual']).abs())
+    return df.pivot_table(index='model', columns='step', values='abs_error', aggfunc='mean')
+
+def model_summary(errors):
+    """Rank model families on accuracy and CPU cost across all series"""
+    grouped = errors.groupby('model')
+    summary = pd.DataFrame({
+        'series': grouped['series'].count(),
+        'mean_mape': grouped['mape'].mean(),
+        'cpu_seconds': grouped['cpu_seconds'].sum(),
+        'failed': grouped['failed'].sum(),
+    })
+    if 'relative_mae' in errors.columns:
+        summary['mean_relative_mae'] = grouped['relative_mae'].mean()
+    summary['cpu_ms_per_fit'] = summary['cpu_seconds'] * 1000 / grouped['folds'].sum()
+    sort_by = 'mean_relative_mae' if 'mean_relative_mae' in summary.columns else 'mean_mape'
+    return summary.sort_values(sort_by).reset_index()
+
+def save_backtest(forecasts, errors, summary, output_dir=BACKTEST_DIR):
+    """Write the fold forecasts, per-series errors and model summary"""
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    forecasts.to_csv(output_dir / 'fold_forecasts.csv', index=False)
+    errors.to_csv(output_dir / 'series_errors.csv', index=False)
+    summary.to_csv(output_dir / 'model_summary.csv', index=False)
+    summary.to_json(output_dir / 'model_summary.json', orient='records', indent=2)
+    print(f"✓ Backtest results saved to {output_dir}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Rolling-origin backtest of the forecasting models')
+    parser.add_argument('--models', nargs='+', choices=list(FORECASTERS), default=list(FORECASTERS))
+    parser.add_argument('--horizon', type=int, default=DEFAULT_HORIZON, help='months forecast at each origin')
+    parser.add_argument('--min-train', type=int, default=DEFAULT_MIN_TRAIN, help='months in the first training window')
+    parser.add_argument('--step', type=int, default=1, help='months between origins')
+    parser.add_argument('--top-products', type=int, default=10, help='number of product series to evaluate')
+    parser.add_argument('--workers', type=int, help='worker processes (default: CPU count)')
+    parser.add_argument('--no-cache', action='store_true', help='refit every fold instead of reusing cached folds')
+    parser.add_argument('--snapshot-dir', help='load series from the columnar sales snapshot')
+    args = parser.parse_args()
+    
+    print("Loading series...")
+    if args.snapshot_dir:
+        monthly_data, product_data = load_from_snapshot(args.snapshot_dir)
+    else:
+        monthly_data = load_monthly_data()
+        product_data = load_product_monthly_data()
+    series = build_series(monthly_data, product_data, top_products=args.top_products)
+    
+    backtester = Backtester(series, models=args.models, horizon=args.horizon, min_train=args.min_train,
+                            step=args.step, workers=args.workers, cache_dir=None if args.no_cache else CACHE_DIR)
+    start = time.perf_counter()
+    forecasts = backtester.run()
+    elapsed = time.perf_counter() - start
+    print(f"✓ {len(forecasts):,} forecasts over {len(series)} series in {elapsed:.1f}s "
+          f"({backtester.cache_hits:,} folds from cache)")
+    
+    errors = error_table(forecasts)
+    summary = model_summary(errors)
+    print("\nModel summary:")
+    print(summary.to_string(index=False))
+    print("\nMAE by horizon step:")
+    print(horizon_table(forecasts).to_string())
+    save_backtest(forecasts, errors, summary)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+Chart Data Feed
+Builds compact, columnar chart specs from the analysis DataFrames for client-side rendering in the dashboard
+"""
+
+import numpy as np
+import pandas as pd
+from json_output import write_json
+
+CHART_DATA_VERSION = 1
+VALUE_DECIMALS = 2
+
+def _values(series):
+    """JSON-ready list for a column: dates as YYYY-MM, floats rounded, NaN as null"""
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return series.dt.strftime('%Y-%m').tolist()
+    if pd.api.types.is_float_dtype(series):
+        rounded = series.astype(float).round(VALUE_DECIMALS)
+        return [None if np.isnan(v) else v for v in rounded.tolist()]
+    if pd.api.types.is_integer_dtype(series):
+        return series.astype(np.int64).tolist()
+    return series.astype(object).where(series.notna(), None).tolist()
+
+def columns(df, names=None):
+    """Columnar data block: {column: [values]}"""
+    return {str(name): _values(df[name]) for name in (names or df.columns)}
+
+def panel(title, kind, x, y, label=None, data=None, **options):
+    """One sub-chart; panels without their own data read the chart's data block"""
+    spec = {'title': title, 'type': kind, 'x': x, 'y': y if isinstance(y, list) else [y]}
+    if label:
+        spec['label'] = label
+    if data is not None:
+        spec['data'] = data
+    spec.update(options)
+    return spec
+
+def _pivot(df, value, aggfunc):
+    pivot = df.pivot_table(values=value, index='age_group', columns='income_level',
+                           aggfunc=aggfunc, observed=True).reset_index()
+    pivot.columns = [str(c) for c in pivot.columns]
+    return pivot
+
+def sales_by_category_chart(df):
+    return {
+        'title': 'Sales by Category',
+        'data': columns(df, ['category', 'revenue', 'units_sold', 'transactions', 'avg_order_value']),
+        'panels': [
+            panel('Total Revenue by Category', 'bar', 'category', 'revenue', 'Revenue ($)', horizontal=True),
+            panel('Total Units Sold by Category', 'bar', 'category', 'units_sold', 'Units Sold'),
+            panel('Transaction Distribution by Category', 'pie', 'category', 'transactions'),
+            panel('Average Order Value by Category', 'bar', 'category', 'avg_order_value',
+                  'Average Order Value ($)'),
+        ],
+    }
+
+def monthly_trends_chart(df):
+    return {
+        'title': 'Monthly Sales Trends',
+        'data': columns(df, ['month', 'revenue', 'units_sold', 'transactions', 'avg_order_value']),
+        'panels': [
+            panel('Monthly Revenue Trend', 'area', 'month', 'revenue', 'Revenue ($)'),
+            panel('Monthly Units Sold Trend', 'area', 'month', 'units_sold', 'Units Sold'),
+            panel('Monthly Transaction Count', 'bar', 'month', 'transactions', 'Transaction Count'),
+            panel('Monthly Average Order Value Trend', 'line', 'month', 'avg_order_value',
+                  'Average Order Value ($)'),
+        ],
+    }
+
+def top_products_chart(df):
+    return {
+        'title': 'Top Products',
+        'data': columns(df, ['product_name', 'total_revenue', 'total_quantity', 'times_sold', 'avg_order_value']),
+        'panels': [
+            panel('Top 10 Products by Revenue', 'bar', 'product_name', 'total_revenue', 'Revenue ($)',
+                  horizontal=True),
+            panel('Top 10 Products by Units Sold', 'bar', 'product_name', 'total_quantity', 'Units Sold',
+                  horizontal=True),
+            panel('Top 10 Products by Sales Frequency', 'bar', 'product_name', 'times_sold', 'Times Sold',
+                  horizontal=True),
+            panel('Top 10 Products by Average Order Value', 'bar', 'product_name', 'avg_order_value',
+                  'Average Order Value ($)', horizontal=True),
+        ],
+    }
+
+def retailer_performance_chart(df):
+    type_counts = df['retailer_type'].value_counts()
+    type_counts = type_counts[type_counts > 0].rename_axis('retailer_type').reset_index(name='retailers')
+    aov_by_type = (df.groupby('retailer_type', observed=True)['avg_order_value'].mean()
+                   .sort_values(ascending=False).reset_index())
+    return {
+        'title': 'Retailer Performance',
+        'data': columns(df, ['retailer_name', 'revenue', 'transactions', 'product_variety']),
+        'panels': [
+            panel('Top 15 Retailers by Revenue', 'bar', 'retailer_name', 'revenue', 'Revenue ($)', horizontal=True),
+            panel('Retailer Type Distribution (Top 15)', 'pie', 'retailer_type', 'retailers',
+                  data=columns(type_counts)),
+            panel('Transactions vs Revenue (bubble size = product variety)', 'scatter', 'transactions', 'revenue',
+                  'Revenue ($)', size='product_variety'),
+            panel('Average Order Value by Retailer Type', 'bar', 'retailer_type', 'avg_order_value',
+                  'Average Order Value ($)', data=columns(aov_by_type)),
+        ],
+    }
+
+def regional_sales_chart(df):
+    return {
+        'title': 'Regional Sales',
+        'data': columns(df, ['state', 'revenue', 'retailer_count', 'revenue_per_retailer']),
+        'panels': [
+            panel('Revenue by State', 'bar', 'state', 'revenue', 'Revenue ($)', horizontal=True),
+            panel('Market Share by State', 'pie', 'state', 'revenue'),
+            panel('Retailers Count vs Revenue by State', 'composed', 'state', ['retailer_count', 'revenue'],
+                  'Retailer Count', secondary='revenue'),
+            panel('Revenue per Retailer by State', 'bar', 'state', 'revenue_per_retailer',
+                  'Revenue per Retailer ($)'),
+        ],
+    }
+
+def customer_demographics_chart(df):
+    panels = []
+    for value, aggfunc, title, label in [
+        ('customer_count', 'sum', 'Customer Distribution by Age & Income Level', 'Customer Count'),
+        ('total_purchases', 'sum', 'Purchase Count by Age & Income Level', 'Total Purchases'),
+        ('avg_purchases_per_customer', 'mean', 'Average Purchases per Customer by Demographics',
+         'Avg Purchases per Customer'),
+        ('avg_units_per_purchase', 'mean', 'Average Units per Purchase by Demographics', 'Avg Units per Purchase'),
+    ]:
+        pivot = _pivot(df, value, aggfunc)
+        panels.append(panel(title, 'bar', 'age_group', [c for c in pivot.columns if c != 'age_group'], label,
+                            data=columns(pivot), legend='Income Level'))
+    return {'title': 'Customer Demographics', 'panels': panels}
+
+def inventory_status_chart(df):
+    low_stock = df[df['locations_below_reorder'] > 0].sort_values('locations_below_reorder', ascending=False)
+    top_avg_stock = df.nlargest(10, 'avg_stock_per_location')
+    return {
+        'title': 'Inventory Status',
+        'data': columns(df, ['product_name', 'total_stock', 'retailer_locations', 'avg_stock_per_location']),
+        'panels': [
+            panel('Current Inventory Levels by Product', 'bar', 'product_name', 'total_stock', 'Total Stock Units',
+                  horizontal=True),
+            panel('Stock Distribution Across Locations', 'scatter', 'retailer_locations', 'total_stock',
+                  'Total Stock Units', size='avg_stock_per_location'),
+            panel('Low Stock Alert - Products Below Reorder Level', 'bar', 'product_name', 'locations_below_reorder',
+                  'Number of Locations Below Reorder Level', horizontal=True,
+                  data=columns(low_stock, ['product_name', 'locations_below_reorder'])),
+            panel('Top 10 Products by Average Stock per Location', 'bar', 'product_name', 'avg_stock_per_location',
+                  'Average Stock per Location', horizontal=True,
+                  data=columns(top_avg_stock, ['product_name', 'avg_stock_per_location'])),
+        ],
+    }
+
+# Chart name (also the PNG file stem) -> spec builder over the analysis DataFrame
+CHART_BUILDERS = {
+    'sales_by_category': sales_by_category_chart,
+    'monthly_trends': monthly_trends_chart,
+    'top_products': top_products_chart,
+    'retailer_performance': retailer_performance_chart,
+    'regional_sales': regional_sales_chart,
+    'customer_demographics': customer_demographics_chart,
+    'inventory_status': inventory_status_chart,
+}
+
+def build_chart(name, df):
+    return CHART_BUILDERS[name](df)
+
+def save_chart_data(charts, output_file, public_dir=None):
+    """Write every chart spec to one compact JSON document, and publish it to public_dir when given"""
+    return write_json({'version': CHART_DATA_VERSION, 'charts': charts}, output_file, publish_dir=public_dir)
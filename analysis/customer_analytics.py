@@ -0,0 +1,354 @@
+#!/usr/bin/env python3
+"""
+Customer Analytics
+Vectorized recency/frequency/monetary scores, acquisition cohorts and retention matrices for every customer,
+computed in customer-id chunks and extended incrementally as new purchases are appended
+"""
+
+import argparse
+import json
+import sqlite3
+import time
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from sales_cube import _round
+
+DB_PATH = '/home/ubuntu/fmcg-healthcare-portfolio/data/fmcg_healthcare.db'
+STATE_PATH = Path('/home/ubuntu/fmcg-healthcare-portfolio/data/customer_analytics.npz')
+OUTPUT_DIR = Path('/home/ubuntu/fmcg-healthcare-portfolio/analysis')
+
+# Customer ids read per range query (uses the customer index when present)
+CUSTOMER_CHUNK = 500_000
+FETCH_ROWS = 500_000
+RFM_BINS = 5
+
+CUSTOMER_INDEX_SQL = "CREATE INDEX IF NOT EXISTS idx_sales_by_customer_customer ON sales_by_customer(customer_id)"
+
+# Each purchase's share of its sale's discounted amount is its monetary value
+PURCHASES_SQL = """
+SELECT sbc.customer_id,
+       CAST(julianday(sbc.purchase_date) - 2440587.5 AS INTEGER) as day,
+       sbc.quantity,
+       s.total_amount * sbc.quantity / s.quantity_sold as amount
+FROM sales_by_customer sbc
+JOIN sales s ON s.sale_id = sbc.sale_id
+WHERE {where}
+"""
+
+# Customer state columns (one row per customer with purchases, sorted by customer_id)
+STATE_DTYPES = {
+    'customer_id': np.int64,
+    'first_day': np.int32,
+    'last_day': np.int32,
+    'frequency': np.int32,
+    'units': np.int64,
+    'monetary': np.float64,
+}
+
+def _month_index(days):
+    """Days since 1970-01-01 to months since 1970-01"""
+    dates = np.asarray(days, dtype='datetime64[D]')
+    return (dates.astype('datetime64[M]').astype(np.int64)).astype(np.int32)
+
+def _month_label(month):
+    return str(np.datetime64(int(month), 'M'))
+
+def _read(conn, where, params, fetch_rows=FETCH_ROWS):
+    """Purchase columns as arrays: customer_id, day, quantity, amount"""
+    cursor = conn.execute(PURCHASES_SQL.format(where=where), params)
+    parts = []
+    while True:
+        rows = cursor.fetchmany(fetch_rows)
+        if not rows:
+            break
+        parts.append(np.array(rows, dtype=np.float64))
+    data = np.concatenate(parts) if parts else np.empty((0, 4))
+    return (data[:, 0].astype(np.int64), data[:, 1].astype(np.int32), data[:, 2].astype(np.int64), data[:, 3])
+
+def summarize(customers, days, quantity, amount):
+    """Per-customer aggregates and distinct (customer, month) activity for one batch of purchases"""
+    if not len(customers):
+        empty = {k: np.empty(0, dtype=dtype) for k, dtype in STATE_DTYPES.items()}
+        return empty, (empty['customer_id'], np.empty(0, dtype=np.int32))
+    order = np.lexsort((days, customers))
+    customers, days, quantity, amount = customers[order], days[order], quantity[order], amount[order]
+    starts = np.flatnonzero(np.r_[True, customers[1:] != customers[:-1]])
+    ends = np.r_[starts[1:], len(customers)] - 1
+    state = {
+        'customer_id': customers[starts],
+        'first_day': days[starts],
+        'last_day': days[ends],
+        'frequency': np.diff(np.r_[starts, len(customers)]).astype(np.int32),
+        'units': np.add.reduceat(quantity, starts),
+        'monetary': np.add.reduceat(amount, starts),
+    }
+    # Rows are sorted by (customer, day), so (customer, month) pairs are already grouped
+    months = _month_index(days)
+    first = np.r_[True, (customers[1:] != customers[:-1]) | (months[1:] != months[:-1])]
+    activity = (customers[first], months[first])
+    return {k: v.astype(STATE_DTYPES[k]) for k, v in state.items()}, activity
+
+class CustomerAnalytics:
+    """Per-customer RFM state plus cohort x month-offset retention counts, with a purchase watermark"""
+    
+    def __init__(self, state=None, retention=None, base_month=None, watermark=None):
+        self.state = state or {k: np.empty(0, dtype=dtype) for k, dtype in STATE_DTYPES.items()}
+        # retention[c, k]: customers acquired in month base_month + c active k months later
+        self.retention = np.zeros((0, 0), dtype=np.int64) if retention is None else retention
+        self.base_month = base_month
+        self.watermark = watermark
+    
+    @property
+    def customer_count(self):
+        return len(self.state['customer_id'])
+    
+    def _cohorts(self, customers):
+        """Acquisition month of customers already in the state"""
+        pos = np.searchsorted(self.state['customer_id'], customers)
+        return _month_index(self.state['first_day'][pos])
+    
+    def _add_activity(self, cohort_months, active_months):
+        if not len(cohort_months):
+            return
+        if self.base_month is None:
+            self.base_month = int(cohort_months.min())
+        shift = max(self.base_month - int(cohort_months.min()), 0)
+        self.base_month -= shift
+        rows, cols = cohort_months - self.base_month, active_months - cohort_months
+        shape = (max(self.retention.shape[0] + shift, rows.max() + 1), max(self.retention.shape[1], cols.max() + 1))
+        if shape != self.retention.shape or shift:
+            grown = np.zeros(shape, dtype=np.int64)
+            grown[shift:shift + self.retention.shape[0], :self.retention.shape[1]] = self.retention
+            self.retention = grown
+        np.add.at(self.retention, (rows, cols), 1)
+    
+    def _merge_state(self, batch):
+        """Fold a batch's per-customer aggregates into the state (purchases later than any already held)"""
+        ids = np.concatenate([self.state['customer_id'], batch['customer_id']])
+        unique, inverse = np.unique(ids, return_inverse=True)
+        merged = {'customer_id': unique}
+        old, new = inverse[:self.customer_count], inverse[self.customer_count:]
+        for column, reduce, empty in [('first_day', np.minimum, np.iinfo(np.int32).max),
+                                      ('last_day', np.maximum, np.iinfo(np.int32).min),
+                                      ('frequency', np.add, 0), ('units', np.add, 0), ('monetary', np.add, 0)]:
+            values = np.full(len(unique), empty, dtype=STATE_DTYPES[column])
+            values[old] = self.state[column]
+            values[new] = reduce(values[new], batch[column])
+            merged[column] = values
+        self.state = merged
+    
+    def rebuild(self, conn, chunk=CUSTOMER_CHUNK):
+        """Compute the state from scratch, one customer-id range at a time"""
+        self.__init__()
+        watermark = _watermark(conn)
+        low, high = conn.execute("SELECT MIN(customer_id), MAX(customer_id) FROM sales_by_customer").fetchone()
+        parts, cohorts, actives = [], [], []
+        for start in range(low or 0, (high or -1) + 1, chunk):
+            batch, (customers, months) = summarize(*_read(
+                conn, "sbc.customer_id >= ? AND sbc.customer_id < ? AND sbc.purchase_date <= ?",
+                (start, start + chunk, watermark['through_date'])))
+            parts.append(batch)
+            # Chunks partition customers, so each chunk holds its customers' whole history
+            pos = np.searchsorted(batch['customer_id'], customers)
+            cohorts.append(_month_index(batch['first_day'][pos]))
+            actives.append(months)
+        if parts:
+            self.state = {k: np.concatenate([p[k] for p in parts]) for k in STATE_DTYPES}
+            self._add_activity(np.concatenate(cohorts), np.concatenate(actives))
+        self.watermark = watermark
+    
+    def append(self, conn):
+        """Fold in purchases dated after the watermark; returns rows read, or None if a rebuild is needed"""
+        watermark = _watermark(conn)
+        covered = conn.execute("SELECT COUNT(*) FROM sales_by_customer WHERE purchase_date <= ?",
+                               (self.watermark['through_date'],)).fetchone()[0]
+        if covered != self.watermark['row_count']:
+            return None
+        customers, days, quantity, amount = _read(conn, "sbc.purchase_date > ? AND sbc.purchase_date <= ?",
+                                                  (self.watermark['through_date'], watermark['through_date']))
+        batch, (active_customers, active_months) = summarize(customers, days, quantity, amount)
+        # A month already counted for a customer (their last purchase month) is not new activity
+        pos = np.searchsorted(self.state['customer_id'], active_customers).clip(max=max(self.customer_count - 1, 0))
+        known = self.state['customer_id'][pos] == active_customers if self.customer_count else \
+            np.zeros(len(active_customers), dtype=bool)
+        last_month = np.where(known, _month_index(self.state['last_day'][pos]) if self.customer_count else 0, -1)
+        new = active_months != last_month
+        self._merge_state(batch)
+        active_customers, active_months = active_customers[new], active_months[new]
+        self._add_activity(self._cohorts(active_customers), active_months)
+        self.watermark = watermark
+        return len(customers)
+    
+    def refresh(self, conn):
+        """Bring the state up to date, incrementally when only newer purchases were added"""
+        if self.watermark is None or self.append(conn) is None:
+            self.rebuild(conn)
+        return self
+    
+    # ------------------------------------------------------------------------
+    # Reports
+    # ------------------------------------------------------------------------
+    
+    def rfm(self, as_of=None):
+        """Recency (days), frequency, monetary value and 1-5 scores for every customer"""
+        as_of = as_of if as_of is not None else int(self.state['last_day'].max()) + 1
+        recency = as_of - self.state['last_day'].astype(np.int64)
+        df = pd.DataFrame({
+            'customer_id': self.state['customer_id'],
+            'recency_days': recency,
+            'frequency': self.state['frequency'],
+            'monetary': self.state['monetary'].round(2),
+            'first_purchase': self.state['first_day'].astype('datetime64[D]'),
+            'last_purchase': self.state['last_day'].astype('datetime64[D]'),
+        })
+        df['r_score'] = RFM_BINS + 1 - _scores(recency)
+        df['f_score'] = _scores(self.state['frequency'])
+        df['m_score'] = _scores(self.state['monetary'])
+        df['segment'] = _segments(df['r_score'].to_numpy(), df['f_score'].to_numpy(), df['m_score'].to_numpy())
+        return df
+    
+    def segment_summary(self, rfm=None):
+        rfm = self.rfm() if rfm is None else rfm
+        summary = rfm.groupby('segment').agg(
+            customer_count=('customer_id', 'size'),
+            avg_recency_days=('recency_days', 'mean'),
+            avg_frequency=('frequency', 'mean'),
+            avg_monetary=('monetary', 'mean'),
+            total_monetary=('monetary', 'sum'),
+        ).round(2)
+        return summary.sort_values('total_monetary', ascending=False).reset_index()
+    
+    def cohort_sizes(self):
+        months = _month_index(self.state['first_day']) - (self.base_month or 0)
+        return np.bincount(months, minlength=self.retention.shape[0])
+    
+    def retention_matrix(self, rate=True):
+        """Cohort (acquisition month) x months since acquisition: active customers, or their share"""
+        labels = [_month_label(self.base_month + i) for i in range(self.retention.shape[0])]
+        counts = pd.DataFrame(self.retention, index=pd.Index(labels, name='cohort'))
+        if not rate:
+            return counts
+        sizes = self.cohort_sizes()
+        rates = (counts.div(np.where(sizes > 0, sizes, np.nan), axis=0) * 100).round(2)
+        # Offsets past the last observed month have no data yet
+        last = int(_month_index([self.state['last_day'].max()])[0]) - self.base_month
+        observed = np.add.outer(np.arange(rates.shape[0]), np.arange(rates.shape[1])) <= last
+        return rates.where(observed)
+    
+    def purchase_segments(self, conn):
+        """Query 4.4 (segments by purchase count, customers without purchases included) from the state"""
+        total = conn.execute("SELECT COUNT(*) FROM customer_demographics").fetchone()[0]
+        frequency = np.r_[self.state['frequency'], np.zeros(total - self.customer_count, dtype=np.int32)].astype(np.int64)
+        units = np.r_[self.state['units'], np.zeros(total - self.customer_count, dtype=np.int64)]
+        segment = np.select([frequency >= 10, frequency >= 5], ['High-Value', 'Medium-Value'], 'Low-Value')
+        df = pd.DataFrame({'customer_segment': segment, 'purchase_count': frequency, 'total_quantity': units})
+        out = df.groupby('customer_segment').agg(
+            customer_count=('purchase_count', 'size'),
+            avg_purchases=('purchase_count', 'mean'),
+            avg_units_purchased=('total_quantity', 'mean'),
+            min_purchases=('purchase_count', 'min'),
+            max_purchases=('purchase_count', 'max'),
+        ).reset_index()
+        # Customers without purchases have NULL units in SQL, which AVG skips
+        with_units = df[df['purchase_count'] > 0].groupby('customer_segment')['total_quantity'].mean()
+        out['avg_units_purchased'] = out['customer_segment'].map(with_units)
+        for column in ('avg_purchases', 'avg_units_purchased'):
+            out[column] = _round(out[column])
+        return out
+    
+    # ------------------------------------------------------------------------
+    # Persistence
+    # ------------------------------------------------------------------------
+    
+    def save(self, path=STATE_PATH):
+        path = Path(path)
+        arrays = dict(self.state)
+        arrays['retention'] = self.retention
+        arrays['__meta__'] = np.array(json.dumps({'base_month': self.base_month, 'watermark': self.watermark}))
+        tmp_path = path.with_name(path.stem + '.tmp.npz')
+        np.savez_compressed(tmp_path, **arrays)
+        tmp_path.replace(path)
+    
+    @classmethod
+    def load(cls, path=STATE_PATH):
+        with np.load(path) as archive:
+            meta = json.loads(str(archive['__meta__']))
+            state = {k: archive[k] for k in STATE_DTYPES}
+            retention = archive['retention']
+        return cls(state, retention, meta['base_month'], meta['watermark'])
+
+def _watermark(conn):
+    through_date, row_count = conn.execute(
+        "SELECT MAX(purchase_date), COUNT(*) FROM sales_by_customer").fetchone()
+    return {'through_date': through_date or '', 'row_count': row_count}
+
+def _scores(values):
+    """Quantile scores 1..RFM_BINS; equal values always share a score"""
+    ordered = np.sort(values)
+    share = np.searchsorted(ordered, values, side='right') / max(len(values), 1)
+    return np.clip(np.ceil(share * RFM_BINS), 1, RFM_BINS).astype(np.int8)
+
+def _segments(r, f, m):
+    fm = (f.astype(np.int16) + m) / 2
+    return np.select(
+        [(r >= 4) & (fm >= 4), (r >= 3) & (fm >= 3), (r >= 4) & (f <= 2), (r <= 2) & (fm >= 3), r <= 2],
+        ['Champions', 'Loyal', 'New', 'At Risk', 'Hibernating'], 'Needs Attention')
+
+def load_customer_analytics(conn, path=STATE_PATH):
+    """Load the stored state and bring it up to date"""
+    path = Path(path)
+    analytics = CustomerAnalytics.load(path) if path.exists() else CustomerAnalytics()
+    if analytics.watermark != _watermark(conn):
+        analytics.refresh(conn)
+        analytics.save(path)
+    return analytics
+
+def main():
+    parser = argparse.ArgumentParser(description='RFM scores and cohort retention for every customer')
+    parser.add_argument('--db', default=DB_PATH)
+    parser.add_argument('--rebuild', action='store_true', help='recompute from scratch instead of appending')
+    parser.add_argument('--output', type=Path, default=OUTPUT_DIR / 'customer_analytics.json')
+    args = parser.parse_args()
+    
+    conn = sqlite3.connect(args.db)
+    try:
+        try:
+            conn.execute(CUSTOMER_INDEX_SQL)
+        except sqlite3.OperationalError:
+            print("⚠ Could not create the customer index (read-only database); ranges will scan")
+        start = time.perf_counter()
+        if args.rebuild or not STATE_PATH.exists():
+            analytics = CustomerAnalytics()
+            analytics.rebuild(conn)
+            analytics.save(STATE_PATH)
+        else:
+            analytics = load_customer_analytics(conn)
+        print(f"✓ {analytics.customer_count:,} customers through {analytics.watermark['through_date']} "
+              f"in {time.perf_counter() - start:.2f}s")
+        
+        rfm = analytics.rfm()
+        segments = analytics.segment_summary(rfm)
+        retention = analytics.retention_matrix()
+        print("\nRFM segments:")
+        print(segments.to_string(index=False))
+        print("\nMonth-1 retention by cohort (%):")
+        print(retention[1].dropna().to_string() if retention.shape[1] > 1 else "  (one month of data)")
+        
+        report = {
+            'as_of': analytics.watermark['through_date'],
+            'customers': analytics.customer_count,
+            'rfm_segments': segments.to_dict('records'),
+            'cohort_sizes': dict(zip(retention.index, analytics.cohort_sizes().tolist())),
+            'retention_pct': {cohort: [None if pd.isna(v) else v for v in row]
+                              for cohort, row in zip(retention.index, retention.to_numpy().tolist())},
+            'purchase_segments': analytics.purchase_segments(conn).to_dict('records'),
+        }
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\n✓ Report saved to {args.output}")
+    finally:
+        conn.close()
+
+if __name__ == '__main__':
+    main()
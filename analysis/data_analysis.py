@@ -4,14 +4,16 @@ FMCG Healthcare Data Analysis
 Comprehensive Python analysis with visualizations and statistical insights
 """
 
+import argparse
 import sqlite3
 import pandas as pd
 import numpy as np
-import json
-from datetime import datetime
-import matplotlib.pyplot as plt
-import seaborn as sns
 from pathlib import Path
+from typed_loading import read_sql_compact, format_memory_report
+from memory_db import connect
+from chart_specs import build_chart, save_chart_data
+from heavy_hitters import TOPK_REPORTS, load_heavy_hitters
+from json_output import COMPRESSIONS, PUBLIC_DIR, write_json, resolve_public_dir, format_sizes
 
 # Configuration
 DB_PATH = '/home/ubuntu/fmcg-healthcare-portfolio/data/fmcg_healthcare.db'
@@ -19,20 +21,41 @@ OUTPUT_DIR = Path('/home/ubuntu/fmcg-healthcare-portfolio/analysis')
 VISUALIZATIONS_DIR = OUTPUT_DIR / 'visualizations'
 VISUALIZATIONS_DIR.mkdir(exist_ok=True)
 
-# Set style for visualizations
-sns.set_style("whitegrid")
-plt.rcParams['figure.figsize'] = (14, 8)
-plt.rcParams['font.size'] = 10
+def _pyplot():
+    """Import matplotlib and seaborn only when PNGs are rendered, styled for the visualizations"""
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    sns.set_style("whitegrid")
+    plt.rcParams['figure.figsize'] = (14, 8)
+    plt.rcParams['font.size'] = 10
+    return plt, sns
 
 class FMCGAnalyzer:
-    def __init__(self, db_path):
-        self.conn = sqlite3.connect(db_path)
+    def __init__(self, db_path, compact_dtypes=False, in_memory=False, render_png=True, heavy_hitters=None):
+        self.conn = connect(db_path, in_memory=in_memory)
         self.conn.row_factory = sqlite3.Row
+        self.heavy_hitters = heavy_hitters
         self.insights = {}
-        
-    def query_to_dataframe(self, query):
+        # The frames behind the record lists in insights, which save_insights_json encodes column by column
+        self.frames = {}
+        self.charts = {}
+        self.render_png = render_png
+        self.compact_dtypes = compact_dtypes
+        self.memory_report = {}
+    
+    def query_to_dataframe(self, query, name=None):
         """Execute SQL query and return as pandas DataFrame"""
-        return pd.read_sql_query(query, self.conn)
+        if not self.compact_dtypes:
+            return pd.read_sql_query(query, self.conn)
+        
+        # Dimension columns become shared categoricals, key columns are downcast
+        df, report = read_sql_compact(query, self.conn)
+        self.memory_report[name or f'query_{len(self.memory_report) + 1}'] = report
+        return df
+    
+    def _record_insight(self, name, df):
+        self.insights[name] = df.to_dict('records')
+        self.frames[name] = df
     
     # ========================================================================
     # 1. SALES ANALYSIS
@@ -53,47 +76,51 @@ class FMCGAnalyzer:
         GROUP BY p.category
         ORDER BY revenue DESC
         """
-        df = self.query_to_dataframe(query)
+        df = self.query_to_dataframe(query, 'sales_by_category')
+        
+        self.charts['sales_by_category'] = build_chart('sales_by_category', df)
         
         # Visualization
-        fig, axes = plt.subplots(2, 2, figsize=(16, 12))
-        
-        # Revenue by category
-        ax1 = axes[0, 0]
-        colors = sns.color_palette("husl", len(df))
-        bars = ax1.barh(df['category'], df['revenue'], color=colors)
-        ax1.set_xlabel('Revenue ($)', fontsize=11, fontweight='bold')
-        ax1.set_title('Total Revenue by Category', fontsize=13, fontweight='bold')
-        for i, bar in enumerate(bars):
-            width = bar.get_width()
-            ax1.text(width, bar.get_y() + bar.get_height()/2, 
-                    f'${width:,.0f}', ha='left', va='center', fontweight='bold')
-        
-        # Units sold by category
-        ax2 = axes[0, 1]
-        ax2.bar(df['category'], df['units_sold'], color=colors, alpha=0.7)
-        ax2.set_ylabel('Units Sold', fontsize=11, fontweight='bold')
-        ax2.set_title('Total Units Sold by Category', fontsize=13, fontweight='bold')
-        ax2.tick_params(axis='x', rotation=45)
-        
-        # Transaction count
-        ax3 = axes[1, 0]
-        ax3.pie(df['transactions'], labels=df['category'], autopct='%1.1f%%', 
-               colors=colors, startangle=90)
-        ax3.set_title('Transaction Distribution by Category', fontsize=13, fontweight='bold')
-        
-        # Average order value
-        ax4 = axes[1, 1]
-        ax4.bar(df['category'], df['avg_order_value'], color=colors, alpha=0.7)
-        ax4.set_ylabel('Average Order Value ($)', fontsize=11, fontweight='bold')
-        ax4.set_title('Average Order Value by Category', fontsize=13, fontweight='bold')
-        ax4.tick_params(axis='x', rotation=45)
-        
-        plt.tight_layout()
-        plt.savefig(VISUALIZATIONS_DIR / 'sales_by_category.png', dpi=300, bbox_inches='tight')
-        plt.close()
-        
-        self.insights['sales_by_category'] = df.to_dict('records')
+        if self.render_png:
+            plt, sns = _pyplot()
+            fig, axes = plt.subplots(2, 2, figsize=(16, 12))
+            
+            # Revenue by category
+            ax1 = axes[0, 0]
+            colors = sns.color_palette("husl", len(df))
+            bars = ax1.barh(df['category'], df['revenue'], color=colors)
+            ax1.set_xlabel('Revenue ($)', fontsize=11, fontweight='bold')
+            ax1.set_title('Total Revenue by Category', fontsize=13, fontweight='bold')
+            for i, bar in enumerate(bars):
+                width = bar.get_width()
+                ax1.text(width, bar.get_y() + bar.get_height()/2, 
+                        f'${width:,.0f}', ha='left', va='center', fontweight='bold')
+            
+            # Units sold by category
+            ax2 = axes[0, 1]
+            ax2.bar(df['category'], df['units_sold'], color=colors, alpha=0.7)
+            ax2.set_ylabel('Units Sold', fontsize=11, fontweight='bold')
+            ax2.set_title('Total Units Sold by Category', fontsize=13, fontweight='bold')
+            ax2.tick_params(axis='x', rotation=45)
+            
+            # Transaction count
+            ax3 = axes[1, 0]
+            ax3.pie(df['transactions'], labels=df['category'], autopct='%1.1f%%', 
+                   colors=colors, startangle=90)
+            ax3.set_title('Transaction Distribution by Category', fontsize=13, fontweight='bold')
+            
+            # Average order value
+            ax4 = axes[1, 1]
+            ax4.bar(df['category'], df['avg_order_value'], color=colors, alpha=0.7)
+            ax4.set_ylabel('Average Order Value ($)', fontsize=11, fontweight='bold')
+            ax4.set_title('Average Order Value by Category', fontsize=13, fontweight='bold')
+            ax4.tick_params(axis='x', rotation=45)
+            
+            plt.tight_layout()
+            plt.savefig(VISUALIZATIONS_DIR / 'sales_by_category.png', dpi=300, bbox_inches='tight')
+            plt.close()
+        
+        self._record_insight('sales_by_category', df)
         return df
     
     def analyze_monthly_trends(self):
@@ -109,49 +136,53 @@ class FMCGAnalyzer:
         GROUP BY strftime('%Y-%m', s.sale_date)
         ORDER BY month
         """
-        df = self.query_to_dataframe(query)
+        df = self.query_to_dataframe(query, 'monthly_trends')
         df['month'] = pd.to_datetime(df['month'])
         
+        self.charts['monthly_trends'] = build_chart('monthly_trends', df)
+        
         # Visualization
-        fig, axes = plt.subplots(2, 2, figsize=(16, 12))
-        
-        # Revenue trend
-        ax1 = axes[0, 0]
-        ax1.plot(df['month'], df['revenue'], marker='o', linewidth=2.5, 
-                markersize=8, color='#2E86AB')
-        ax1.fill_between(df['month'], df['revenue'], alpha=0.3, color='#2E86AB')
-        ax1.set_ylabel('Revenue ($)', fontsize=11, fontweight='bold')
-        ax1.set_title('Monthly Revenue Trend', fontsize=13, fontweight='bold')
-        ax1.grid(True, alpha=0.3)
-        
-        # Units sold trend
-        ax2 = axes[0, 1]
-        ax2.plot(df['month'], df['units_sold'], marker='s', linewidth=2.5, 
-                markersize=8, color='#A23B72')
-        ax2.fill_between(df['month'], df['units_sold'], alpha=0.3, color='#A23B72')
-        ax2.set_ylabel('Units Sold', fontsize=11, fontweight='bold')
-        ax2.set_title('Monthly Units Sold Trend', fontsize=13, fontweight='bold')
-        ax2.grid(True, alpha=0.3)
-        
-        # Transaction count
-        ax3 = axes[1, 0]
-        ax3.bar(df['month'], df['transactions'], color='#F18F01', alpha=0.7)
-        ax3.set_ylabel('Transaction Count', fontsize=11, fontweight='bold')
-        ax3.set_title('Monthly Transaction Count', fontsize=13, fontweight='bold')
-        
-        # Average order value trend
-        ax4 = axes[1, 1]
-        ax4.plot(df['month'], df['avg_order_value'], marker='D', linewidth=2.5, 
-                markersize=8, color='#C73E1D')
-        ax4.set_ylabel('Average Order Value ($)', fontsize=11, fontweight='bold')
-        ax4.set_title('Monthly Average Order Value Trend', fontsize=13, fontweight='bold')
-        ax4.grid(True, alpha=0.3)
-        
-        plt.tight_layout()
-        plt.savefig(VISUALIZATIONS_DIR / 'monthly_trends.png', dpi=300, bbox_inches='tight')
-        plt.close()
-        
-        self.insights['monthly_trends'] = df.to_dict('records')
+        if self.render_png:
+            plt, sns = _pyplot()
+            fig, axes = plt.subplots(2, 2, figsize=(16, 12))
+            
+            # Revenue trend
+            ax1 = axes[0, 0]
+            ax1.plot(df['month'], df['revenue'], marker='o', linewidth=2.5, 
+                    markersize=8, color='#2E86AB')
+            ax1.fill_between(df['month'], df['revenue'], alpha=0.3, color='#2E86AB')
+            ax1.set_ylabel('Revenue ($)', fontsize=11, fontweight='bold')
+            ax1.set_title('Monthly Revenue Trend', fontsize=13, fontweight='bold')
+            ax1.grid(True, alpha=0.3)
+            
+            # Units sold trend
+            ax2 = axes[0, 1]
+            ax2.plot(df['month'], df['units_sold'], marker='s', linewidth=2.5, 
+                    markersize=8, color='#A23B72')
+            ax2.fill_between(df['month'], df['units_sold'], alpha=0.3, color='#A23B72')
+            ax2.set_ylabel('Units Sold', fontsize=11, fontweight='bold')
+            ax2.set_title('Monthly Units Sold Trend', fontsize=13, fontweight='bold')
+            ax2.grid(True, alpha=0.3)
+            
+            # Transaction count
+            ax3 = axes[1, 0]
+            ax3.bar(df['month'], df['transactions'], color='#F18F01', alpha=0.7)
+            ax3.set_ylabel('Transaction Count', fontsize=11, fontweight='bold')
+            ax3.set_title('Monthly Transaction Count', fontsize=13, fontweight='bold')
+            
+            # Average order value trend
+            ax4 = axes[1, 1]
+            ax4.plot(df['month'], df['avg_order_value'], marker='D', linewidth=2.5, 
+                    markersize=8, color='#C73E1D')
+            ax4.set_ylabel('Average Order Value ($)', fontsize=11, fontweight='bold')
+            ax4.set_title('Monthly Average Order Value Trend', fontsize=13, fontweight='bold')
+            ax4.grid(True, alpha=0.3)
+            
+            plt.tight_layout()
+            plt.savefig(VISUALIZATIONS_DIR / 'monthly_trends.png', dpi=300, bbox_inches='tight')
+            plt.close()
+        
+        self._record_insight('monthly_trends', df)
         return df
     
     def analyze_top_products(self):
@@ -171,45 +202,51 @@ class FMCGAnalyzer:
         ORDER BY total_revenue DESC
         LIMIT 10
         """
-        df = self.query_to_dataframe(query)
+        if self.heavy_hitters is not None:
+            query = self.heavy_hitters.top_query(query, *TOPK_REPORTS['top_products'])
+        df = self.query_to_dataframe(query, 'top_products')
+        
+        self.charts['top_products'] = build_chart('top_products', df)
         
         # Visualization
-        fig, axes = plt.subplots(2, 2, figsize=(16, 12))
-        
-        # Top 10 by revenue
-        ax1 = axes[0, 0]
-        colors = sns.color_palette("viridis", len(df))
-        bars = ax1.barh(df['product_name'], df['total_revenue'], color=colors)
-        ax1.set_xlabel('Revenue ($)', fontsize=11, fontweight='bold')
-        ax1.set_title('Top 10 Products by Revenue', fontsize=13, fontweight='bold')
-        for i, bar in enumerate(bars):
-            width = bar.get_width()
-            ax1.text(width, bar.get_y() + bar.get_height()/2, 
-                    f'${width:,.0f}', ha='left', va='center', fontsize=9)
-        
-        # Top 10 by quantity
-        ax2 = axes[0, 1]
-        ax2.barh(df['product_name'], df['total_quantity'], color=colors, alpha=0.7)
-        ax2.set_xlabel('Units Sold', fontsize=11, fontweight='bold')
-        ax2.set_title('Top 10 Products by Units Sold', fontsize=13, fontweight='bold')
-        
-        # Top 10 by frequency
-        ax3 = axes[1, 0]
-        ax3.barh(df['product_name'], df['times_sold'], color=colors, alpha=0.7)
-        ax3.set_xlabel('Times Sold', fontsize=11, fontweight='bold')
-        ax3.set_title('Top 10 Products by Sales Frequency', fontsize=13, fontweight='bold')
-        
-        # Average order value
-        ax4 = axes[1, 1]
-        ax4.barh(df['product_name'], df['avg_order_value'], color=colors, alpha=0.7)
-        ax4.set_xlabel('Average Order Value ($)', fontsize=11, fontweight='bold')
-        ax4.set_title('Top 10 Products by Average Order Value', fontsize=13, fontweight='bold')
-        
-        plt.tight_layout()
-        plt.savefig(VISUALIZATIONS_DIR / 'top_products.png', dpi=300, bbox_inches='tight')
-        plt.close()
-        
-        self.insights['top_products'] = df.to_dict('records')
+        if self.render_png:
+            plt, sns = _pyplot()
+            fig, axes = plt.subplots(2, 2, figsize=(16, 12))
+            
+            # Top 10 by revenue
+            ax1 = axes[0, 0]
+            colors = sns.color_palette("viridis", len(df))
+            bars = ax1.barh(df['product_name'], df['total_revenue'], color=colors)
+            ax1.set_xlabel('Revenue ($)', fontsize=11, fontweight='bold')
+            ax1.set_title('Top 10 Products by Revenue', fontsize=13, fontweight='bold')
+            for i, bar in enumerate(bars):
+                width = bar.get_width()
+                ax1.text(width, bar.get_y() + bar.get_height()/2, 
+                        f'${width:,.0f}', ha='left', va='center', fontsize=9)
+            
+            # Top 10 by quantity
+            ax2 = axes[0, 1]
+            ax2.barh(df['product_name'], df['total_quantity'], color=colors, alpha=0.7)
+            ax2.set_xlabel('Units Sold', fontsize=11, fontweight='bold')
+            ax2.set_title('Top 10 Products by Units Sold', fontsize=13, fontweight='bold')
+            
+            # Top 10 by frequency
+            ax3 = axes[1, 0]
+            ax3.barh(df['product_name'], df['times_sold'], color=colors, alpha=0.7)
+            ax3.set_xlabel('Times Sold', fontsize=11, fontweight='bold')
+            ax3.set_title('Top 10 Products by Sales Frequency', fontsize=13, fontweight='bold')
+            
+            # Average order value
+            ax4 = axes[1, 1]
+            ax4.barh(df['product_name'], df['avg_order_value'], color=colors, alpha=0.7)
+            ax4.set_xlabel('Average Order Value ($)', fontsize=11, fontweight='bold')
+            ax4.set_title('Top 10 Products by Average Order Value', fontsize=13, fontweight='bold')
+            
+            plt.tight_layout()
+            plt.savefig(VISUALIZATIONS_DIR / 'top_products.png', dpi=300, bbox_inches='tight')
+            plt.close()
+        
+        self._record_insight('top_products', df)
         return df
     
     # ========================================================================
@@ -235,52 +272,57 @@ class FMCGAnalyzer:
         ORDER BY revenue DESC
         LIMIT 15
         """
-        df = self.query_to_dataframe(query)
+        df = self.query_to_dataframe(query, 'retailer_performance')
+        
+        self.charts['retailer_performance'] = build_chart('retailer_performance', df)
         
         # Visualization
-        fig, axes = plt.subplots(2, 2, figsize=(16, 12))
-        
-        # Top retailers by revenue
-        ax1 = axes[0, 0]
-        colors = sns.color_palette("coolwarm", len(df))
-        bars = ax1.barh(df['retailer_name'], df['revenue'], color=colors)
-        ax1.set_xlabel('Revenue ($)', fontsize=11, fontweight='bold')
-        ax1.set_title('Top 15 Retailers by Revenue', fontsize=13, fontweight='bold')
-        for i, bar in enumerate(bars):
-            width = bar.get_width()
-            ax1.text(width, bar.get_y() + bar.get_height()/2, 
-                    f'${width:,.0f}', ha='left', va='center', fontsize=8)
-        
-        # Retailer type distribution
-        ax2 = axes[0, 1]
-        retailer_type_counts = df['retailer_type'].value_counts()
-        ax2.pie(retailer_type_counts, labels=retailer_type_counts.index, autopct='%1.1f%%',
-               colors=sns.color_palette("Set2", len(retailer_type_counts)))
-        ax2.set_title('Retailer Type Distribution (Top 15)', fontsize=13, fontweight='bold')
-        
-        # Transactions vs Revenue scatter
-        ax3 = axes[1, 0]
-        scatter = ax3.scatter(df['transactions'], df['revenue'], 
-                             s=df['product_variety']*50, alpha=0.6, 
-                             c=range(len(df)), cmap='viridis')
-        ax3.set_xlabel('Transaction Count', fontsize=11, fontweight='bold')
-        ax3.set_ylabel('Revenue ($)', fontsize=11, fontweight='bold')
-        ax3.set_title('Transactions vs Revenue (bubble size = product variety)', 
-                     fontsize=13, fontweight='bold')
-        
-        # Average order value by retailer type
-        ax4 = axes[1, 1]
-        aov_by_type = df.groupby('retailer_type')['avg_order_value'].mean().sort_values(ascending=False)
-        ax4.bar(aov_by_type.index, aov_by_type.values, 
-               color=sns.color_palette("Set2", len(aov_by_type)))
-        ax4.set_ylabel('Average Order Value ($)', fontsize=11, fontweight='bold')
-        ax4.set_title('Average Order Value by Retailer Type', fontsize=13, fontweight='bold')
-        
-        plt.tight_layout()
-        plt.savefig(VISUALIZATIONS_DIR / 'retailer_performance.png', dpi=300, bbox_inches='tight')
-        plt.close()
-        
-        self.insights['retailer_performance'] = df.to_dict('records')
+        if self.render_png:
+            plt, sns = _pyplot()
+            fig, axes = plt.subplots(2, 2, figsize=(16, 12))
+            
+            # Top retailers by revenue
+            ax1 = axes[0, 0]
+            colors = sns.color_palette("coolwarm", len(df))
+            bars = ax1.barh(df['retailer_name'], df['revenue'], color=colors)
+            ax1.set_xlabel('Revenue ($)', fontsize=11, fontweight='bold')
+            ax1.set_title('Top 15 Retailers by Revenue', fontsize=13, fontweight='bold')
+            for i, bar in enumerate(bars):
+                width = bar.get_width()
+                ax1.text(width, bar.get_y() + bar.get_height()/2, 
+                        f'${width:,.0f}', ha='left', va='center', fontsize=8)
+            
+            # Retailer type distribution
+            ax2 = axes[0, 1]
+            retailer_type_counts = df['retailer_type'].value_counts()
+            retailer_type_counts = retailer_type_counts[retailer_type_counts > 0]
+            ax2.pie(retailer_type_counts, labels=retailer_type_counts.index, autopct='%1.1f%%',
+                   colors=sns.color_palette("Set2", len(retailer_type_counts)))
+            ax2.set_title('Retailer Type Distribution (Top 15)', fontsize=13, fontweight='bold')
+            
+            # Transactions vs Revenue scatter
+            ax3 = axes[1, 0]
+            scatter = ax3.scatter(df['transactions'], df['revenue'], 
+                                 s=df['product_variety']*50, alpha=0.6, 
+                                 c=range(len(df)), cmap='viridis')
+            ax3.set_xlabel('Transaction Count', fontsize=11, fontweight='bold')
+            ax3.set_ylabel('Revenue ($)', fontsize=11, fontweight='bold')
+            ax3.set_title('Transactions vs Revenue (bubble size = product variety)', 
+                         fontsize=13, fontweight='bold')
+            
+            # Average order value by retailer type
+            ax4 = axes[1, 1]
+            aov_by_type = df.groupby('retailer_type', observed=True)['avg_order_value'].mean().sort_values(ascending=False)
+            ax4.bar(aov_by_type.index, aov_by_type.values, 
+                   color=sns.color_palette("Set2", len(aov_by_type)))
+            ax4.set_ylabel('Average Order Value ($)', fontsize=11, fontweight='bold')
+            ax4.set_title('Average Order Value by Retailer Type', fontsize=13, fontweight='bold')
+            
+            plt.tight_layout()
+            plt.savefig(VISUALIZATIONS_DIR / 'retailer_performance.png', dpi=300, bbox_inches='tight')
+            plt.close()
+        
+        self._record_insight('retailer_performance', df)
         return df
     
     def analyze_regional_sales(self):
@@ -299,50 +341,54 @@ class FMCGAnalyzer:
         GROUP BY r.state
         ORDER BY revenue DESC
         """
-        df = self.query_to_dataframe(query)
+        df = self.query_to_dataframe(query, 'regional_sales')
+        
+        self.charts['regional_sales'] = build_chart('regional_sales', df)
         
         # Visualization
-        fig, axes = plt.subplots(2, 2, figsize=(16, 12))
-        
-        # Revenue by state
-        ax1 = axes[0, 0]
-        colors = sns.color_palette("RdYlGn", len(df))
-        bars = ax1.barh(df['state'], df['revenue'], color=colors)
-        ax1.set_xlabel('Revenue ($)', fontsize=11, fontweight='bold')
-        ax1.set_title('Revenue by State', fontsize=13, fontweight='bold')
-        for i, bar in enumerate(bars):
-            width = bar.get_width()
-            ax1.text(width, bar.get_y() + bar.get_height()/2, 
-                    f'${width:,.0f}', ha='left', va='center', fontsize=9)
-        
-        # Market share pie chart
-        ax2 = axes[0, 1]
-        ax2.pie(df['revenue'], labels=df['state'], autopct='%1.1f%%', startangle=90)
-        ax2.set_title('Market Share by State', fontsize=13, fontweight='bold')
-        
-        # Retailers vs Revenue
-        ax3 = axes[1, 0]
-        ax3_twin = ax3.twinx()
-        bars = ax3.bar(df['state'], df['retailer_count'], alpha=0.7, color='skyblue', label='Retailers')
-        line = ax3_twin.plot(df['state'], df['revenue'], marker='o', color='red', 
-                            linewidth=2.5, markersize=8, label='Revenue')
-        ax3.set_ylabel('Retailer Count', fontsize=11, fontweight='bold', color='skyblue')
-        ax3_twin.set_ylabel('Revenue ($)', fontsize=11, fontweight='bold', color='red')
-        ax3.set_title('Retailers Count vs Revenue by State', fontsize=13, fontweight='bold')
-        ax3.tick_params(axis='x', rotation=45)
-        
-        # Revenue per retailer
-        ax4 = axes[1, 1]
-        ax4.bar(df['state'], df['revenue_per_retailer'], color=colors, alpha=0.7)
-        ax4.set_ylabel('Revenue per Retailer ($)', fontsize=11, fontweight='bold')
-        ax4.set_title('Revenue per Retailer by State', fontsize=13, fontweight='bold')
-        ax4.tick_params(axis='x', rotation=45)
-        
-        plt.tight_layout()
-        plt.savefig(VISUALIZATIONS_DIR / 'regional_sales.png', dpi=300, bbox_inches='tight')
-        plt.close()
-        
-        self.insights['regional_sales'] = df.to_dict('records')
+        if self.render_png:
+            plt, sns = _pyplot()
+            fig, axes = plt.subplots(2, 2, figsize=(16, 12))
+            
+            # Revenue by state
+            ax1 = axes[0, 0]
+            colors = sns.color_palette("RdYlGn", len(df))
+            bars = ax1.barh(df['state'], df['revenue'], color=colors)
+            ax1.set_xlabel('Revenue ($)', fontsize=11, fontweight='bold')
+            ax1.set_title('Revenue by State', fontsize=13, fontweight='bold')
+            for i, bar in enumerate(bars):
+                width = bar.get_width()
+                ax1.text(width, bar.get_y() + bar.get_height()/2, 
+                        f'${width:,.0f}', ha='left', va='center', fontsize=9)
+            
+            # Market share pie chart
+            ax2 = axes[0, 1]
+            ax2.pie(df['revenue'], labels=df['state'], autopct='%1.1f%%', startangle=90)
+            ax2.set_title('Market Share by State', fontsize=13, fontweight='bold')
+            
+            # Retailers vs Revenue
+            ax3 = axes[1, 0]
+            ax3_twin = ax3.twinx()
+            bars = ax3.bar(df['state'], df['retailer_count'], alpha=0.7, color='skyblue', label='Retailers')
+            line = ax3_twin.plot(df['state'], df['revenue'], marker='o', color='red', 
+                                linewidth=2.5, markersize=8, label='Revenue')
+            ax3.set_ylabel('Retailer Count', fontsize=11, fontweight='bold', color='skyblue')
+            ax3_twin.set_ylabel('Revenue ($)', fontsize=11, fontweight='bold', color='red')
+            ax3.set_title('Retailers Count vs Revenue by State', fontsize=13, fontweight='bold')
+            ax3.tick_params(axis='x', rotation=45)
+            
+            # Revenue per retailer
+            ax4 = axes[1, 1]
+            ax4.bar(df['state'], df['revenue_per_retailer'], color=colors, alpha=0.7)
+            ax4.set_ylabel('Revenue per Retailer ($)', fontsize=11, fontweight='bold')
+            ax4.set_title('Revenue per Retailer by State', fontsize=13, fontweight='bold')
+            ax4.tick_params(axis='x', rotation=45)
+            
+            plt.tight_layout()
+            plt.savefig(VISUALIZATIONS_DIR / 'regional_sales.png', dpi=300, bbox_inches='tight')
+            plt.close()
+        
+        self._record_insight('regional_sales', df)
         return df
     
     # ========================================================================
@@ -365,68 +411,76 @@ class FMCGAnalyzer:
         GROUP BY cd.age_group, cd.income_level
         ORDER BY total_purchases DESC
         """
-        df = self.query_to_dataframe(query)
+        df = self.query_to_dataframe(query, 'customer_demographics')
+        
+        self.charts['customer_demographics'] = build_chart('customer_demographics', df)
         
         # Visualization
-        fig, axes = plt.subplots(2, 2, figsize=(16, 12))
-        
-        # Customers by age and income
-        pivot_customers = df.pivot_table(values='customer_count', 
-                                        index='age_group', 
-                                        columns='income_level', 
-                                        aggfunc='sum')
-        ax1 = axes[0, 0]
-        pivot_customers.plot(kind='bar', ax=ax1, color=sns.color_palette("Set2", 3))
-        ax1.set_ylabel('Customer Count', fontsize=11, fontweight='bold')
-        ax1.set_xlabel('Age Group', fontsize=11, fontweight='bold')
-        ax1.set_title('Customer Distribution by Age & Income Level', fontsize=13, fontweight='bold')
-        ax1.legend(title='Income Level', fontsize=10)
-        ax1.tick_params(axis='x', rotation=45)
-        
-        # Purchases by age and income
-        pivot_purchases = df.pivot_table(values='total_purchases', 
-                                        index='age_group', 
-                                        columns='income_level', 
-                                        aggfunc='sum')
-        ax2 = axes[0, 1]
-        pivot_purchases.plot(kind='bar', ax=ax2, color=sns.color_palette("Set2", 3))
-        ax2.set_ylabel('Total Purchases', fontsize=11, fontweight='bold')
-        ax2.set_xlabel('Age Group', fontsize=11, fontweight='bold')
-        ax2.set_title('Purchase Count by Age & Income Level', fontsize=13, fontweight='bold')
-        ax2.legend(title='Income Level', fontsize=10)
-        ax2.tick_params(axis='x', rotation=45)
-        
-        # Average purchases per customer
-        pivot_avg = df.pivot_table(values='avg_purchases_per_customer', 
-                                   index='age_group', 
-                                   columns='income_level', 
-                                   aggfunc='mean')
-        ax3 = axes[1, 0]
-        pivot_avg.plot(kind='bar', ax=ax3, color=sns.color_palette("Set2", 3))
-        ax3.set_ylabel('Avg Purchases per Customer', fontsize=11, fontweight='bold')
-        ax3.set_xlabel('Age Group', fontsize=11, fontweight='bold')
-        ax3.set_title('Average Purchases per Customer by Demographics', fontsize=13, fontweight='bold')
-        ax3.legend(title='Income Level', fontsize=10)
-        ax3.tick_params(axis='x', rotation=45)
-        
-        # Average units per purchase
-        pivot_units = df.pivot_table(values='avg_units_per_purchase', 
-                                     index='age_group', 
-                                     columns='income_level', 
-                                     aggfunc='mean')
-        ax4 = axes[1, 1]
-        pivot_units.plot(kind='bar', ax=ax4, color=sns.color_palette("Set2", 3))
-        ax4.set_ylabel('Avg Units per Purchase', fontsize=11, fontweight='bold')
-        ax4.set_xlabel('Age Group', fontsize=11, fontweight='bold')
-        ax4.set_title('Average Units per Purchase by Demographics', fontsize=13, fontweight='bold')
-        ax4.legend(title='Income Level', fontsize=10)
-        ax4.tick_params(axis='x', rotation=45)
-        
-        plt.tight_layout()
-        plt.savefig(VISUALIZATIONS_DIR / 'customer_demographics.png', dpi=300, bbox_inches='tight')
-        plt.close()
-        
-        self.insights['customer_demographics'] = df.to_dict('records')
+        if self.render_png:
+            plt, sns = _pyplot()
+            fig, axes = plt.subplots(2, 2, figsize=(16, 12))
+            
+            # Customers by age and income
+            pivot_customers = df.pivot_table(values='customer_count', 
+                                            index='age_group', 
+                                            columns='income_level', 
+                                            aggfunc='sum',
+                                            observed=True)
+            ax1 = axes[0, 0]
+            pivot_customers.plot(kind='bar', ax=ax1, color=sns.color_palette("Set2", 3))
+            ax1.set_ylabel('Customer Count', fontsize=11, fontweight='bold')
+            ax1.set_xlabel('Age Group', fontsize=11, fontweight='bold')
+            ax1.set_title('Customer Distribution by Age & Income Level', fontsize=13, fontweight='bold')
+            ax1.legend(title='Income Level', fontsize=10)
+            ax1.tick_params(axis='x', rotation=45)
+            
+            # Purchases by age and income
+            pivot_purchases = df.pivot_table(values='total_purchases', 
+                                            index='age_group', 
+                                            columns='income_level', 
+                                            aggfunc='sum',
+                                            observed=True)
+            ax2 = axes[0, 1]
+            pivot_purchases.plot(kind='bar', ax=ax2, color=sns.color_palette("Set2", 3))
+            ax2.set_ylabel('Total Purchases', fontsize=11, fontweight='bold')
+            ax2.set_xlabel('Age Group', fontsize=11, fontweight='bold')
+            ax2.set_title('Purchase Count by Age & Income Level', fontsize=13, fontweight='bold')
+            ax2.legend(title='Income Level', fontsize=10)
+            ax2.tick_params(axis='x', rotation=45)
+            
+            # Average purchases per customer
+            pivot_avg = df.pivot_table(values='avg_purchases_per_customer', 
+                                       index='age_group', 
+                                       columns='income_level', 
+                                       aggfunc='mean',
+                                       observed=True)
+            ax3 = axes[1, 0]
+            pivot_avg.plot(kind='bar', ax=ax3, color=sns.color_palette("Set2", 3))
+            ax3.set_ylabel('Avg Purchases per Customer', fontsize=11, fontweight='bold')
+            ax3.set_xlabel('Age Group', fontsize=11, fontweight='bold')
+            ax3.set_title('Average Purchases per Customer by Demographics', fontsize=13, fontweight='bold')
+            ax3.legend(title='Income Level', fontsize=10)
+            ax3.tick_params(axis='x', rotation=45)
+            
+            # Average units per purchase
+            pivot_units = df.pivot_table(values='avg_units_per_purchase', 
+                                         index='age_group', 
+                                         columns='income_level', 
+                                         aggfunc='mean',
+                                         observed=True)
+            ax4 = axes[1, 1]
+            pivot_units.plot(kind='bar', ax=ax4, color=sns.color_palette("Set2", 3))
+            ax4.set_ylabel('Avg Units per Purchase', fontsize=11, fontweight='bold')
+            ax4.set_xlabel('Age Group', fontsize=11, fontweight='bold')
+            ax4.set_title('Average Units per Purchase by Demographics', fontsize=13, fontweight='bold')
+            ax4.legend(title='Income Level', fontsize=10)
+            ax4.tick_params(axis='x', rotation=45)
+            
+            plt.tight_layout()
+            plt.savefig(VISUALIZATIONS_DIR / 'customer_demographics.png', dpi=300, bbox_inches='tight')
+            plt.close()
+        
+        self._record_insight('customer_demographics', df)
         return df
     
     # ========================================================================
@@ -448,50 +502,54 @@ class FMCGAnalyzer:
         GROUP BY p.product_id
         ORDER BY total_stock DESC
         """
-        df = self.query_to_dataframe(query)
+        df = self.query_to_dataframe(query, 'inventory_status')
+        
+        self.charts['inventory_status'] = build_chart('inventory_status', df)
         
         # Visualization
-        fig, axes = plt.subplots(2, 2, figsize=(16, 12))
-        
-        # Total stock by product
-        ax1 = axes[0, 0]
-        colors = sns.color_palette("viridis", len(df))
-        bars = ax1.barh(df['product_name'], df['total_stock'], color=colors)
-        ax1.set_xlabel('Total Stock Units', fontsize=11, fontweight='bold')
-        ax1.set_title('Current Inventory Levels by Product', fontsize=13, fontweight='bold')
-        
-        # Stock distribution
-        ax2 = axes[0, 1]
-        ax2.scatter(df['retailer_locations'], df['total_stock'], 
-                   s=df['avg_stock_per_location']*10, alpha=0.6, c=range(len(df)), cmap='viridis')
-        ax2.set_xlabel('Number of Retailer Locations', fontsize=11, fontweight='bold')
-        ax2.set_ylabel('Total Stock Units', fontsize=11, fontweight='bold')
-        ax2.set_title('Stock Distribution Across Locations', fontsize=13, fontweight='bold')
-        
-        # Low stock alerts
-        ax3 = axes[1, 0]
-        low_stock = df[df['locations_below_reorder'] > 0].sort_values('locations_below_reorder', ascending=False)
-        if len(low_stock) > 0:
-            ax3.barh(low_stock['product_name'], low_stock['locations_below_reorder'], color='#FF6B6B')
-            ax3.set_xlabel('Number of Locations Below Reorder Level', fontsize=11, fontweight='bold')
-            ax3.set_title('Low Stock Alert - Products Below Reorder Level', fontsize=13, fontweight='bold')
-        else:
-            ax3.text(0.5, 0.5, 'No products below reorder level', 
-                    ha='center', va='center', transform=ax3.transAxes, fontsize=12)
-        
-        # Average stock per location
-        ax4 = axes[1, 1]
-        top_avg_stock = df.nlargest(10, 'avg_stock_per_location')
-        ax4.barh(top_avg_stock['product_name'], top_avg_stock['avg_stock_per_location'], 
-                color=sns.color_palette("coolwarm", 10))
-        ax4.set_xlabel('Average Stock per Location', fontsize=11, fontweight='bold')
-        ax4.set_title('Top 10 Products by Average Stock per Location', fontsize=13, fontweight='bold')
-        
-        plt.tight_layout()
-        plt.savefig(VISUALIZATIONS_DIR / 'inventory_status.png', dpi=300, bbox_inches='tight')
-        plt.close()
-        
-        self.insights['inventory_status'] = df.to_dict('records')
+        if self.render_png:
+            plt, sns = _pyplot()
+            fig, axes = plt.subplots(2, 2, figsize=(16, 12))
+            
+            # Total stock by product
+            ax1 = axes[0, 0]
+            colors = sns.color_palette("viridis", len(df))
+            bars = ax1.barh(df['product_name'], df['total_stock'], color=colors)
+            ax1.set_xlabel('Total Stock Units', fontsize=11, fontweight='bold')
+            ax1.set_title('Current Inventory Levels by Product', fontsize=13, fontweight='bold')
+            
+            # Stock distribution
+            ax2 = axes[0, 1]
+            ax2.scatter(df['retailer_locations'], df['total_stock'], 
+                       s=df['avg_stock_per_location']*10, alpha=0.6, c=range(len(df)), cmap='viridis')
+            ax2.set_xlabel('Number of Retailer Locations', fontsize=11, fontweight='bold')
+            ax2.set_ylabel('Total Stock Units', fontsize=11, fontweight='bold')
+            ax2.set_title('Stock Distribution Across Locations', fontsize=13, fontweight='bold')
+            
+            # Low stock alerts
+            ax3 = axes[1, 0]
+            low_stock = df[df['locations_below_reorder'] > 0].sort_values('locations_below_reorder', ascending=False)
+            if len(low_stock) > 0:
+                ax3.barh(low_stock['product_name'], low_stock['locations_below_reorder'], color='#FF6B6B')
+                ax3.set_xlabel('Number of Locations Below Reorder Level', fontsize=11, fontweight='bold')
+                ax3.set_title('Low Stock Alert - Products Below Reorder Level', fontsize=13, fontweight='bold')
+            else:
+                ax3.text(0.5, 0.5, 'No products below reorder level', 
+                        ha='center', va='center', transform=ax3.transAxes, fontsize=12)
+            
+            # Average stock per location
+            ax4 = axes[1, 1]
+            top_avg_stock = df.nlargest(10, 'avg_stock_per_location')
+            ax4.barh(top_avg_stock['product_name'], top_avg_stock['avg_stock_per_location'], 
+                    color=sns.color_palette("coolwarm", 10))
+            ax4.set_xlabel('Average Stock per Location', fontsize=11, fontweight='bold')
+            ax4.set_title('Top 10 Products by Average Stock per Location', fontsize=13, fontweight='bold')
+            
+            plt.tight_layout()
+            plt.savefig(VISUALIZATIONS_DIR / 'inventory_status.png', dpi=300, bbox_inches='tight')
+            plt.close()
+        
+        self._record_insight('inventory_status', df)
         return df
     
     # ========================================================================
@@ -513,10 +571,10 @@ class FMCGAnalyzer:
             ROUND(AVG(s.discount_percent), 2) as avg_discount_rate
         FROM sales s
         """
-        df = self.query_to_dataframe(query)
+        df = self.query_to_dataframe(query, 'statistical_summary')
         
         amounts_query = "SELECT total_amount FROM sales"
-        amounts_df = self.query_to_dataframe(amounts_query)
+        amounts_df = self.query_to_dataframe(amounts_query, 'transaction_amounts')
         stdev = amounts_df['total_amount'].std()
         
         summary = df.to_dict('records')[0]
@@ -553,39 +611,60 @@ class FMCGAnalyzer:
         print("  → Generating statistical summary...")
         self.generate_statistical_summary()
         
+        if self.memory_report:
+            print("  → Memory footprint with compact dtypes:")
+            for line in format_memory_report(self.memory_report):
+                print(line)
+        
         print("✓ All analysis complete!")
         return self.insights
     
-    def save_insights_json(self, output_file):
-        """Save insights to JSON file"""
-        # Convert datetime objects to strings for JSON serialization
-        insights_serializable = {}
-        for key, value in self.insights.items():
-            if isinstance(value, list):
-                insights_serializable[key] = [
-                    {k: (str(v) if isinstance(v, (pd.Timestamp, datetime)) else v) 
-                     for k, v in item.items()}
-                    for item in value
-                ]
-            elif isinstance(value, dict):
-                insights_serializable[key] = {
-                    k: (str(v) if isinstance(v, (pd.Timestamp, datetime)) else v) 
-                    for k, v in value.items()
-                }
-            else:
-                insights_serializable[key] = value
-        
-        with open(output_file, 'w') as f:
-            json.dump(insights_serializable, f, indent=2)
-        
-        print(f"✓ Insights saved to {output_file}")
+    def save_insights_json(self, output_file, compressions=(), public_dir=None):
+        """Save insights to JSON, encoding each analysis frame column by column, and publish them"""
+        report = {name: self.frames.get(name, value) for name, value in self.insights.items()}
+        sizes = write_json(report, output_file, compressions, public_dir)
+        print(f"✓ Insights saved to {output_file} ({format_sizes(sizes)})")
+        if public_dir is not None:
+            print(f"✓ Insights published to {public_dir}")
+    
+    def save_chart_data(self, output_file, public_dir=None):
+        """Save the chart specs the dashboard renders client-side, and publish them"""
+        sizes = save_chart_data(self.charts, output_file, public_dir)
+        print(f"✓ Chart data saved to {output_file} ({format_sizes(sizes)})")
+        if public_dir is not None:
+            print(f"✓ Chart data published to {public_dir}")
 
 def main():
-    analyzer = FMCGAnalyzer(DB_PATH)
+    parser = argparse.ArgumentParser(description='FMCG Healthcare data analysis')
+    parser.add_argument('--in-memory', action='store_true',
+                        help='analyze an in-memory snapshot of the database')
+    parser.add_argument('--no-png', action='store_true',
+                        help='skip matplotlib entirely and only write the chart data feed')
+    parser.add_argument('--top-k', action='store_true',
+                        help='refine the top products from the persisted heavy-hitter summaries')
+    parser.add_argument('--compress', nargs='*', choices=COMPRESSIONS, default=[],
+                        help='also write pre-compressed copies of the insights JSON')
+    parser.add_argument('--public-dir', type=Path, default=PUBLIC_DIR,
+                        help='directory the web server serves the insights and chart data from')
+    args = parser.parse_args()
+    
+    heavy_hitters = None
+    if args.top_k:
+        conn = sqlite3.connect(DB_PATH)
+        try:
+            heavy_hitters = load_heavy_hitters(conn)
+        finally:
+            conn.close()
+    
+    analyzer = FMCGAnalyzer(DB_PATH, in_memory=args.in_memory, render_png=not args.no_png,
+                            heavy_hitters=heavy_hitters)
     insights = analyzer.run_all_analysis()
-    analyzer.save_insights_json(OUTPUT_DIR / 'analysis_insights.json')
+    public_dir = resolve_public_dir(args.public_dir)
+    analyzer.save_insights_json(OUTPUT_DIR / 'analysis_insights.json', args.compress, public_dir)
+    analyzer.save_chart_data(OUTPUT_DIR / 'chart_data.json', public_dir)
     
-    print(f"\n✓ Visualizations saved to: {VISUALIZATIONS_DIR}")
+    if not args.no_png:
+        print(f"\n✓ Visualizations saved to: {VISUALIZATIONS_DIR}")
     print(f"✓ Insights JSON saved to: {OUTPUT_DIR / 'analysis_insights.json'}")
 
 if __name__ == '__main__':
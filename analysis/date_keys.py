@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+Integer Date Keys
+Migrates sales dates to integer day/month keys with a date dimension, optionally clustering sales by month and product
+"""
+
+import argparse
+import sqlite3
+import time
+
+DB_PATH = '/home/ubuntu/fmcg-healthcare-portfolio/data/fmcg_healthcare.db'
+
+# day_key is days since 1970-01-01 (as in the sales snapshot); month_key is YYYYMM
+DAY_KEY_SQL = "CAST(julianday({col}) - 2440587.5 AS INTEGER)"
+MONTH_KEY_SQL = "CAST(strftime('%Y%m', {col}) AS INTEGER)"
+
+DATE_DIM_SCHEMA = """
+CREATE TABLE IF NOT EXISTS date_dim (
+    day_key INTEGER PRIMARY KEY,
+    date TEXT NOT NULL UNIQUE,
+    month_key INTEGER NOT NULL,
+    month_label TEXT NOT NULL,
+    year INTEGER NOT NULL,
+    quarter TEXT NOT NULL,
+    month INTEGER NOT NULL,
+    day_of_week INTEGER NOT NULL
+)
+"""
+
+# Adds the date_dim row for a date expression if it is not there yet
+DATE_DIM_INSERT = """
+INSERT OR IGNORE INTO date_dim (day_key, date, month_key, month_label, year, quarter, month, day_of_week)
+SELECT
+    CAST(julianday(d) - 2440587.5 AS INTEGER),
+    d,
+    CAST(strftime('%Y%m', d) AS INTEGER),
+    strftime('%Y-%m', d),
+    CAST(strftime('%Y', d) AS INTEGER),
+    'Q' || ((CAST(strftime('%m', d) AS INTEGER) + 2) / 3),
+    CAST(strftime('%m', d) AS INTEGER),
+    CAST(strftime('%w', d) AS INTEGER)
+FROM ({dates})
+WHERE d IS NOT NULL
+"""
+
+# (table, date column, day key column, month key column, primary key)
+KEYED_TABLES = [
+    ('sales', 'sale_date', 'day_key', 'month_key', 'sale_id'),
+    ('sales_by_customer', 'purchase_date', 'purchase_day_key', 'purchase_month_key', 'transaction_id'),
+]
+
+# Key-based versions of the date-bucketed reports in execute_sql_analysis. Rows whose date does not parse have
+# NULL keys and land where the original SQL puts them: a NULL month, and Q4 (the quarter CASE's ELSE).
+DATE_KEY_QUERIES = {
+    'monthly_sales_trend': """
+        SELECT
+            CASE WHEN s.month_key IS NOT NULL
+                THEN printf('%04d-%02d', s.month_key / 100, s.month_key % 100) END as month,
+            COUNT(s.sale_id) as transaction_count,
+            SUM(s.quantity_sold) as units_sold,
+            SUM(s.total_amount) as monthly_revenue,
+            ROUND(AVG(s.total_amount), 2) as avg_order_value,
+            ROUND(AVG(s.discount_percent), 2) as avg_discount
+        FROM sales s
+        GROUP BY s.month_key
+        ORDER BY month
+        """,
+    'seasonal_trends': """
+        SELECT
+            COALESCE(d.quarter, 'Q4') as quarter,
+            p.category,
+            COUNT(s.sale_id) as transaction_count,
+            SUM(s.quantity_sold) as units_sold,
+            SUM(s.total_amount) as revenue,
+            ROUND(AVG(s.total_amount), 2) as avg_order_value
+        FROM sales s
+        LEFT JOIN date_dim d ON s.day_key = d.day_key
+        JOIN products p ON s.product_id = p.product_id
+        GROUP BY COALESCE(d.quarter, 'Q4'), p.category
+        ORDER BY COALESCE(d.quarter, 'Q4'), revenue DESC
+        """,
+}
+
+def _columns(conn, table):
+    return {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+
+def has_date_keys(conn):
+    """True once the migration has added keys to sales and created date_dim"""
+    return 'month_key' in _columns(conn, 'sales') and 'day_key' in _columns(conn, 'date_dim')
+
+def is_clustered(conn):
+    """True when sales is stored WITHOUT ROWID, clustered by (month_key, product_id)"""
+    row = conn.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'sales'").fetchone()
+    return bool(row) and 'WITHOUT ROWID' in row[0].upper()
+
+def _create_key_triggers(conn, table, date_col, day_col, month_col, key_col):
+    """Keep date_dim and the keys in sync for writers that only supply the date
+    
+    The insert trigger only fires for rows inserted without keys. Bulk writers that supply the keys
+    (data/ingest_sales.py) add their dates to date_dim once per batch instead of paying a lookup and an
+    UPDATE per row. Any older, unconditional insert trigger is replaced. Statements go through execute, not
+    executescript, which would commit the caller's transaction.
+    """
+    dates = f"SELECT NEW.{date_col} as d"
+    conn.execute(f"DROP TRIGGER IF EXISTS trg_{table}_date_keys_insert")
+    conn.execute(f"""
+        CREATE TRIGGER trg_{table}_date_keys_insert
+        AFTER INSERT ON {table}
+        WHEN NEW.{day_col} IS NULL
+        BEGIN
+            {DATE_DIM_INSERT.format(dates=dates)};
+            UPDATE {table}
+            SET {day_col} = {DAY_KEY_SQL.format(col=f'NEW.{date_col}')},
+                {month_col} = {MONTH_KEY_SQL.format(col=f'NEW.{date_col}')}
+            WHERE {key_col} = NEW.{key_col};
+        END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_{table}_date_keys_update
+        AFTER UPDATE OF {date_col} ON {table}
+        BEGIN
+            {DATE_DIM_INSERT.format(dates=dates)};
+            UPDATE {table}
+            SET {day_col} = {DAY_KEY_SQL.format(col=f'NEW.{date_col}')},
+                {month_col} = {MONTH_KEY_SQL.format(col=f'NEW.{date_col}')}
+            WHERE {key_col} = NEW.{key_col};
+        END
+    """)
+
+def migrate(conn):
+    """Add integer date keys, the date dimension, indexes and sync triggers (idempotent)
+    
+    Runs in one savepoint whatever the connection's isolation level, so a failure leaves no table with key
+    columns that has_date_keys would trust before they are filled.
+    """
+    start = time.perf_counter()
+    conn.execute("SAVEPOINT migrate_date_keys")
+    try:
+        conn.execute(DATE_DIM_SCHEMA)
+        for table, date_col, day_col, month_col, key_col in KEYED_TABLES:
+            existing = _columns(conn, table)
+            for column in (day_col, month_col):
+                if column not in existing:
+                    conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} INTEGER")
+            conn.execute(f"""
+                UPDATE {table}
+                SET {day_col} = {DAY_KEY_SQL.format(col=date_col)},
+                    {month_col} = {MONTH_KEY_SQL.format(col=date_col)}
+                WHERE {day_col} IS NULL
+            """)
+            conn.execute(DATE_DIM_INSERT.format(dates=f"SELECT DISTINCT {date_col} as d FROM {table}"))
+            _create_key_triggers(conn, table, date_col, day_col, month_col, key_col)
+        
+        if not is_clustered(conn):
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_sales_month_product ON sales(month_key, product_id)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_sales_by_customer_month "
+                     "ON sales_by_customer(purchase_month_key)")
+    except BaseException:
+        conn.execute("ROLLBACK TO migrate_date_keys")
+        conn.execute("RELEASE migrate_date_keys")
+        raise
+    conn.execute("RELEASE migrate_date_keys")
+    return time.perf_counter() - start
+
+def cluster_sales(conn):
+    """Rebuild sales as a WITHOUT ROWID table ordered by (month_key, product_id, sale_id)
+    
+    sale_id stays unique through an index, but it is no longer the rowid, so every
+    writer must supply sale_id and the date keys (data/ingest_sales.py does).
+    """
+    if is_clustered(conn):
+        return 0.0
+    if not has_date_keys(conn):
+        migrate(conn)
+    
+    start = time.perf_counter()
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(sales)")]
+    extra_indexes = [sql for (name, sql) in conn.execute(
+        "SELECT name, sql FROM sqlite_master WHERE type = 'index' AND tbl_name = 'sales' AND sql IS NOT NULL")
+        if name != 'idx_sales_month_product']
+    triggers = [sql for (sql,) in conn.execute(
+        "SELECT sql FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'sales'")]
+    
+    foreign_keys = conn.execute("PRAGMA foreign_keys").fetchone()[0]
+    conn.execute("PRAGMA foreign_keys = OFF")
+    conn.execute("BEGIN")
+    try:
+        conn.execute("""
+            CREATE TABLE sales_clustered (
+                sale_id INTEGER NOT NULL,
+                product_id INTEGER NOT NULL,
+                retailer_id INTEGER NOT NULL,
+                sale_date DATE NOT NULL,
+                quantity_sold INTEGER NOT NULL,
+                unit_price REAL NOT NULL,
+                total_amount REAL NOT NULL,
+                discount_percent REAL DEFAULT 0,
+                day_key INTEGER NOT NULL,
+                month_key INTEGER NOT NULL,
+                PRIMARY KEY (month_key, product_id, sale_id),
+                FOREIGN KEY (product_id) REFERENCES products(product_id),
+                FOREIGN KEY (retailer_id) REFERENCES retailers(retailer_id)
+            ) WITHOUT ROWID
+        """)
+        column_list = ', '.join(columns)
+        conn.execute(f"INSERT INTO sales_clustered ({column_list}) SELECT {column_list} FROM sales "
+                     "ORDER BY month_key, product_id, sale_id")
+        conn.execute("DROP TABLE sales")
+        conn.execute("ALTER TABLE sales_clustered RENAME TO sales")
+        conn.execute("CREATE UNIQUE INDEX idx_sales_sale_id ON sales(sale_id)")
+        for sql in extra_indexes + triggers:
+            conn.execute(sql)
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.execute(f"PRAGMA foreign_keys = {foreign_keys}")
+    return time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description='Migrate sales dates to integer keys')
+    parser.add_argument('--db', default=DB_PATH)
+    parser.add_argument('--cluster', action='store_true',
+                        help='also rebuild sales WITHOUT ROWID, clustered by (month_key, product_id)')
+    args = parser.parse_args()
+    
+    conn = sqlite3.connect(args.db, isolation_level=None)
+    try:
+        elapsed = migrate(conn)
+        days = conn.execute("SELECT COUNT(*) FROM date_dim").fetchone()[0]
+        print(f"✓ Date keys added and date_dim populated ({days:,} days) in {elapsed:.2f}s")
+        if args.cluster:
+            elapsed = cluster_sales(conn)
+            print(f"✓ sales clustered by (month_key, product_id) in {elapsed:.2f}s")
+        conn.execute("ANALYZE")
+    finally:
+        conn.close()
+
+if __name__ == '__main__':
+    main()
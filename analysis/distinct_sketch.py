@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+Approximate Distinct Counts
+HyperLogLog sketches for COUNT(DISTINCT ...) in bounded memory: mergeable states, SQLite aggregates and an approximate report mode
+"""
+
+import argparse
+import hashlib
+import math
+import re
+import sqlite3
+import time
+import numpy as np
+import pandas as pd
+
+DB_PATH = '/home/ubuntu/fmcg-healthcare-portfolio/data/fmcg_healthcare.db'
+
+# Relative standard error of the default sketch (precision 14: 16,384 one-byte registers)
+DEFAULT_ERROR = 0.01
+MIN_PRECISION, MAX_PRECISION = 4, 18
+# Values buffered by the SQLite aggregates before they are hashed in one vectorized batch
+STEP_BATCH = 8192
+
+_MASK64 = np.uint64(0xFFFFFFFFFFFFFFFF)
+
+def precision_for_error(error):
+    """Smallest precision whose standard error 1.04/sqrt(2^p) is within error"""
+    p = math.ceil(math.log2((1.04 / error) ** 2))
+    return min(max(p, MIN_PRECISION), MAX_PRECISION)
+
+def hash64(values):
+    """64-bit hashes: splitmix64 for integers, blake2b for anything else"""
+    values = np.asarray(values)
+    if values.dtype.kind in 'iub':
+        z = values.astype(np.uint64)
+    else:
+        z = np.array([_hash_object(v) for v in values.tolist()], dtype=np.uint64)
+    with np.errstate(over='ignore'):
+        z = z + np.uint64(0x9E3779B97F4A7C15)
+        z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return z ^ (z >> np.uint64(31))
+
+def _hash_object(value):
+    # Integral floats count as the integer, as in SQL DISTINCT
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    if isinstance(value, int):
+        return value & 0xFFFFFFFFFFFFFFFF
+    return int.from_bytes(hashlib.blake2b(repr(value).encode(), digest_size=8).digest(), 'little')
+
+def _bit_length(x):
+    """Vectorized bit length of uint64 values (exact: each half fits a float64)"""
+    hi = (x >> np.uint64(32)).astype(np.float64)
+    lo = (x & np.uint64(0xFFFFFFFF)).astype(np.float64)
+    return np.where(hi > 0, 32 + np.frexp(hi)[1], np.frexp(lo)[1])
+
+def _sigma(x):
+    """x + sum_k x^(2^k) 2^(k-1): the empty-register term of Ertl's estimator"""
+    if x == 1:
+        return math.inf
+    y, z = 1.0, x
+    while True:
+        x *= x
+        previous = z
+        z += x * y
+        y += y
+        if z == previous:
+            return z
+
+def _tau(x):
+    """The saturated-register term of Ertl's estimator"""
+    if x == 0 or x == 1:
+        return 0.0
+    y, z = 1.0, 1 - x
+    while True:
+        x = math.sqrt(x)
+        previous = z
+        y *= 0.5
+        z -= (1 - x) ** 2 * y
+        if z == previous:
+            return z / 3
+
+class HyperLogLog:
+    """Mergeable distinct-count sketch with 2^precision registers"""
+    
+    def __init__(self, precision=None, error=DEFAULT_ERROR, registers=None):
+        self.precision = precision or precision_for_error(error)
+        if not MIN_PRECISION <= self.precision <= MAX_PRECISION:
+            raise ValueError(f"precision must be between {MIN_PRECISION} and {MAX_PRECISION}")
+        m = 1 << self.precision
+        self.registers = np.zeros(m, dtype=np.uint8) if registers is None else registers
+    
+    @property
+    def standard_error(self):
+        return 1.04 / math.sqrt(len(self.registers))
+    
+    def add_hashes(self, hashes):
+        p = np.uint64(self.precision)
+        index = (hashes >> (np.uint64(64) - p)).astype(np.intp)
+        rest = (hashes << p) & _MASK64
+        rank = np.minimum(64 - _bit_length(rest) + 1, 64 - self.precision + 1).astype(np.uint8)
+        np.maximum.at(self.registers, index, rank)
+        return self
+    
+    def add(self, values):
+        """Add an iterable or array of values (None/NaN are ignored, as COUNT DISTINCT does)"""
+        values = pd.Series(values) if not isinstance(values, pd.Series) else values
+        values = values.dropna()
+        if len(values):
+            self.add_hashes(hash64(values.to_numpy()))
+        return self
+    
+    def merge(self, other):
+        """Union with another sketch of the same precision"""
+        if other.precision != self.precision:
+            raise ValueError("Cannot merge sketches of different precision")
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+    
+    def copy(self):
+        return HyperLogLog(self.precision, registers=self.registers.copy())
+    
+    def count(self):
+        """Estimated number of distinct values (Ertl's improved raw estimator)
+        
+        Works from the register histogram and corrects for empty and saturated registers in closed
+        form, so it is unbiased across the whole range. The classic raw estimate with a switch to linear
+        counting at 2.5m is biased by several percent between roughly 2.5m and 5m.
+        """
+        m = len(self.registers)
+        q = 64 - self.precision
+        counts = np.bincount(self.registers, minlength=q + 2).astype(np.float64)
+        z = m * _tau(1 - counts[q + 1] / m)
+        for k in range(q, 0, -1):
+            z = 0.5 * (z + counts[k])
+        z += m * _sigma(counts[0] / m)
+        return m * m / (2 * math.log(2) * z)
+    
+    def __len__(self):
+        return int(round(self.count()))
+    
+    def to_bytes(self):
+        return bytes([self.precision]) + self.registers.tobytes()
+    
+    @classmethod
+    def from_bytes(cls, data):
+        return cls(data[0], registers=np.frombuffer(data[1:], dtype=np.uint8).copy())
+    
+    @classmethod
+    def union(cls, sketches):
+        sketches = [s for s in sketches if s is not None]
+        result = sketches[0].copy()
+        for sketch in sketches[1:]:
+            result.merge(sketch)
+        return result
+
+# ----------------------------------------------------------------------------
+# SQLite aggregates
+# ----------------------------------------------------------------------------
+
+def _sketch_aggregate(precision, finalize):
+    """SQLite aggregate class that buffers values and feeds them to a sketch in batches"""
+    
+    class SketchAggregate:
+        def __init__(self):
+            self.sketch = None
+            self.buffer = []
+        
+        def step(self, value, error=None):
+            if self.sketch is None:
+                self.sketch = HyperLogLog(precision if error is None else precision_for_error(error))
+            if value is not None:
+                self.buffer.append(value)
+                if len(self.buffer) >= STEP_BATCH:
+                    self._flush()
+        
+        def _flush(self):
+            if self.buffer:
+                self.sketch.add_hashes(hash64(np.array(self.buffer, dtype=object if any(
+                    not isinstance(v, int) for v in self.buffer) else np.int64)))
+                self.buffer = []
+        
+        def finalize(self):
+            if self.sketch is None:
+                self.sketch = HyperLogLog(precision)
+            self._flush()
+            return finalize(self.sketch)
+    
+    return SketchAggregate
+
+class _MergeAggregate:
+    def __init__(self):
+        self.sketch = None
+    
+    def step(self, blob):
+        if blob is not None:
+            sketch = HyperLogLog.from_bytes(blob)
+            self.sketch = sketch if self.sketch is None else self.sketch.merge(sketch)
+    
+    def finalize(self):
+        return None if self.sketch is None else self.sketch.to_bytes()
+
+def register_sketch_functions(conn, error=DEFAULT_ERROR):
+    """Register approx_count_distinct(x[, error]), hll_sketch(x), hll_merge(blob) and hll_count(blob)"""
+    precision = precision_for_error(error)
+    counter = _sketch_aggregate(precision, len)
+    conn.create_aggregate('approx_count_distinct', 1, counter)
+    conn.create_aggregate('approx_count_distinct', 2, counter)
+    conn.create_aggregate('hll_sketch', 1, _sketch_aggregate(precision, HyperLogLog.to_bytes))
+    conn.create_aggregate('hll_merge', 1, _MergeAggregate)
+    conn.create_function('hll_count', 1, lambda blob: None if blob is None else len(HyperLogLog.from_bytes(blob)),
+                         deterministic=True)
+    return conn
+
+_COUNT_DISTINCT = re.compile(r'COUNT\(\s*DISTINCT\s+([^()]+?)\s*\)', re.IGNORECASE)
+
+def approximate_sql(query):
+    """Rewrite COUNT(DISTINCT x) as approx_count_distinct(x)"""
+    return _COUNT_DISTINCT.sub(r'approx_count_distinct(\1)', query)
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare exact and HyperLogLog distinct counts')
+    parser.add_argument('--db', default=DB_PATH)
+    parser.add_argument('--error', type=float, default=DEFAULT_ERROR, help='target relative standard error')
+    args = parser.parse_args()
+    
+    conn = register_sketch_functions(sqlite3.connect(args.db), args.error)
+    print(f"HyperLogLog precision {precision_for_error(args.error)} "
+          f"({1 << precision_for_error(args.error):,} registers)\n")
+    for table, column in [('sales_by_customer', 'customer_id'), ('sales', 'retailer_id'),
+                          ('sales', 'product_id'), ('sales', 'sale_id')]:
+        timings = []
+        for sql in (f"SELECT COUNT(DISTINCT {column}) FROM {table}",
+                    f"SELECT approx_count_distinct({column}) FROM {table}"):
+            start = time.perf_counter()
+            timings.append((conn.execute(sql).fetchone()[0], time.perf_counter() - start))
+        (exact, t_exact), (approx, t_approx) = timings
+        error = (approx - exact) / exact * 100 if exact else 0.0
+        print(f"  {table}.{column:<12} exact {exact:>10,} ({t_exact:.3f}s)   "
+              f"approx {approx:>10,} ({t_approx:.3f}s)   {error:+.2f}%")
+    conn.close()
+
+if __name__ == '__main__':
+    main()
@@ -4,40 +4,36 @@ Execute SQL Analysis Queries and Generate Results
 Runs all SQL queries from sql_queries.sql and exports results
 """
 
+import argparse
 import sqlite3
+import threading
+import time
 import pandas as pd
 from pathlib import Path
 import json
+from sales_cube import CUBE_REPORTS, load_cube
+from memory_db import connect
+from date_keys import DATE_KEY_QUERIES, has_date_keys
+from distinct_sketch import DEFAULT_ERROR, approximate_sql, register_sketch_functions
+from heavy_hitters import TOPK_REPORTS, load_heavy_hitters
 
 DB_PATH = '/home/ubuntu/fmcg-healthcare-portfolio/data/fmcg_healthcare.db'
 OUTPUT_DIR = Path('/home/ubuntu/fmcg-healthcare-portfolio/analysis')
 RESULTS_DIR = OUTPUT_DIR / 'sql_results'
 RESULTS_DIR.mkdir(exist_ok=True)
 
-class SQLAnalyzer:
-    def __init__(self, db_path):
-        self.conn = sqlite3.connect(db_path)
-        self.results = {}
-    
-    def execute_query(self, query_name, query):
-        """Execute a SQL query and store results"""
-        try:
-            df = pd.read_sql_query(query, self.conn)
-            self.results[query_name] = df
-            print(f"  ✓ {query_name}: {len(df)} rows")
-            return df
-        except Exception as e:
-            print(f"  ✗ {query_name}: {str(e)}")
-            return None
-    
-    def run_all_queries(self):
-        """Run all SQL analysis queries"""
-        print("Executing SQL Analysis Queries...\n")
-        
-        # 1. SALES PERFORMANCE ANALYSIS
-        print("1. SALES PERFORMANCE ANALYSIS")
-        
-        self.execute_query("sales_by_category", """
+# Per-query budgets so one pathological query cannot stall the whole report
+QUERY_TIMEOUT_SECONDS = 120
+MAX_RESULT_ROWS = 1_000_000
+PROGRESS_OPCODES = 10_000
+FETCH_BATCH_ROWS = 10_000
+# Extra time the watchdog thread allows before interrupting a query the progress handler missed
+WATCHDOG_GRACE_SECONDS = 5
+
+# Named analysis queries, grouped by report section
+SQL_QUERIES = [
+    ('1. SALES PERFORMANCE ANALYSIS', [
+        ("sales_by_category", """
         SELECT 
             p.category,
             COUNT(s.sale_id) as transactions,
@@ -49,9 +45,8 @@ class SQLAnalyzer:
         JOIN products p ON s.product_id = p.product_id
         GROUP BY p.category
         ORDER BY revenue DESC
-        """)
-        
-        self.execute_query("monthly_sales_trend", """
+        """),
+        ("monthly_sales_trend", """
         SELECT 
             strftime('%Y-%m', s.sale_date) as month,
             COUNT(s.sale_id) as transaction_count,
@@ -62,9 +57,8 @@ class SQLAnalyzer:
         FROM sales s
         GROUP BY strftime('%Y-%m', s.sale_date)
         ORDER BY month
-        """)
-        
-        self.execute_query("top_10_products", """
+        """),
+        ("top_10_products", """
         SELECT 
             p.product_id,
             p.product_name,
@@ -79,9 +73,8 @@ class SQLAnalyzer:
         GROUP BY p.product_id
         ORDER BY total_revenue DESC
         LIMIT 10
-        """)
-        
-        self.execute_query("sales_by_retailer_type", """
+        """),
+        ("sales_by_retailer_type", """
         SELECT 
             r.retailer_type,
             COUNT(DISTINCT r.retailer_id) as retailer_count,
@@ -94,9 +87,8 @@ class SQLAnalyzer:
         JOIN retailers r ON s.retailer_id = r.retailer_id
         GROUP BY r.retailer_type
         ORDER BY total_revenue DESC
-        """)
-        
-        self.execute_query("discount_impact_analysis", """
+        """),
+        ("discount_impact_analysis", """
         SELECT 
             CASE 
                 WHEN discount_percent = 0 THEN 'No Discount'
@@ -112,12 +104,10 @@ class SQLAnalyzer:
         FROM sales s
         GROUP BY discount_range
         ORDER BY discount_percent
-        """)
-        
-        # 2. DISTRIBUTION & RETAILER ANALYSIS
-        print("\n2. DISTRIBUTION & RETAILER ANALYSIS")
-        
-        self.execute_query("sales_by_region_distributor", """
+        """),
+    ]),
+    ('2. DISTRIBUTION & RETAILER ANALYSIS', [
+        ("sales_by_region_distributor", """
         SELECT 
             d.region,
             d.distributor_name,
@@ -131,9 +121,8 @@ class SQLAnalyzer:
         JOIN distributors d ON r.distributor_id = d.distributor_id
         GROUP BY d.distributor_id
         ORDER BY total_revenue DESC
-        """)
-        
-        self.execute_query("top_retailers", """
+        """),
+        ("top_retailers", """
         SELECT 
             r.retailer_id,
             r.retailer_name,
@@ -151,9 +140,8 @@ class SQLAnalyzer:
         GROUP BY r.retailer_id
         ORDER BY total_revenue DESC
         LIMIT 15
-        """)
-        
-        self.execute_query("regional_sales_distribution", """
+        """),
+        ("regional_sales_distribution", """
         SELECT 
             r.state,
             COUNT(DISTINCT r.retailer_id) as retailer_count,
@@ -166,12 +154,10 @@ class SQLAnalyzer:
         JOIN retailers r ON s.retailer_id = r.retailer_id
         GROUP BY r.state
         ORDER BY total_revenue DESC
-        """)
-        
-        # 3. INVENTORY MANAGEMENT
-        print("\n3. INVENTORY MANAGEMENT")
-        
-        self.execute_query("inventory_status", """
+        """),
+    ]),
+    ('3. INVENTORY MANAGEMENT', [
+        ("inventory_status", """
         SELECT 
             p.product_name,
             p.category,
@@ -185,9 +171,8 @@ class SQLAnalyzer:
         JOIN products p ON i.product_id = p.product_id
         GROUP BY p.product_id
         ORDER BY total_stock DESC
-        """)
-        
-        self.execute_query("low_stock_alert", """
+        """),
+        ("low_stock_alert", """
         SELECT 
             i.inventory_id,
             p.product_name,
@@ -204,9 +189,8 @@ class SQLAnalyzer:
         JOIN retailers r ON i.retailer_id = r.retailer_id
         WHERE i.stock_quantity < i.reorder_level
         ORDER BY units_needed DESC
-        """)
-        
-        self.execute_query("inventory_turnover", """
+        """),
+        ("inventory_turnover", """
         SELECT 
             p.product_id,
             p.product_name,
@@ -220,12 +204,10 @@ class SQLAnalyzer:
         LEFT JOIN inventory i ON p.product_id = i.product_id
         GROUP BY p.product_id
         ORDER BY turnover_ratio DESC
-        """)
-        
-        # 4. CUSTOMER ANALYSIS
-        print("\n4. CUSTOMER ANALYSIS")
-        
-        self.execute_query("customer_demographics_analysis", """
+        """),
+    ]),
+    ('4. CUSTOMER ANALYSIS', [
+        ("customer_demographics_analysis", """
         SELECT 
             cd.age_group,
             cd.income_level,
@@ -238,9 +220,8 @@ class SQLAnalyzer:
         LEFT JOIN sales_by_customer sbc ON cd.customer_id = sbc.customer_id
         GROUP BY cd.age_group, cd.income_level
         ORDER BY total_purchases DESC
-        """)
-        
-        self.execute_query("health_condition_product_preference", """
+        """),
+        ("health_condition_product_preference", """
         SELECT 
             cd.health_condition,
             p.category,
@@ -254,9 +235,8 @@ class SQLAnalyzer:
         WHERE cd.health_condition != 'None'
         GROUP BY cd.health_condition, p.category
         ORDER BY purchase_count DESC
-        """)
-        
-        self.execute_query("geographic_customer_distribution", """
+        """),
+        ("geographic_customer_distribution", """
         SELECT 
             cd.city,
             COUNT(DISTINCT cd.customer_id) as customer_count,
@@ -268,12 +248,10 @@ class SQLAnalyzer:
         LEFT JOIN sales_by_customer sbc ON cd.customer_id = sbc.customer_id
         GROUP BY cd.city
         ORDER BY total_transactions DESC
-        """)
-        
-        # 5. MANUFACTURER & PRODUCT ANALYSIS
-        print("\n5. MANUFACTURER & PRODUCT ANALYSIS")
-        
-        self.execute_query("manufacturer_performance", """
+        """),
+    ]),
+    ('5. MANUFACTURER & PRODUCT ANALYSIS', [
+        ("manufacturer_performance", """
         SELECT 
             m.manufacturer_name,
             m.country,
@@ -288,9 +266,8 @@ class SQLAnalyzer:
         LEFT JOIN sales s ON p.product_id = s.product_id
         GROUP BY m.manufacturer_id
         ORDER BY total_revenue DESC
-        """)
-        
-        self.execute_query("product_category_performance", """
+        """),
+        ("product_category_performance", """
         SELECT 
             p.category,
             p.subcategory,
@@ -305,12 +282,10 @@ class SQLAnalyzer:
         LEFT JOIN sales s ON p.product_id = s.product_id
         GROUP BY p.category, p.subcategory
         ORDER BY total_revenue DESC
-        """)
-        
-        # 6. ADVANCED ANALYTICS
-        print("\n6. ADVANCED ANALYTICS")
-        
-        self.execute_query("business_kpis", """
+        """),
+    ]),
+    ('6. ADVANCED ANALYTICS', [
+        ("business_kpis", """
         SELECT 
             COUNT(DISTINCT s.sale_id) as total_transactions,
             SUM(s.quantity_sold) as total_units_sold,
@@ -321,9 +296,8 @@ class SQLAnalyzer:
             COUNT(DISTINCT s.product_id) as products_sold,
             ROUND(AVG(s.discount_percent), 2) as avg_discount_rate
         FROM sales s
-        """)
-        
-        self.execute_query("seasonal_trends", """
+        """),
+        ("seasonal_trends", """
         SELECT 
             CASE 
                 WHEN strftime('%m', s.sale_date) IN ('01', '02', '03') THEN 'Q1'
@@ -340,9 +314,133 @@ class SQLAnalyzer:
         JOIN products p ON s.product_id = p.product_id
         GROUP BY quarter, p.category
         ORDER BY quarter, revenue DESC
-        """)
+        """),
+    ]),
+]
+
+class QueryBudgetExceeded(Exception):
+    """A query was cut off by its time or row budget, or cancelled"""
+    
+    def __init__(self, reason, message):
+        super().__init__(message)
+        self.reason = reason
+
+class SQLAnalyzer:
+    def __init__(self, db_path, cube=None, in_memory=False, timeout=QUERY_TIMEOUT_SECONDS,
+                 max_rows=MAX_RESULT_ROWS, approximate=False, error=DEFAULT_ERROR, heavy_hitters=None):
+        self.conn = connect(db_path, in_memory=in_memory)
+        self.cube = cube
+        # Top-N reports aggregate only the candidate keys left by the heavy-hitter summaries
+        self.heavy_hitters = heavy_hitters
+        # Approximate mode answers COUNT(DISTINCT ...) from HyperLogLog sketches in bounded memory
+        self.approximate = approximate
+        if approximate:
+            register_sketch_functions(self.conn, error)
+        # Integer-key versions of the date-bucketed reports once the date key migration has run
+        self.date_keys = has_date_keys(self.conn)
+        self.timeout = timeout or None
+        self.max_rows = max_rows or None
+        self.results = {}
+        self.failures = {}
+        self.timings = {}
+        self._deadline = None
+        self._abort_reason = None
+        self.conn.set_progress_handler(self._progress, PROGRESS_OPCODES)
+    
+    def _progress(self):
+        """SQLite progress callback: a non-zero return aborts the running statement"""
+        if self._abort_reason is None and self._deadline is not None and time.monotonic() > self._deadline:
+            self._abort_reason = 'timeout'
+        return self._abort_reason is not None
+    
+    def _watchdog(self):
+        """Interrupt from another thread in case the progress handler is not reached"""
+        if self._abort_reason is None:
+            self._abort_reason = 'timeout'
+        self.conn.interrupt()
+    
+    def cancel(self):
+        """Cancel the running query (safe to call from another thread)"""
+        self._abort_reason = 'cancelled'
+        self.conn.interrupt()
+    
+    def _read_sql(self, query):
+        """Run a query within the time and row budgets and return it as a DataFrame"""
+        self._abort_reason = None
+        self._deadline = time.monotonic() + self.timeout if self.timeout else None
+        watchdog = None
+        if self.timeout:
+            watchdog = threading.Timer(self.timeout + WATCHDOG_GRACE_SECONDS, self._watchdog)
+            watchdog.daemon = True
+            watchdog.start()
+        cursor = self.conn.cursor()
+        try:
+            cursor.execute(query)
+            columns = [d[0] for d in cursor.description]
+            rows = []
+            while True:
+                batch = cursor.fetchmany(FETCH_BATCH_ROWS)
+                if not batch:
+                    break
+                rows.extend(batch)
+                if self.max_rows and len(rows) > self.max_rows:
+                    raise QueryBudgetExceeded('row_budget', f"more than {self.max_rows:,} rows")
+        except sqlite3.OperationalError as e:
+            if self._abort_reason == 'timeout':
+                raise QueryBudgetExceeded('timeout', f"exceeded {self.timeout}s") from e
+            if self._abort_reason == 'cancelled':
+                raise QueryBudgetExceeded('cancelled', 'cancelled') from e
+            raise
+        finally:
+            if watchdog is not None:
+                watchdog.cancel()
+            cursor.close()
+            self._deadline = None
+        return pd.DataFrame.from_records(rows, columns=columns, coerce_float=True)
+    
+    def execute_query(self, query_name, query):
+        """Execute a SQL query (or roll it up from the sales cube) and store results"""
+        start = time.perf_counter()
+        try:
+            if self.cube is not None and query_name in CUBE_REPORTS:
+                df = self.cube.answer(query_name)
+            else:
+                if self.date_keys and query_name in DATE_KEY_QUERIES:
+                    query = DATE_KEY_QUERIES[query_name]
+                if self.heavy_hitters is not None and query_name in TOPK_REPORTS:
+                    query = self.heavy_hitters.top_query(query, *TOPK_REPORTS[query_name])
+                df = self._read_sql(approximate_sql(query) if self.approximate else query)
+            self.results[query_name] = df
+            self.timings[query_name] = time.perf_counter() - start
+            print(f"  ✓ {query_name}: {len(df)} rows")
+            return df
+        except QueryBudgetExceeded as e:
+            self._record_failure(query_name, e.reason, str(e), start)
+            print(f"  ✗ {query_name}: cut off ({e.reason}: {e})")
+            return None
+        except Exception as e:
+            self._record_failure(query_name, 'error', str(e), start)
+            print(f"  ✗ {query_name}: {str(e)}")
+            return None
+    
+    def _record_failure(self, query_name, reason, message, start):
+        self.timings[query_name] = time.perf_counter() - start
+        self.failures[query_name] = {'reason': reason, 'message': message,
+                                     'seconds': round(self.timings[query_name], 3)}
+    
+    def run_all_queries(self):
+        """Run all SQL analysis queries"""
+        print("Executing SQL Analysis Queries...\n")
+        
+        for i, (section, queries) in enumerate(SQL_QUERIES):
+            print(("\n" if i else "") + section)
+            for query_name, query in queries:
+                self.execute_query(query_name, query)
         
-        print("\n✓ All SQL queries executed successfully!")
+        if self.failures:
+            print(f"\n⚠ {len(self.failures)} queries did not complete: {', '.join(self.failures)}")
+        else:
+            print("\n✓ All SQL queries executed successfully!")
     
     def export_results(self):
         """Export all results to CSV and JSON"""
@@ -359,6 +457,16 @@ class SQLAnalyzer:
             
             print(f"  ✓ {query_name}")
         
+        # Which reports are fresh and which were cut off, so stale files are not mistaken for new ones
+        status = {
+            'completed': sorted(self.results),
+            'approximate': self.approximate,
+            'failed': self.failures,
+            'seconds': {name: round(t, 3) for name, t in self.timings.items()},
+        }
+        with open(RESULTS_DIR / '_run_status.json', 'w') as f:
+            json.dump(status, f, indent=2)
+        
         print(f"\n✓ Results exported to {RESULTS_DIR}")
     
     def close(self):
@@ -366,7 +474,35 @@ class SQLAnalyzer:
         self.conn.close()
 
 def main():
-    analyzer = SQLAnalyzer(DB_PATH)
+    parser = argparse.ArgumentParser(description='Run the SQL analysis queries')
+    parser.add_argument('--cube', action='store_true',
+                        help='answer roll-up reports from the precomputed sales cube')
+    parser.add_argument('--in-memory', action='store_true',
+                        help='run every query against an in-memory snapshot of the database')
+    parser.add_argument('--timeout', type=float, default=QUERY_TIMEOUT_SECONDS,
+                        help='per-query time budget in seconds (0 disables)')
+    parser.add_argument('--max-rows', type=int, default=MAX_RESULT_ROWS,
+                        help='per-query result row budget (0 disables)')
+    parser.add_argument('--approximate', action='store_true',
+                        help='estimate distinct counts with HyperLogLog sketches (bounded memory)')
+    parser.add_argument('--error', type=float, default=DEFAULT_ERROR,
+                        help='target relative standard error of approximate distinct counts')
+    parser.add_argument('--top-k', action='store_true',
+                        help='refine top-N reports from the persisted heavy-hitter summaries')
+    args = parser.parse_args()
+    
+    cube, heavy_hitters = None, None
+    if args.cube or args.top_k:
+        conn = connect(DB_PATH, in_memory=args.in_memory)
+        try:
+            cube = load_cube(conn) if args.cube else None
+            heavy_hitters = load_heavy_hitters(conn) if args.top_k else None
+        finally:
+            conn.close()
+    
+    analyzer = SQLAnalyzer(DB_PATH, cube=cube, in_memory=args.in_memory, timeout=args.timeout,
+                           max_rows=args.max_rows, approximate=args.approximate, error=args.error,
+                           heavy_hitters=heavy_hitters)
     analyzer.run_all_queries()
     analyzer.export_results()
     analyzer.close()
@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+Hierarchical Forecast Reconciliation
+Forecasts total, category and product series in one batch and reconciles them so every level adds up
+"""
+
+import sqlite3
+import json
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from predictive_analytics import DB_PATH, load_monthly_data, load_product_monthly_data
+
+OUTPUT_PATH = '/home/ubuntu/fmcg-healthcare-portfolio/analysis/reconciled_forecast.json'
+
+# Smoothing parameter grid searched per series in the batch Holt fit
+ALPHA_GRID = np.array([0.1, 0.2, 0.3, 0.5, 0.7, 0.9])
+BETA_GRID = np.array([0.0, 0.05, 0.1, 0.2])
+DAMPING = 0.95
+
+RECONCILIATION_METHODS = ['ols', 'wls_struct', 'wls_var', 'mint_shrink']
+
+class Hierarchy:
+    """Total → category → product hierarchy and its summing matrix"""
+    
+    def __init__(self, products):
+        products = products.sort_values(['category', 'product_id']).reset_index(drop=True)
+        self.product_ids = products['product_id'].to_numpy()
+        self.categories = sorted(products['category'].unique())
+        
+        n_bottom = len(products)
+        category_codes = pd.Categorical(products['category'], categories=self.categories).codes
+        
+        # S stacks the total row, one row per category and the identity for products
+        rows = [sp.csr_matrix(np.ones((1, n_bottom))),
+                sp.csr_matrix((np.ones(n_bottom), (category_codes, np.arange(n_bottom))),
+                              shape=(len(self.categories), n_bottom)),
+                sp.identity(n_bottom, format='csr')]
+        self.S = sp.vstack(rows, format='csr')
+        
+        self.nodes = (['total']
+                      + [f'category/{c}' for c in self.categories]
+                      + [f'product/{p}' for p in self.product_ids])
+        self.levels = (['total']
+                       + ['category'] * len(self.categories)
+                       + ['product'] * n_bottom)
+    
+    @classmethod
+    def from_database(cls, conn):
+        """Build the hierarchy from products.category"""
+        return cls(pd.read_sql_query("SELECT product_id, category FROM products", conn))
+    
+    def bottom_matrix(self, product_data, months, measure='revenue'):
+        """Product × month matrix of a measure, zero where a product did not sell"""
+        pivot = product_data.pivot_table(index='product_id', columns='month', values=measure, aggfunc='sum')
+        return pivot.reindex(index=self.product_ids, columns=months).fillna(0.0).to_numpy(dtype=float)
+    
+    def aggregate(self, bottom):
+        """Roll bottom-level rows up to every node with one sparse product"""
+        return np.asarray(self.S @ bottom)
+
+def batch_holt_forecast(Y, horizon, alphas=ALPHA_GRID, betas=BETA_GRID, phi=DAMPING):
+    """Damped Holt forecasts for every row of Y at once
+    
+    The (alpha, beta) grid is evaluated for all series simultaneously and each
+    series keeps the pair with the lowest one-step squared error.
+    Returns (forecasts n × horizon, one-step residuals n × T).
+    """
+    Y = np.asarray(Y, dtype=float)
+    n, T = Y.shape
+    alpha, beta = (g.ravel() for g in np.meshgrid(alphas, betas))
+    
+    level = np.repeat(Y[:, :1], len(alpha), axis=1)
+    trend = np.zeros_like(level)
+    residuals = np.zeros((n, len(alpha), T))
+    for t in range(1, T):
+        predicted = level + phi * trend
+        error = Y[:, t:t + 1] - predicted
+        residuals[:, :, t] = error
+        new_level = predicted + alpha * error
+        trend = phi * trend + alpha * beta * error
+        level = new_level
+    
+    best = np.argmin((residuals ** 2).sum(axis=2), axis=1)
+    rows = np.arange(n)
+    steps = np.cumsum(phi ** np.arange(1, horizon + 1))
+    forecasts = level[rows, best][:, None] + trend[rows, best][:, None] * steps
+    return forecasts, residuals[rows, best, 1:]
+
+def _shrinkage_intensity(standardized):
+    """Schäfer-Strimmer intensity toward the diagonal, from sums over time only
+    
+    With r = X X'/T, sum_{i!=j} r_ij^2 and the summed variances of x_it x_jt reduce to T × T Gram sums,
+    so no n × n (or n × n × T) array is formed.
+    """
+    n_obs = standardized.shape[1]
+    squares = standardized ** 2
+    gram = standardized.T @ standardized
+    # sum_{i!=j} (sum_t x_it x_jt)^2 and sum_{i!=j} sum_t x_it^2 x_jt^2
+    cross_products = (gram ** 2).sum() - (squares.sum(axis=1) ** 2).sum()
+    cross_squares = (squares.sum(axis=0) ** 2).sum() - (squares ** 2).sum()
+    denominator = cross_products / n_obs ** 2
+    if denominator <= 0:
+        return 1.0
+    variance_of_corr = (cross_squares / n_obs - cross_products / n_obs ** 2) * n_obs / (n_obs - 1) ** 2
+    return float(np.clip(variance_of_corr / denominator, 0, 1))
+
+def _shrunk_covariance(residuals):
+    """Residual covariance shrunk toward its diagonal, as diagonal plus low rank: W = diag(d) + U U'
+    
+    W = (1 - λ) Σ + λ diag(Σ) with Σ = R R'/T for centered residuals R, so U = sqrt((1 - λ)/T) R has
+    only T columns.
+    """
+    n_obs = residuals.shape[1]
+    centered = residuals - residuals.mean(axis=1, keepdims=True)
+    variance = (centered ** 2).mean(axis=1)
+    std = np.sqrt(variance)
+    std[std == 0] = 1.0
+    shrinkage = _shrinkage_intensity(centered / std[:, None])
+    diagonal = shrinkage * variance + 1e-9 * max(variance.mean(), 1.0)
+    return diagonal, centered * np.sqrt((1 - shrinkage) / n_obs)
+
+def _reconcile_weighted(base, S, diagonal, U=None):
+    """S (S'W⁻¹S)⁻¹ S'W⁻¹ ŷ for W = diag(diagonal) + U U', without forming any m × m matrix
+    
+    With S = [S_agg; I] (k aggregate rows over m products), W⁻¹ = D⁻¹ - D⁻¹U K⁻¹ U'D⁻¹ with
+    K = I + U'D⁻¹U, and S'W⁻¹S = E + V M V' where E is the product-level part of D⁻¹,
+    V = [S_agg', S'D⁻¹U] and M = diag(D_agg⁻¹, -K⁻¹). The Woodbury identity then needs only a
+    (k + T) × (k + T) solve, where the total row alone would make S'W⁻¹S dense.
+    """
+    n_nodes, n_bottom = S.shape
+    n_agg = n_nodes - n_bottom
+    if (S[n_agg:] != sp.identity(n_bottom, format='csr')).nnz:
+        raise ValueError("S must end with the identity block for the bottom level")
+    S_agg = S[:n_agg]
+    D_inv = sp.diags(1.0 / diagonal)
+    rhs = np.asarray(S.T @ (D_inv @ base))
+    V = S_agg.T.toarray()
+    M_inv = np.diag(diagonal[:n_agg])
+    if U is not None:
+        D_inv_U = U / diagonal[:, None]
+        K = np.eye(U.shape[1]) + U.T @ D_inv_U
+        B = np.asarray(S.T @ D_inv_U)
+        rhs -= B @ np.linalg.solve(K, D_inv_U.T @ base)
+        V = np.hstack([V, B])
+        M_inv = np.block([[M_inv, np.zeros((n_agg, U.shape[1]))], [np.zeros((U.shape[1], n_agg)), -K]])
+    
+    E_inv = diagonal[n_agg:]
+    E_inv_V = V * E_inv[:, None]
+    core = M_inv + V.T @ E_inv_V
+    bottom = E_inv[:, None] * rhs - E_inv_V @ np.linalg.solve(core, E_inv_V.T @ rhs)
+    return np.asarray(S @ bottom)
+
+def reconcile(base, S, method='mint_shrink', residuals=None):
+    """Project base forecasts (nodes × horizon) onto the coherent subspace
+    
+    y_tilde = S (S' W^-1 S)^-1 S' W^-1 y_hat, solved for every horizon at once.
+    Diagonal weightings and the diagonal-plus-rank-T shrunk covariance are solved in structured form.
+    """
+    if method not in RECONCILIATION_METHODS:
+        raise ValueError(f"Unknown reconciliation method: {method}")
+    if method in ('wls_var', 'mint_shrink') and residuals is None:
+        raise ValueError(f"{method} reconciliation needs in-sample residuals")
+    
+    S = sp.csr_matrix(S)
+    base = np.asarray(base, dtype=float)
+    if method == 'mint_shrink':
+        return _reconcile_weighted(base, S, *_shrunk_covariance(residuals))
+    
+    if method == 'ols':
+        weights = np.ones(S.shape[0])
+    elif method == 'wls_struct':
+        weights = np.asarray(S.sum(axis=1)).ravel()
+    else:
+        weights = residuals.var(axis=1)
+        weights[weights <= 0] = weights[weights > 0].min() if (weights > 0).any() else 1.0
+    return _reconcile_weighted(base, S, weights)
+
+def reconcile_forecasts(monthly_data, product_data, hierarchy, periods=3, measure='revenue', method='mint_shrink'):
+    """Forecast every node of the hierarchy in one batch and reconcile them"""
+    months = pd.DatetimeIndex(monthly_data['month'])
+    bottom = hierarchy.bottom_matrix(product_data, months, measure)
+    history = hierarchy.aggregate(bottom)
+    
+    base, residuals = batch_holt_forecast(history, periods)
+    reconciled = reconcile(base, hierarchy.S, method, residuals)
+    
+    forecast_months = pd.date_range(months.max(), periods=periods + 1, freq='MS')[1:]
+    df = pd.DataFrame({
+        'node': np.repeat(hierarchy.nodes, periods),
+        'level': np.repeat(hierarchy.levels, periods),
+        'month': np.tile(forecast_months.strftime('%Y-%m'), len(hierarchy.nodes)),
+        'base_forecast': base.ravel(),
+        'reconciled_forecast': reconciled.ravel(),
+    })
+    return df
+
+def coherence_error(values, hierarchy, column='reconciled_forecast'):
+    """Largest gap between any aggregate node and the sum of its products"""
+    matrix = values[column].to_numpy().reshape(len(hierarchy.nodes), -1)
+    n_bottom = len(hierarchy.product_ids)
+    return float(np.abs(hierarchy.aggregate(matrix[-n_bottom:]) - matrix).max())
+
+def summarize_reconciliation(forecast, hierarchy):
+    """Per-level totals and coherence before and after reconciliation"""
+    summary = {}
+    for level in ['total', 'category', 'product']:
+        rows = forecast[forecast['level'] == level]
+        summary[level] = {
+            node: {
+                'base_forecast': group['base_forecast'].round(2).tolist(),
+                'reconciled_forecast': group['reconciled_forecast'].round(2).tolist(),
+            }
+            for node, group in rows.groupby('node', sort=False)
+        }
+    summary['coherence'] = {
+        'base_max_gap': coherence_error(forecast, hierarchy, 'base_forecast'),
+        'reconciled_max_gap': coherence_error(forecast, hierarchy, 'reconciled_forecast'),
+    }
+    return summary
+
+def main():
+    conn = sqlite3.connect(DB_PATH)
+    try:
+        hierarchy = Hierarchy.from_database(conn)
+    finally:
+        conn.close()
+    
+    monthly_data = load_monthly_data()
+    product_data = load_product_monthly_data()
+    print(f"Hierarchy: 1 total, {len(hierarchy.categories)} categories, {len(hierarchy.product_ids)} products")
+    
+    for method in RECONCILIATION_METHODS:
+        forecast = reconcile_forecasts(monthly_data, product_data, hierarchy, method=method)
+        gap = coherence_error(forecast, hierarchy)
+        total = forecast[forecast['node'] == 'total']['reconciled_forecast'].sum()
+        print(f"  ✓ {method:<12} total next-quarter revenue {total:,.2f} (max coherence gap {gap:.2e})")
+    
+    forecast = reconcile_forecasts(monthly_data, product_data, hierarchy, method='mint_shrink')
+    with open(OUTPUT_PATH, 'w') as f:
+        json.dump(summarize_reconciliation(forecast, hierarchy), f, indent=2)
+    print(f"✓ Reconciled forecast saved to {OUTPUT_PATH}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+"""
+Streaming Heavy Hitters
+Per-month Space-Saving and Count-Min summaries of product and retailer sales, kept up to date
+incrementally and persisted between runs, for top-N answers without aggregating every key
+"""
+
+import argparse
+import json
+import re
+import sqlite3
+import time
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from distinct_sketch import hash64
+from sales_snapshot import source_watermark
+
+DB_PATH = '/home/ubuntu/fmcg-healthcare-portfolio/data/fmcg_healthcare.db'
+TOPK_PATH = Path('/home/ubuntu/fmcg-healthcare-portfolio/data/heavy_hitters.npz')
+
+# Counters kept per month, dimension and measure; top-N answers are reliable for N well below this
+DEFAULT_CAPACITY = 256
+CM_WIDTH, CM_DEPTH = 1024, 4
+FETCH_ROWS = 500_000
+
+DIMENSIONS = {'product': 'product_id', 'retailer': 'retailer_id'}
+MEASURES = {'revenue': 'total_amount', 'units': 'quantity_sold'}
+
+# Reports served from the summaries: report name -> (dimension, measure it is ranked by, N)
+TOPK_REPORTS = {
+    'top_10_products': ('product', 'revenue', 10),
+    'top_retailers': ('retailer', 'revenue', 15),
+    'top_products': ('product', 'revenue', 10),
+}
+
+def _month(labels):
+    """'YYYY-MM...' strings to YYYYMM integers"""
+    labels = pd.Series(labels, dtype=str).str.slice(0, 7)
+    return (labels.str.slice(0, 4).astype(np.int64) * 100 + labels.str.slice(5, 7).astype(np.int64)).to_numpy()
+
+class SpaceSaving:
+    """Mergeable Space-Saving summary for weighted keys
+    
+    Each tracked key has an upper bound (count) and an overestimate bound (error), so
+    count - error <= true weight <= count; any untracked key weighs at most floor.
+    Updates pre-aggregate a batch and merge it, rather than replacing counters one row at a time.
+    """
+    
+    def __init__(self, capacity=DEFAULT_CAPACITY, keys=None, counts=None, errors=None, floor=0.0):
+        self.capacity = capacity
+        self.keys = np.empty(0, dtype=np.int64) if keys is None else keys
+        self.counts = np.empty(0) if counts is None else counts
+        self.errors = np.zeros(len(self.keys)) if errors is None else errors
+        self.floor = floor
+    
+    @classmethod
+    def _truncated(cls, capacity, keys, counts, errors, floor):
+        if len(keys) > capacity:
+            order = np.argsort(-counts, kind='stable')
+            floor = max(floor, float(counts[order[capacity]]))
+            keep = np.sort(order[:capacity])
+            keys, counts, errors = keys[keep], counts[keep], errors[keep]
+        return cls(capacity, keys, counts, errors, floor)
+    
+    @classmethod
+    def from_weights(cls, keys, weights, capacity=DEFAULT_CAPACITY):
+        """Exact summary of one batch, truncated to capacity"""
+        unique, inverse = np.unique(np.asarray(keys, dtype=np.int64), return_inverse=True)
+        totals = np.bincount(inverse, weights=np.asarray(weights, dtype=float), minlength=len(unique))
+        return cls._truncated(capacity, unique, totals, np.zeros(len(unique)), 0.0)
+    
+    def _lookup(self, keys):
+        """Counts and errors for keys, with (floor, floor) where a key is not tracked"""
+        pos = np.searchsorted(self.keys, keys).clip(max=max(len(self.keys) - 1, 0))
+        found = (self.keys[pos] == keys) if len(self.keys) else np.zeros(len(keys), dtype=bool)
+        counts = np.where(found, self.counts[pos] if len(self.keys) else 0.0, self.floor)
+        errors = np.where(found, self.errors[pos] if len(self.keys) else 0.0, self.floor)
+        return counts, errors
+    
+    def merge(self, other):
+        """Summary of the union of both streams"""
+        keys = np.union1d(self.keys, other.keys)
+        (c1, e1), (c2, e2) = self._lookup(keys), other._lookup(keys)
+        return SpaceSaving._truncated(max(self.capacity, other.capacity), keys, c1 + c2, e1 + e2,
+                                      self.floor + other.floor)
+    
+    def update(self, keys, weights):
+        return self.merge(SpaceSaving.from_weights(keys, weights, self.capacity))
+    
+    def top(self, n):
+        """The n largest counters: key, upper bound, lower bound and whether its rank is certain"""
+        order = np.lexsort((self.keys, -self.counts))
+        keys, counts = self.keys[order], self.counts[order]
+        lower = counts - self.errors[order]
+        # A key is certainly in the top n if its lower bound beats every key ranked below n
+        below = max(float(counts[n]) if len(counts) > n else 0.0, self.floor)
+        return pd.DataFrame({'key': keys[:n], 'estimate': counts[:n], 'lower_bound': lower[:n],
+                             'guaranteed': lower[:n] >= below})
+    
+    def candidates(self, n):
+        """Keys that may be in the true top n, and whether that set is certainly complete"""
+        lower = np.sort(self.counts - self.errors)[::-1]
+        if len(lower) < n:
+            return np.sort(self.keys), self.floor == 0
+        threshold = float(lower[n - 1])
+        return self.keys[self.counts >= threshold], self.floor < threshold
+
+class CountMin:
+    """Count-Min sketch of weights per key: point estimates that never undercount"""
+    
+    def __init__(self, width=CM_WIDTH, depth=CM_DEPTH, table=None):
+        self.table = np.zeros((depth, width)) if table is None else table
+    
+    def _buckets(self, keys):
+        h = hash64(np.asarray(keys, dtype=np.int64))
+        h1, h2 = h & np.uint64(0xFFFFFFFF), h >> np.uint64(32)
+        width = np.uint64(self.table.shape[1])
+        with np.errstate(over='ignore'):
+            return [((h1 + np.uint64(i) * h2) % width).astype(np.intp) for i in range(self.table.shape[0])]
+    
+    def add(self, keys, weights):
+        for row, buckets in zip(self.table, self._buckets(keys)):
+            row += np.bincount(buckets, weights=weights, minlength=len(row))
+        return self
+    
+    def estimate(self, keys):
+        return np.min([row[buckets] for row, buckets in zip(self.table, self._buckets(keys))], axis=0)
+    
+    def merge(self, other):
+        return CountMin(table=self.table + other.table)
+
+class HeavyHitters:
+    """Space-Saving and Count-Min summaries per (dimension, measure, month) with a sales watermark"""
+    
+    def __init__(self, capacity=DEFAULT_CAPACITY, summaries=None, sketches=None, watermark=None):
+        self.capacity = capacity
+        self.summaries = summaries or {(d, m): {} for d in DIMENSIONS for m in MEASURES}
+        self.sketches = sketches or {(d, m): {} for d in DIMENSIONS for m in MEASURES}
+        self.watermark = watermark
+    
+    def update(self, df):
+        """Fold a batch of sales rows (with a YYYYMM month column) into the summaries"""
+        for month, rows in df.groupby('month', sort=False):
+            month = int(month)
+            for (dimension, measure), by_month in self.summaries.items():
+                keys = rows[DIMENSIONS[dimension]].to_numpy(dtype=np.int64)
+                weights = rows[MEASURES[measure]].to_numpy(dtype=float)
+                by_month[month] = by_month.get(month, SpaceSaving(self.capacity)).update(keys, weights)
+                sketches = self.sketches[(dimension, measure)]
+                sketches[month] = sketches.get(month, CountMin()).add(keys, weights)
+    
+    def catch_up(self, conn, fetch_rows=FETCH_ROWS):
+        """Fold in sales added since the watermark; rebuild if rows were changed or removed. Returns rows read"""
+        current = source_watermark(conn)
+        after = (self.watermark or {}).get('max_sale_id')
+        # The rows already folded in must be unchanged, contents included, for an append to be valid
+        if after is None or source_watermark(conn, after) != self.watermark:
+            self.__init__(self.capacity)
+            after = None
+        
+        cursor = conn.execute(
+            "SELECT product_id, retailer_id, sale_date, quantity_sold, total_amount FROM sales WHERE sale_id > ?",
+            (after if after is not None else -1,))
+        read = 0
+        while True:
+            rows = cursor.fetchmany(fetch_rows)
+            if not rows:
+                break
+            df = pd.DataFrame.from_records(rows, columns=['product_id', 'retailer_id', 'sale_date',
+                                                          'quantity_sold', 'total_amount'])
+            df['month'] = _month(df['sale_date'])
+            self.update(df)
+            read += len(rows)
+        self.watermark = current
+        return read
+    
+    def _months(self, dimension, measure, start=None, end=None):
+        by_month = self.summaries[(dimension, measure)]
+        return [m for m in sorted(by_month) if (start is None or m >= start) and (end is None or m <= end)]
+    
+    def window(self, dimension, measure='revenue', start=None, end=None):
+        """Space-Saving summary over the months start..end (YYYYMM, inclusive)"""
+        summary = SpaceSaving(self.capacity)
+        for month in self._months(dimension, measure, start, end):
+            summary = summary.merge(self.summaries[(dimension, measure)][month])
+        return summary
+    
+    def top(self, dimension, measure='revenue', n=10, start=None, end=None):
+        """Approximate top n from the summaries alone"""
+        df = self.window(dimension, measure, start, end).top(n)
+        return df.rename(columns={'key': DIMENSIONS[dimension]})
+    
+    def estimate(self, dimension, keys, measure='revenue', start=None, end=None):
+        """Upper-bound estimate of the weight of any keys, tracked or not"""
+        keys = np.asarray(keys, dtype=np.int64)
+        months = self._months(dimension, measure, start, end)
+        if not months:
+            return np.zeros(len(keys))
+        sketched = sum(self.sketches[(dimension, measure)][m].estimate(keys) for m in months)
+        tracked, _ = self.window(dimension, measure, start, end)._lookup(keys)
+        return np.minimum(sketched, tracked)
+    
+    def top_query(self, sql, dimension, measure='revenue', n=10, start=None, end=None):
+        """Restrict a GROUP BY ... ORDER BY ... LIMIT n report to the candidate keys (exact refinement)
+        
+        The report then aggregates only keys that can still reach the top n; when the summaries
+        cannot rule the remaining keys out the report runs unchanged (or only with the window).
+        """
+        summary = self.window(dimension, measure, start, end)
+        candidates, complete = summary.candidates(n)
+        filters = []
+        # Skip the key filter when it would not exclude anything (every key tracked and a candidate)
+        if complete and not (summary.floor == 0 and len(candidates) == len(summary.keys)):
+            filters.append(f"s.{DIMENSIONS[dimension]} IN ({', '.join(str(k) for k in candidates) or 'NULL'})")
+        if start is not None:
+            filters.append(f"s.sale_date >= '{start // 100:04d}-{start % 100:02d}-01'")
+        if end is not None:
+            filters.append(f"s.sale_date < '{end // 100 + end % 100 // 12:04d}-{end % 100 % 12 + 1:02d}-01'")
+        return restrict_query(sql, filters)
+    
+    def save(self, path=TOPK_PATH):
+        """Store every summary as padded (month x capacity) arrays"""
+        path = Path(path)
+        arrays = {}
+        for (dimension, measure), by_month in self.summaries.items():
+            prefix = f'{dimension}/{measure}'
+            months = sorted(by_month)
+            summaries = [by_month[m] for m in months]
+            shape = (len(months), self.capacity)
+            keys, counts, errors = np.full(shape, -1, dtype=np.int64), np.zeros(shape), np.zeros(shape)
+            for i, s in enumerate(summaries):
+                keys[i, :len(s.keys)], counts[i, :len(s.keys)], errors[i, :len(s.keys)] = s.keys, s.counts, s.errors
+            arrays[f'{prefix}/months'] = np.array(months, dtype=np.int64)
+            arrays[f'{prefix}/keys'], arrays[f'{prefix}/counts'], arrays[f'{prefix}/errors'] = keys, counts, errors
+            arrays[f'{prefix}/floor'] = np.array([s.floor for s in summaries])
+            arrays[f'{prefix}/sketch'] = np.array([self.sketches[(dimension, measure)][m].table for m in months]) \
+                .reshape(len(months), CM_DEPTH, CM_WIDTH)
+        arrays['__meta__'] = np.array(json.dumps({'capacity': self.capacity, 'watermark': self.watermark}))
+        tmp_path = path.with_name(path.stem + '.tmp.npz')
+        np.savez_compressed(tmp_path, **arrays)
+        tmp_path.replace(path)
+    
+    @classmethod
+    def load(cls, path=TOPK_PATH):
+        with np.load(path) as archive:
+            meta = json.loads(str(archive['__meta__']))
+            capacity = meta['capacity']
+            summaries, sketches = {}, {}
+            for dimension in DIMENSIONS:
+                for measure in MEASURES:
+                    prefix = f'{dimension}/{measure}'
+                    months = archive[f'{prefix}/months']
+                    keys, counts = archive[f'{prefix}/keys'], archive[f'{prefix}/counts']
+                    errors, floors = archive[f'{prefix}/errors'], archive[f'{prefix}/floor']
+                    tables = archive[f'{prefix}/sketch']
+                    summaries[(dimension, measure)] = {
+                        int(m): SpaceSaving(capacity, keys[i][keys[i] >= 0], counts[i][keys[i] >= 0],
+                                            errors[i][keys[i] >= 0], float(floors[i]))
+                        for i, m in enumerate(months)}
+                    sketches[(dimension, measure)] = {int(m): CountMin(table=tables[i].copy())
+                                                      for i, m in enumerate(months)}
+        return cls(capacity, summaries, sketches, meta['watermark'])
+
+def restrict_query(sql, filters):
+    """Add WHERE conditions to a single-level report query just before its GROUP BY"""
+    if not filters:
+        return sql
+    match = re.search(r'\n(\s*)GROUP BY', sql)
+    if match is None or re.search(r'\bWHERE\b', sql[:match.start()], re.IGNORECASE):
+        raise ValueError("Top-K refinement expects a report without a WHERE clause before GROUP BY")
+    return f"{sql[:match.start()]}\n{match.group(1)}WHERE {' AND '.join(filters)}{sql[match.start():]}"
+
+def load_heavy_hitters(conn, path=TOPK_PATH, capacity=DEFAULT_CAPACITY):
+    """Load the stored summaries and fold in any sales ingested since they were saved"""
+    path = Path(path)
+    store = HeavyHitters.load(path) if path.exists() else HeavyHitters(capacity)
+    if store.watermark != source_watermark(conn):
+        store.catch_up(conn)
+        store.save(path)
+    return store
+
+def main():
+    parser = argparse.ArgumentParser(description='Maintain and query the heavy-hitter summaries')
+    parser.add_argument('--db', default=DB_PATH)
+    parser.add_argument('--path', default=TOPK_PATH, type=Path, help='summary archive')
+    parser.add_argument('--rebuild', action='store_true', help='discard the stored summaries first')
+    parser.add_argument('--dimension', choices=list(DIMENSIONS), default='product')
+    parser.add_argument('--measure', choices=list(MEASURES), default='revenue')
+    parser.add_argument('-n', type=int, default=10)
+    parser.add_argument('--start', help='first month of the window (YYYY-MM)')
+    parser.add_argument('--end', help='last month of the window (YYYY-MM)')
+    args = parser.parse_args()
+    
+    conn = sqlite3.connect(args.db)
+    try:
+        store = HeavyHitters.load(args.path) if args.path.exists() and not args.rebuild else HeavyHitters()
+        start = time.perf_counter()
+        read = store.catch_up(conn)
+        store.save(args.path)
+        print(f"✓ Summaries updated with {read:,} sales rows in {time.perf_counter() - start:.2f}s → {args.path}")
+        
+        window = [int(_month([m])[0]) if m else None for m in (args.start, args.end)]
+        start = time.perf_counter()
+        top = store.top(args.dimension, args.measure, args.n, *window)
+        print(f"✓ Top {args.n} {args.dimension}s by {args.measure} in "
+              f"{(time.perf_counter() - start) * 1000:.1f} ms\n")
+        print(top.to_string(index=False))
+    finally:
+        conn.close()
+
+if __name__ == '__main__':
+    main()
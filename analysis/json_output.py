@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Fast JSON Output
+Encodes report structures holding DataFrames straight from their columns, without building a dict per
+record, and writes optional gzip/brotli pre-compressed copies into the web server's public directory
+"""
+
+import argparse
+import gzip
+import json
+import math
+import time
+from datetime import datetime
+from json.encoder import encode_basestring_ascii
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIONS = ('gzip', 'br')
+EXTENSIONS = {'gzip': '.gz', 'br': '.br'}
+# Web root the Express server serves (its staticPath); the dashboard fetches the reports from here
+PUBLIC_DIR = Path('/home/ubuntu/fmcg-healthcare-portfolio/dist/public')
+GZIP_LEVEL = 9
+BROTLI_QUALITY = 11
+# Timestamps are written the way str(pd.Timestamp) prints them
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+def encode_scalar(value):
+    """JSON text for one value (NaN/inf become null, timestamps and unknown types their str())"""
+    if value is None or value is pd.NaT or value is pd.NA:
+        return 'null'
+    if isinstance(value, (bool, np.bool_)):
+        return 'true' if value else 'false'
+    if isinstance(value, (int, np.integer)):
+        return str(int(value))
+    if isinstance(value, (float, np.floating)):
+        return repr(float(value)) if math.isfinite(value) else 'null'
+    if isinstance(value, str):
+        return encode_basestring_ascii(value)
+    return encode_basestring_ascii(str(value))
+
+def column_tokens(values):
+    """JSON text of every element of a column, built per column rather than per cell where possible"""
+    values = values.to_numpy() if isinstance(values, pd.Series) else np.asarray(values)
+    kind = values.dtype.kind
+    if kind in 'iu':
+        return values.astype(str).tolist()
+    if kind == 'b':
+        return np.where(values, 'true', 'false').tolist()
+    if kind == 'f':
+        if orjson is not None:
+            # orjson writes a float array in one call (non-finite values as null); numbers contain no commas
+            text = orjson.dumps(values.astype(np.float64), option=orjson.OPT_SERIALIZE_NUMPY).decode()
+            return text[1:-1].split(',') if len(values) else []
+        tokens = values.astype(np.float64).astype(str)
+        tokens[~np.isfinite(values)] = 'null'
+        return tokens.tolist()
+    if kind == 'M':
+        stamps = pd.Series(values)
+        return ['null' if s is None else f'"{s}"' for s in
+                stamps.dt.strftime(TIMESTAMP_FORMAT).astype(object).where(stamps.notna(), None).tolist()]
+    return [encode_basestring_ascii(v) if type(v) is str else encode_scalar(v) for v in values.tolist()]
+
+def encode_frame(df):
+    """JSON array of records for a DataFrame, assembled from per-column tokens"""
+    if df.empty:
+        return '[]'
+    columns = [column_tokens(df.iloc[:, i]) for i in range(df.shape[1])]
+    template = '{' + ','.join(f'{encode_scalar(str(name))}:%s' for name in df.columns) + '}'
+    return '[' + ','.join(map(template.__mod__, zip(*columns))) + ']'
+
+def encode(obj):
+    """Compact JSON text for dicts/lists/tuples of scalars, arrays, Series and DataFrames"""
+    if isinstance(obj, pd.DataFrame):
+        return encode_frame(obj)
+    if isinstance(obj, (pd.Series, np.ndarray)):
+        return '[' + ','.join(column_tokens(obj)) + ']'
+    if isinstance(obj, dict):
+        return '{' + ','.join(f'{encode_scalar(str(k))}:{encode(v)}' for k, v in obj.items()) + '}'
+    if isinstance(obj, (list, tuple)):
+        return '[' + ','.join(map(encode, obj)) + ']'
+    return encode_scalar(obj)
+
+def compress(data, method):
+    if method == 'gzip':
+        return gzip.compress(data, GZIP_LEVEL, mtime=0)
+    if method == 'br':
+        if brotli is None:
+            raise ImportError("brotli is not installed (pip install brotli)")
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    raise ValueError(f"unknown compression {method!r}")
+
+def _write_atomic(path, data):
+    """Replace path in one rename so the server never sends a half-written file"""
+    tmp = path.with_name(path.name + '.tmp')
+    tmp.write_bytes(data)
+    tmp.replace(path)
+
+def write_json(obj, path, compressions=(), publish_dir=None):
+    """Write obj as compact JSON plus a .gz/.br copy for each requested compression, and the same files
+    into publish_dir when given. Compressed copies this call does not rewrite are removed, since the server
+    prefers them to the plain file. Returns the sizes"""
+    path = Path(path)
+    data = encode(obj).encode()
+    sizes = {'json': len(data)}
+    packed = {}
+    for method in compressions:
+        try:
+            packed[method] = compress(data, method)
+        except ImportError as e:
+            print(f"⚠ Skipping {path.name}{EXTENSIONS[method]}: {e}")
+            continue
+        sizes[method] = len(packed[method])
+    
+    targets = [path] if publish_dir is None else [path, Path(publish_dir) / path.name]
+    for target in targets:
+        for method, ext in EXTENSIONS.items():
+            if method not in packed:
+                Path(f'{target}{ext}').unlink(missing_ok=True)
+        for method, payload in packed.items():
+            _write_atomic(Path(f'{target}{EXTENSIONS[method]}'), payload)
+        _write_atomic(target, data)
+    return sizes
+
+def resolve_public_dir(public_dir):
+    """public_dir if it exists, else None with a note (the dashboard has not been built yet)"""
+    public_dir = Path(public_dir)
+    if public_dir.is_dir():
+        return public_dir
+    print(f"⚠ {public_dir} not found (run the client build first); not publishing")
+    return None
+
+def format_sizes(sizes):
+    return ', '.join(f"{k} {v / 1024:,.1f} KB" for k, v in sizes.items())
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare report JSON encoders on a synthetic frame')
+    parser.add_argument('--rows', type=int, default=200_000)
+    args = parser.parse_args()
+    
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({
+        'month': pd.date_range('2020-01-01', periods=args.rows, freq='h'),
+        'category': rng.choice(['Vitamins & Supplements', 'Pain Relief', 'Skin Care'], args.rows),
+        'transactions': rng.integers(0, 10_000, args.rows),
+        'revenue': rng.random(args.rows) * 1e6,
+    })
+    report = {'monthly': df, 'summary': {'rows': args.rows}}
+    
+    start = time.perf_counter()
+    records = [{k: (str(v) if isinstance(v, (pd.Timestamp, datetime)) else v) for k, v in item.items()}
+               for item in df.to_dict('records')]
+    baseline = json.dumps({'monthly': records, 'summary': report['summary']}, indent=2)
+    t_baseline = time.perf_counter() - start
+    start = time.perf_counter()
+    text = encode(report)
+    t_encode = time.perf_counter() - start
+    assert json.loads(text) == json.loads(baseline)
+    print(f"records + json.dump(indent=2): {t_baseline:.3f}s, {len(baseline) / 1024:,.0f} KB")
+    print(f"column encoder{' (orjson)' if orjson else ''}: {t_encode:.3f}s, {len(text) / 1024:,.0f} KB, "
+          f"gzip {len(compress(text.encode(), 'gzip')) / 1024:,.0f} KB")
+
+if __name__ == '__main__':
+    main()
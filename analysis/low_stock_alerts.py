@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+Incremental Low-Stock Alerts
+Records stock crossings of the reorder level with triggers and serves new or resolved alerts since a cursor
+"""
+
+import argparse
+import sqlite3
+import pandas as pd
+
+DB_PATH = '/home/ubuntu/fmcg-healthcare-portfolio/data/fmcg_healthcare.db'
+
+ALERTING_SCHEMA = """
+CREATE INDEX IF NOT EXISTS idx_inventory_low_stock
+    ON inventory(product_id, retailer_id)
+    WHERE stock_quantity < reorder_level;
+
+CREATE TABLE IF NOT EXISTS low_stock_alert_events (
+    event_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    inventory_id INTEGER NOT NULL,
+    event_type TEXT NOT NULL CHECK (event_type IN ('opened', 'resolved')),
+    stock_quantity INTEGER,
+    reorder_level INTEGER,
+    created_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now'))
+);
+
+CREATE TABLE IF NOT EXISTS low_stock_alert_cursors (
+    consumer TEXT PRIMARY KEY,
+    last_event_id INTEGER NOT NULL DEFAULT 0,
+    updated_at TEXT
+);
+
+CREATE TRIGGER IF NOT EXISTS trg_inventory_low_stock_update
+AFTER UPDATE OF stock_quantity, reorder_level ON inventory
+WHEN (OLD.stock_quantity < OLD.reorder_level) != (NEW.stock_quantity < NEW.reorder_level)
+BEGIN
+    INSERT INTO low_stock_alert_events (inventory_id, event_type, stock_quantity, reorder_level)
+    VALUES (NEW.inventory_id,
+            CASE WHEN NEW.stock_quantity < NEW.reorder_level THEN 'opened' ELSE 'resolved' END,
+            NEW.stock_quantity, NEW.reorder_level);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_inventory_low_stock_insert
+AFTER INSERT ON inventory
+WHEN NEW.stock_quantity < NEW.reorder_level
+BEGIN
+    INSERT INTO low_stock_alert_events (inventory_id, event_type, stock_quantity, reorder_level)
+    VALUES (NEW.inventory_id, 'opened', NEW.stock_quantity, NEW.reorder_level);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_inventory_low_stock_delete
+AFTER DELETE ON inventory
+WHEN OLD.stock_quantity < OLD.reorder_level
+BEGIN
+    INSERT INTO low_stock_alert_events (inventory_id, event_type, stock_quantity, reorder_level)
+    VALUES (OLD.inventory_id, 'resolved', NULL, NULL);
+END;
+"""
+
+# Details for the alerted rows only; deleted inventory rows keep their event
+ALERT_DETAILS_SQL = """
+SELECT
+    e.event_id,
+    e.event_type,
+    e.created_at,
+    e.inventory_id,
+    p.product_name,
+    p.category,
+    r.retailer_name,
+    r.city,
+    e.stock_quantity,
+    e.reorder_level,
+    (e.reorder_level - e.stock_quantity) as units_needed,
+    ROUND((e.reorder_level - e.stock_quantity) * p.unit_price, 2) as reorder_cost
+FROM low_stock_alert_events e
+LEFT JOIN inventory i ON e.inventory_id = i.inventory_id
+LEFT JOIN products p ON i.product_id = p.product_id
+LEFT JOIN retailers r ON i.retailer_id = r.retailer_id
+WHERE e.event_id > ? AND e.event_id <= ?
+ORDER BY e.event_id
+"""
+
+def _statements(script):
+    """Split a SQL script into complete statements; trigger bodies keep their inner semicolons"""
+    statements, pending = [], ''
+    for line in script.splitlines(keepends=True):
+        pending += line
+        if sqlite3.complete_statement(pending):
+            statements.append(pending.strip())
+            pending = ''
+    return statements
+
+def install_alerting(conn):
+    """Create the partial index, event queue, cursor table and triggers
+    
+    The first install records an 'opened' event for every row already below its
+    reorder level so consumers start from the current state. Everything runs under one
+    savepoint, so a failure leaves nothing half-installed and an open transaction is not committed.
+    """
+    conn.execute("SAVEPOINT install_alerting")
+    try:
+        existed = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'low_stock_alert_events'").fetchone()
+        for statement in _statements(ALERTING_SCHEMA):
+            conn.execute(statement)
+        if not existed:
+            conn.execute("""
+                INSERT INTO low_stock_alert_events (inventory_id, event_type, stock_quantity, reorder_level)
+                SELECT inventory_id, 'opened', stock_quantity, reorder_level
+                FROM inventory
+                WHERE stock_quantity < reorder_level
+                ORDER BY inventory_id
+            """)
+    except BaseException:
+        conn.execute("ROLLBACK TO install_alerting")
+        conn.execute("RELEASE install_alerting")
+        raise
+    conn.execute("RELEASE install_alerting")
+
+def current_alerts(conn):
+    """Rows currently below their reorder level, served from the partial index"""
+    return pd.read_sql_query("""
+        SELECT i.inventory_id, i.product_id, i.retailer_id, i.stock_quantity, i.reorder_level,
+               (i.reorder_level - i.stock_quantity) as units_needed
+        FROM inventory i INDEXED BY idx_inventory_low_stock
+        WHERE i.stock_quantity < i.reorder_level
+        ORDER BY units_needed DESC
+    """, conn)
+
+def collapse_events(events):
+    """Keep the net change per inventory row within a batch
+    
+    An alert that opened and resolved (or resolved and reopened) inside the same
+    batch leaves the row where it started, so it is dropped.
+    """
+    if events.empty:
+        return events
+    grouped = events.groupby('inventory_id', sort=False)['event_type']
+    first_type = grouped.transform('first')
+    last = events.drop_duplicates('inventory_id', keep='last')
+    return last[last['event_type'] == first_type.loc[last.index]].reset_index(drop=True)
+
+def _set_cursor(conn, consumer, event_id):
+    conn.execute("""
+        INSERT INTO low_stock_alert_cursors (consumer, last_event_id, updated_at)
+        VALUES (?, ?, datetime('now'))
+        ON CONFLICT(consumer) DO UPDATE SET last_event_id = excluded.last_event_id,
+                                            updated_at = excluded.updated_at
+    """, (consumer, event_id))
+
+def poll_alerts(conn, consumer, limit=None, collapse=True):
+    """Return alerts opened or resolved since the consumer's cursor and advance it
+    
+    Cost depends on the number of events since the cursor, not on the size of
+    the inventory table.
+    """
+    with conn:
+        row = conn.execute("SELECT last_event_id FROM low_stock_alert_cursors WHERE consumer = ?",
+                           (consumer,)).fetchone()
+        last_event_id = row[0] if row else 0
+        if limit is None:
+            # Pruning can empty the queue, so never move the cursor backwards
+            upper = conn.execute("SELECT MAX(COALESCE(MAX(event_id), 0), ?) FROM low_stock_alert_events",
+                                 (last_event_id,)).fetchone()[0]
+        else:
+            upper = conn.execute("""
+                SELECT COALESCE(MAX(event_id), ?) FROM (
+                    SELECT event_id FROM low_stock_alert_events WHERE event_id > ? ORDER BY event_id LIMIT ?
+                )
+            """, (last_event_id, last_event_id, limit)).fetchone()[0]
+        
+        events = pd.read_sql_query(ALERT_DETAILS_SQL, conn, params=(last_event_id, upper))
+        _set_cursor(conn, consumer, upper)
+    return collapse_events(events) if collapse else events
+
+def reset_cursor(conn, consumer, event_id=0):
+    """Rewind (or fast-forward) a consumer to replay alerts after event_id"""
+    with conn:
+        _set_cursor(conn, consumer, event_id)
+
+def prune_events(conn):
+    """Delete events every registered consumer has already read"""
+    with conn:
+        return conn.execute("""
+            DELETE FROM low_stock_alert_events
+            WHERE event_id <= (SELECT COALESCE(MIN(last_event_id), 0) FROM low_stock_alert_cursors)
+        """).rowcount
+
+def main():
+    parser = argparse.ArgumentParser(description='Incremental low-stock alerts')
+    parser.add_argument('--consumer', default='operations', help='name of the cursor to read and advance')
+    parser.add_argument('--limit', type=int, help='maximum number of events to consume')
+    parser.add_argument('--replay', action='store_true', help='rewind the cursor to the first event')
+    args = parser.parse_args()
+    
+    conn = sqlite3.connect(DB_PATH)
+    try:
+        install_alerting(conn)
+        if args.replay:
+            reset_cursor(conn, args.consumer)
+        alerts = poll_alerts(conn, args.consumer, limit=args.limit)
+        
+        opened = alerts[alerts['event_type'] == 'opened']
+        resolved = alerts[alerts['event_type'] == 'resolved']
+        print(f"✓ {len(opened)} new and {len(resolved)} resolved low-stock alerts for '{args.consumer}'")
+        for _, alert in opened.head(10).iterrows():
+            print(f"  → {alert['product_name']} at {alert['retailer_name']}: "
+                  f"{alert['stock_quantity']} in stock, reorder level {alert['reorder_level']}")
+    finally:
+        conn.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+Market Basket Analysis
+Sparse customer x product incidence matrices for co-occurrence, support, confidence, lift and the cross-selling report
+"""
+
+import argparse
+import sqlite3
+import time
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from sales_cube import _round
+
+DB_PATH = '/home/ubuntu/fmcg-healthcare-portfolio/data/fmcg_healthcare.db'
+
+FETCH_ROWS = 500_000
+# Pairs expanded at once when counting ordered co-purchases; bounds the memory of each customer block
+PAIR_BUDGET = 5_000_000
+
+# Query 6.2 of sql_queries.sql, kept for verification against the sparse engine
+CROSS_SELLING_SQL = """
+SELECT
+    p1.product_name as product_a,
+    p2.product_name as product_b,
+    p1.category as category_a,
+    p2.category as category_b,
+    COUNT(DISTINCT sbc1.customer_id) as customers_bought_both,
+    ROUND(COUNT(DISTINCT sbc1.customer_id) * 100.0 /
+        (SELECT COUNT(DISTINCT customer_id) FROM sales_by_customer), 2) as penetration_percentage
+FROM sales_by_customer sbc1
+JOIN sales_by_customer sbc2 ON sbc1.customer_id = sbc2.customer_id
+    AND sbc1.product_id < sbc2.product_id
+    AND sbc1.purchase_date <= sbc2.purchase_date
+JOIN products p1 ON sbc1.product_id = p1.product_id
+JOIN products p2 ON sbc2.product_id = p2.product_id
+WHERE p1.category != p2.category
+GROUP BY sbc1.product_id, sbc2.product_id
+HAVING COUNT(DISTINCT sbc1.customer_id) >= 5
+ORDER BY customers_bought_both DESC
+LIMIT 20
+"""
+
+def _reduce(codes, first, last):
+    """Collapse repeated (customer, product) codes to their first and last purchase day"""
+    order = np.argsort(codes, kind='stable')
+    codes, first, last = codes[order], first[order], last[order]
+    starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+    return codes[starts], np.minimum.reduceat(first, starts), np.maximum.reduceat(last, starts)
+
+def _merge(codes, first, last, new_codes, new_first, new_last):
+    """Merge two sorted, duplicate-free code arrays, keeping each code's earliest first and latest last day"""
+    pos = np.searchsorted(codes, new_codes)
+    seen = pos < len(codes)
+    seen[seen] = codes[pos[seen]] == new_codes[seen]
+    first, last = first.copy(), last.copy()
+    np.minimum.at(first, pos[seen], new_first[seen])
+    np.maximum.at(last, pos[seen], new_last[seen])
+    fresh = ~seen
+    return (np.insert(codes, pos[fresh], new_codes[fresh]), np.insert(first, pos[fresh], new_first[fresh]),
+            np.insert(last, pos[fresh], new_last[fresh]))
+
+def _row_blocks(indptr, budget):
+    """Split CSR rows into blocks whose within-row pair count stays under budget"""
+    pairs = np.cumsum(np.diff(indptr).astype(np.int64) ** 2)
+    bounds, start = [0], 0
+    while start < len(pairs):
+        done = pairs[start - 1] if start else 0
+        end = max(int(np.searchsorted(pairs, done + budget, side='right')), start + 1)
+        bounds.append(min(end, len(pairs)))
+        start = bounds[-1]
+    return list(zip(bounds[:-1], bounds[1:]))
+
+class BasketMatrix:
+    """Customer x product incidence (CSR) with each pair's first and last purchase day"""
+    
+    def __init__(self, customer_ids, product_ids, incidence, first_day, last_day):
+        self.customer_ids = customer_ids
+        self.product_ids = product_ids
+        self.incidence = incidence
+        self.first_day = first_day
+        self.last_day = last_day
+    
+    @classmethod
+    def from_database(cls, conn, fetch_rows=FETCH_ROWS):
+        """Build the matrices in one streaming pass over sales_by_customer"""
+        product_ids = np.array([r[0] for r in conn.execute("SELECT product_id FROM products ORDER BY product_id")],
+                               dtype=np.int64)
+        n_products = len(product_ids)
+        codes, first, last = (np.empty(0, dtype=np.int64) for _ in range(3))
+        
+        cursor = conn.execute("SELECT customer_id, product_id, purchase_date FROM sales_by_customer")
+        while True:
+            rows = cursor.fetchmany(fetch_rows)
+            if not rows:
+                break
+            customers, products, dates = zip(*rows)
+            products = np.array(products, dtype=np.int64)
+            days = np.array(dates, dtype='datetime64[D]').astype(np.int64)
+            # Rows for products missing from products are dropped, as the report SQL's JOIN does
+            pos = np.searchsorted(product_ids, products)
+            known = pos < n_products
+            known[known] = product_ids[pos[known]] == products[known]
+            chunk = np.array(customers, dtype=np.int64)[known] * n_products + pos[known]
+            # Reduce each chunk on its own, then merge it into what is held, so memory tracks distinct pairs
+            codes, first, last = _merge(codes, first, last, *_reduce(chunk, days[known], days[known]))
+        
+        customer_ids, rows = np.unique(codes // n_products, return_inverse=True)
+        cols = codes % n_products
+        shape = (len(customer_ids), n_products)
+        # codes are sorted, so the data arrays already follow CSR order
+        make = lambda data: sparse.csr_matrix((data, (rows, cols)), shape=shape)
+        return cls(customer_ids, product_ids, make(np.ones(len(codes), dtype=np.int32)), make(first), make(last))
+    
+    @property
+    def customer_count(self):
+        return len(self.customer_ids)
+    
+    def product_customers(self):
+        """Customers that bought each product"""
+        return np.asarray(self.incidence.sum(axis=0)).ravel()
+    
+    def co_occurrence(self, block_customers=100_000):
+        """Product x product customer counts XᵀX, accumulated over blocks of customers"""
+        n = len(self.product_ids)
+        total = sparse.csr_matrix((n, n), dtype=np.int64)
+        for start in range(0, self.customer_count, block_customers):
+            block = self.incidence[start:start + block_customers]
+            total = total + (block.T @ block).astype(np.int64)
+        return total.tocsr()
+    
+    def ordered_co_occurrence(self, pair_budget=PAIR_BUDGET):
+        """Customers with some purchase of a on or before some purchase of b (a < b by product_id)
+        
+        Equivalent to first_day[a] <= last_day[b] per customer, counted by expanding
+        each customer's products into pairs in blocks bounded by pair_budget.
+        """
+        n = len(self.product_ids)
+        indptr, indices = self.incidence.indptr, self.incidence.indices
+        first, last = self.first_day.data, self.last_day.data
+        total = sparse.csr_matrix((n, n), dtype=np.int64)
+        
+        for lo, hi in _row_blocks(indptr, pair_budget):
+            start, end = indptr[lo], indptr[hi]
+            lengths = np.diff(indptr[lo:hi + 1])
+            per_item = np.repeat(lengths, lengths)
+            i = np.repeat(np.arange(start, end), per_item)
+            row_start = np.repeat(np.repeat(indptr[lo:hi], lengths), per_item)
+            offsets = np.arange(len(i)) - np.repeat(np.cumsum(per_item) - per_item, per_item)
+            j = row_start + offsets
+            
+            keep = (indices[i] < indices[j]) & (first[i] <= last[j])
+            a, b = indices[i[keep]], indices[j[keep]]
+            total = total + sparse.csr_matrix((np.ones(len(a), dtype=np.int64), (a, b)), shape=(n, n))
+        return total.tocsr()
+    
+    def association_rules(self, min_customers=1):
+        """Support, confidence (both directions) and lift for every co-purchased product pair"""
+        counts = sparse.triu(self.co_occurrence(), k=1).tocoo()
+        keep = counts.data >= min_customers
+        a, b, both = counts.row[keep], counts.col[keep], counts.data[keep]
+        bought = self.product_customers()
+        n = self.customer_count
+        return pd.DataFrame({
+            'product_a_id': self.product_ids[a],
+            'product_b_id': self.product_ids[b],
+            'customers_bought_both': both,
+            'support': both / n,
+            'confidence_a_to_b': both / bought[a],
+            'confidence_b_to_a': both / bought[b],
+            'lift': both * n / (bought[a].astype(float) * bought[b]),
+        }).sort_values(['lift', 'customers_bought_both'], ascending=False, ignore_index=True)
+    
+    def cross_selling(self, conn, min_customers=5, top=20):
+        """The cross-selling report (query 6.2), with support, confidence and lift alongside"""
+        ordered = self.ordered_co_occurrence().tocoo()
+        products = pd.read_sql_query("SELECT product_id, product_name, category FROM products", conn)
+        products = products.set_index('product_id').reindex(self.product_ids)
+        category = products['category'].to_numpy()
+        
+        a, b, count = ordered.row, ordered.col, ordered.data
+        keep = (count >= min_customers) & (category[a] != category[b])
+        a, b, count = a[keep], b[keep], count[keep]
+        # Ties keep GROUP BY order (product_a, product_b), as the SQL sort does
+        order = np.lexsort((b, a, -count))[:top]
+        a, b, count = a[order], b[order], count[order]
+        
+        both = self.co_occurrence()
+        both = np.asarray(both[a, b]).ravel()
+        bought = self.product_customers()
+        n = self.customer_count
+        return pd.DataFrame({
+            'product_a': products['product_name'].to_numpy()[a],
+            'product_b': products['product_name'].to_numpy()[b],
+            'category_a': category[a],
+            'category_b': category[b],
+            'customers_bought_both': count.astype(np.int64),
+            'penetration_percentage': _round(pd.Series(count * 100.0 / n)),
+            'support': both / n,
+            'confidence': both / bought[a],
+            'lift': both * n / (bought[a].astype(float) * bought[b]),
+        })
+
+def main():
+    parser = argparse.ArgumentParser(description='Sparse market-basket analysis')
+    parser.add_argument('--db', default=DB_PATH)
+    parser.add_argument('--verify', action='store_true', help='compare against the SQL self-join (slow)')
+    args = parser.parse_args()
+    
+    conn = sqlite3.connect(args.db)
+    start = time.perf_counter()
+    basket = BasketMatrix.from_database(conn)
+    print(f"✓ {basket.customer_count:,} customers x {len(basket.product_ids)} products, "
+          f"{basket.incidence.nnz:,} pairs in {time.perf_counter() - start:.2f}s")
+    
+    start = time.perf_counter()
+    report = basket.cross_selling(conn)
+    print(f"✓ Cross-selling report in {time.perf_counter() - start:.2f}s\n")
+    print(report.to_string(index=False))
+    
+    if args.verify:
+        start = time.perf_counter()
+        expected = pd.read_sql_query(CROSS_SELLING_SQL, conn)
+        elapsed = time.perf_counter() - start
+        matches = report[expected.columns].equals(expected)
+        print(f"\n{'✓' if matches else '✗'} SQL self-join ({elapsed:.2f}s) "
+              f"{'matches' if matches else 'differs from'} the sparse result")
+    conn.close()
+
+if __name__ == '__main__':
+    main()
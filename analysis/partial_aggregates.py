@@ -0,0 +1,372 @@
+#!/usr/bin/env python3
+"""
+Mergeable Partial Aggregates
+Per-shard aggregate states (sums, counts, min/max, distinct id sets) that merge exactly across databases
+"""
+
+import json
+import re
+import numpy as np
+import pandas as pd
+from sales_cube import CELL_DTYPES, ADDITIVE_MEASURES, SalesCube, _round
+from distinct_sketch import HyperLogLog, register_sketch_functions
+
+# How each state column merges across shards
+#   attr      dimension attribute, identical in every shard (first non-null wins)
+#   count     integer count, summed
+#   isum      integer SUM, summed; NULL when no shard had rows
+#   sum       float SUM, summed; NULL when no shard had rows
+#   min/max   combined with min/max
+#   distinct  comma-separated ids from GROUP_CONCAT(DISTINCT ...), unioned
+#   sketch    HyperLogLog sketch from hll_sketch(...), merged register-wise (approximate, bounded size)
+STATE_KINDS = ['attr', 'count', 'isum', 'sum', 'min', 'max', 'distinct', 'sketch']
+
+_GROUP_CONCAT_DISTINCT = re.compile(r'GROUP_CONCAT\(DISTINCT\s+([^()]+?)\)', re.IGNORECASE)
+
+class PartialQuery:
+    """A report split into a per-shard partial SQL query and a finalize step"""
+    
+    def __init__(self, name, sql, keys, states, finalize, rows=False):
+        self.name = name
+        self.sql = sql
+        self.keys = keys
+        self.states = states
+        self.finalize = finalize
+        # Row-level reports (no aggregation) concatenate shard rows instead of merging
+        self.rows = rows
+    
+    def run(self, conn):
+        """Compute this shard's partial state"""
+        if 'sketch' in self.states.values():
+            register_sketch_functions(conn)
+        df = pd.read_sql_query(self.sql, conn)
+        for column, kind in self.states.items():
+            if kind == 'distinct':
+                df[column] = [_parse_ids(v) for v in df[column]]
+            elif kind == 'sketch':
+                df[column] = [HyperLogLog.from_bytes(v) for v in df[column]]
+        return df
+    
+    def approximate(self):
+        """This query with its distinct id sets replaced by HyperLogLog sketches"""
+        states = {column: 'sketch' if kind == 'distinct' else kind for column, kind in self.states.items()}
+        return PartialQuery(self.name, _GROUP_CONCAT_DISTINCT.sub(r'hll_sketch(\1)', self.sql), self.keys, states,
+                            self.finalize, self.rows)
+    
+    def merge(self, partials):
+        """Combine the partial states of every shard"""
+        frames = [p for p in partials if len(p)]
+        if not frames:
+            return partials[0].iloc[0:0] if partials else pd.DataFrame()
+        combined = pd.concat(frames, ignore_index=True)
+        if self.rows:
+            return combined
+        
+        grouped = combined.groupby(self.keys, sort=True, dropna=False)
+        merged = {}
+        for column, kind in self.states.items():
+            series = grouped[column]
+            if kind == 'attr':
+                merged[column] = series.first()
+            elif kind == 'count':
+                merged[column] = series.sum()
+            elif kind in ('isum', 'sum'):
+                merged[column] = series.sum(min_count=1)
+            elif kind == 'min':
+                merged[column] = series.min()
+            elif kind == 'max':
+                merged[column] = series.max()
+            elif kind == 'distinct':
+                merged[column] = series.agg(lambda sets: np.unique(np.concatenate(list(sets))))
+            elif kind == 'sketch':
+                merged[column] = series.agg(HyperLogLog.union)
+        return pd.DataFrame(merged).reset_index()
+
+def _parse_ids(value):
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return np.array([], dtype=np.int64)
+    return np.unique(np.array(str(value).split(','), dtype=np.int64))
+
+def _int_or_null(series):
+    """Integer SUMs come back as float when merged with NULLs; restore ints where possible"""
+    return series.astype('Int64') if series.notna().all() else series
+
+def _int_divide(numerator, denominator):
+    """SQLite integer division, NULL when dividing by zero or NULL"""
+    denominator = denominator.where(denominator != 0)
+    result = (numerator // denominator).astype(float)
+    return result.where(numerator.notna() & denominator.notna())
+
+def _sizes(series):
+    """Distinct counts of id sets (exact) or sketches (estimated)"""
+    return series.map(len).astype(np.int64)
+
+# ----------------------------------------------------------------------------
+# Reports that are not roll-ups of the sales cube
+# ----------------------------------------------------------------------------
+
+def _finalize_inventory_status(df):
+    out = pd.DataFrame({
+        'product_name': df['product_name'],
+        'category': df['category'],
+        'retailer_locations': df['locations'].astype(np.int64),
+        'total_stock': _int_or_null(df['total_stock']),
+        'avg_stock_per_location': _round(df['total_stock'] / df['locations']),
+        'min_stock': df['min_stock'],
+        'max_stock': df['max_stock'],
+        'locations_below_reorder': df['below_reorder'].astype(np.int64),
+    })
+    return out.sort_values('total_stock', ascending=False, kind='stable').reset_index(drop=True)
+
+def _finalize_low_stock_alert(df):
+    return df.sort_values(['units_needed', 'inventory_id'], ascending=[False, True], kind='stable') \
+        .reset_index(drop=True)
+
+def _finalize_inventory_turnover(df):
+    # The report joins sales and inventory per product, so each sale row is repeated
+    # once per inventory row (and vice versa); rebuild that fan-out from the totals
+    sales_rows = df['sales_rows'].astype(np.int64)
+    inventory_rows = df['inventory_rows'].astype(np.int64)
+    total_sold = (df['units_sold'] * inventory_rows.clip(lower=1)).where(sales_rows > 0)
+    current_stock = (df['stock'] * sales_rows.clip(lower=1)).where(inventory_rows > 0)
+    revenue = (df['revenue'] * inventory_rows.clip(lower=1)).where(sales_rows > 0)
+    out = pd.DataFrame({
+        'product_id': df['product_id'],
+        'product_name': df['product_name'],
+        'category': df['category'],
+        'total_sold': _int_or_null(total_sold),
+        'current_stock': _int_or_null(current_stock),
+        'turnover_ratio': _round(_int_divide(total_sold, current_stock)),
+        'revenue_generated': _round(revenue),
+    })
+    return out.sort_values('turnover_ratio', ascending=False, kind='stable').reset_index(drop=True)
+
+def _finalize_customer_demographics(df):
+    customers = _sizes(df['customers'])
+    purchases = df['purchases'].astype(np.int64)
+    out = pd.DataFrame({
+        'age_group': df['age_group'],
+        'income_level': df['income_level'],
+        'customer_count': customers,
+        'total_purchases': purchases,
+        'total_units_purchased': _int_or_null(df['units']),
+        'avg_purchases_per_customer': _round(_int_divide(purchases, customers)),
+        'avg_units_per_purchase': _round(_int_divide(df['units'], purchases)),
+    })
+    return out.sort_values('total_purchases', ascending=False, kind='stable').reset_index(drop=True)
+
+def _finalize_health_condition(df):
+    customers = _sizes(df['customers'])
+    purchases = df['purchases'].astype(np.int64)
+    out = pd.DataFrame({
+        'health_condition': df['health_condition'],
+        'category': df['category'],
+        'customer_count': customers,
+        'purchase_count': purchases,
+        'total_quantity': _int_or_null(df['units']),
+        'avg_purchases_per_customer': _round(_int_divide(purchases, customers)),
+    })
+    return out.sort_values('purchase_count', ascending=False, kind='stable').reset_index(drop=True)
+
+def _finalize_geographic_customers(df):
+    customers = _sizes(df['customers'])
+    transactions = df['transactions'].astype(np.int64)
+    out = pd.DataFrame({
+        'city': df['city'],
+        'customer_count': customers,
+        'total_transactions': transactions,
+        'total_units_purchased': _int_or_null(df['units']),
+        'avg_transactions_per_customer': _round(_int_divide(transactions, customers)),
+        'unique_products_purchased': _sizes(df['products']),
+    })
+    return out.sort_values('total_transactions', ascending=False, kind='stable').reset_index(drop=True)
+
+PARTIAL_QUERIES = {
+    'inventory_status': PartialQuery('inventory_status', """
+        SELECT
+            p.product_id,
+            p.product_name,
+            p.category,
+            COUNT(i.inventory_id) as locations,
+            SUM(i.stock_quantity) as total_stock,
+            MIN(i.stock_quantity) as min_stock,
+            MAX(i.stock_quantity) as max_stock,
+            COUNT(CASE WHEN i.stock_quantity < i.reorder_level THEN 1 END) as below_reorder
+        FROM inventory i
+        JOIN products p ON i.product_id = p.product_id
+        GROUP BY p.product_id
+        """, ['product_id'], {
+            'product_name': 'attr', 'category': 'attr', 'locations': 'count', 'total_stock': 'isum',
+            'min_stock': 'min', 'max_stock': 'max', 'below_reorder': 'count',
+        }, _finalize_inventory_status),
+    'low_stock_alert': PartialQuery('low_stock_alert', """
+        SELECT
+            i.inventory_id,
+            p.product_name,
+            p.category,
+            r.retailer_name,
+            r.city,
+            i.stock_quantity,
+            i.reorder_level,
+            (i.reorder_level - i.stock_quantity) as units_needed,
+            p.unit_price,
+            ROUND((i.reorder_level - i.stock_quantity) * p.unit_price, 2) as reorder_cost
+        FROM inventory i
+        JOIN products p ON i.product_id = p.product_id
+        JOIN retailers r ON i.retailer_id = r.retailer_id
+        WHERE i.stock_quantity < i.reorder_level
+        """, [], {}, _finalize_low_stock_alert, rows=True),
+    'inventory_turnover': PartialQuery('inventory_turnover', """
+        SELECT
+            p.product_id,
+            p.product_name,
+            p.category,
+            COALESCE(s.sales_rows, 0) as sales_rows,
+            s.units_sold,
+            s.revenue,
+            COALESCE(i.inventory_rows, 0) as inventory_rows,
+            i.stock
+        FROM products p
+        LEFT JOIN (
+            SELECT product_id, COUNT(*) as sales_rows, SUM(quantity_sold) as units_sold, SUM(total_amount) as revenue
+            FROM sales GROUP BY product_id
+        ) s ON p.product_id = s.product_id
+        LEFT JOIN (
+            SELECT product_id, COUNT(*) as inventory_rows, SUM(stock_quantity) as stock
+            FROM inventory GROUP BY product_id
+        ) i ON p.product_id = i.product_id
+        """, ['product_id'], {
+            'product_name': 'attr', 'category': 'attr', 'sales_rows': 'count', 'units_sold': 'isum',
+            'revenue': 'sum', 'inventory_rows': 'count', 'stock': 'isum',
+        }, _finalize_inventory_turnover),
+    'customer_demographics_analysis': PartialQuery('customer_demographics_analysis', """
+        SELECT
+            cd.age_group,
+            cd.income_level,
+            GROUP_CONCAT(DISTINCT cd.customer_id) as customers,
+            COUNT(sbc.transaction_id) as purchases,
+            SUM(sbc.quantity) as units
+        FROM customer_demographics cd
+        LEFT JOIN sales_by_customer sbc ON cd.customer_id = sbc.customer_id
+        GROUP BY cd.age_group, cd.income_level
+        """, ['age_group', 'income_level'], {
+            'customers': 'distinct', 'purchases': 'count', 'units': 'isum',
+        }, _finalize_customer_demographics),
+    'health_condition_product_preference': PartialQuery('health_condition_product_preference', """
+        SELECT
+            cd.health_condition,
+            p.category,
+            GROUP_CONCAT(DISTINCT cd.customer_id) as customers,
+            COUNT(sbc.transaction_id) as purchases,
+            SUM(sbc.quantity) as units
+        FROM customer_demographics cd
+        JOIN sales_by_customer sbc ON cd.customer_id = sbc.customer_id
+        JOIN products p ON sbc.product_id = p.product_id
+        WHERE cd.health_condition != 'None'
+        GROUP BY cd.health_condition, p.category
+        """, ['health_condition', 'category'], {
+            'customers': 'distinct', 'purchases': 'count', 'units': 'isum',
+        }, _finalize_health_condition),
+    'geographic_customer_distribution': PartialQuery('geographic_customer_distribution', """
+        SELECT
+            cd.city,
+            GROUP_CONCAT(DISTINCT cd.customer_id) as customers,
+            COUNT(sbc.transaction_id) as transactions,
+            SUM(sbc.quantity) as units,
+            GROUP_CONCAT(DISTINCT sbc.product_id) as products
+        FROM customer_demographics cd
+        LEFT JOIN sales_by_customer sbc ON cd.customer_id = sbc.customer_id
+        GROUP BY cd.city
+        """, ['city'], {
+            'customers': 'distinct', 'transactions': 'count', 'units': 'isum', 'products': 'distinct',
+        }, _finalize_geographic_customers),
+}
+
+# Same reports with bounded-size sketch states, for --approximate runs
+APPROXIMATE_PARTIAL_QUERIES = {name: query.approximate() for name, query in PARTIAL_QUERIES.items()}
+
+def partial_queries(approximate=False):
+    return APPROXIMATE_PARTIAL_QUERIES if approximate else PARTIAL_QUERIES
+
+# ----------------------------------------------------------------------------
+# Sales cube cells as a mergeable state
+# ----------------------------------------------------------------------------
+
+CUBE_GRAIN = ['month', 'product_id', 'retailer_id', 'discount_band']
+
+def merge_cube_cells(cell_frames):
+    """Merge shard cubes; ids in the grain keep distinct counts exact"""
+    frames = [f for f in cell_frames if len(f)]
+    if not frames:
+        return pd.DataFrame({col: pd.Series(dtype=dtype) for col, dtype in CELL_DTYPES.items()})
+    combined = pd.concat(frames, ignore_index=True)
+    grouped = combined.groupby(CUBE_GRAIN, sort=True)
+    merged = grouped[ADDITIVE_MEASURES].sum()
+    merged['min_amount'] = grouped['min_amount'].min()
+    merged['max_amount'] = grouped['max_amount'].max()
+    merged = merged.reset_index()
+    return merged.astype(CELL_DTYPES)[list(CELL_DTYPES)]
+
+def merged_cube(cell_frames, conn):
+    """Build a queryable SalesCube from shard cells; dimensions come from any shard"""
+    return SalesCube(merge_cube_cells(cell_frames)).attach_dimensions(conn)
+
+# ----------------------------------------------------------------------------
+# Compact serialization (.npz, no pickled objects)
+# ----------------------------------------------------------------------------
+
+def _encode_frame(prefix, df, states):
+    arrays = {}
+    for column in df.columns:
+        key = f'{prefix}/{column}'
+        if states.get(column) == 'distinct':
+            sets = list(df[column])
+            arrays[f'{key}#offsets'] = np.cumsum([0] + [len(s) for s in sets]).astype(np.int64)
+            arrays[f'{key}#values'] = np.concatenate(sets).astype(np.int64) if sets else np.array([], dtype=np.int64)
+        elif states.get(column) == 'sketch':
+            blobs = [sketch.to_bytes() for sketch in df[column]]
+            arrays[f'{key}#sketch_offsets'] = np.cumsum([0] + [len(b) for b in blobs]).astype(np.int64)
+            arrays[f'{key}#sketches'] = np.frombuffer(b''.join(blobs), dtype=np.uint8)
+        elif pd.api.types.is_numeric_dtype(df[column]):
+            arrays[key] = df[column].to_numpy(dtype=float if df[column].isna().any() else None)
+        else:
+            values = df[column]
+            arrays[f'{key}#null'] = values.isna().to_numpy()
+            arrays[key] = values.fillna('').astype(str).to_numpy(dtype=str)
+    arrays[f'{prefix}#columns'] = np.array(list(df.columns), dtype=str)
+    return arrays
+
+def _decode_frame(prefix, archive):
+    data = {}
+    for column in archive[f'{prefix}#columns']:
+        key = f'{prefix}/{column}'
+        if f'{key}#offsets' in archive:
+            offsets, values = archive[f'{key}#offsets'], archive[f'{key}#values']
+            data[column] = [values[offsets[i]:offsets[i + 1]] for i in range(len(offsets) - 1)]
+        elif f'{key}#sketch_offsets' in archive:
+            offsets, blob = archive[f'{key}#sketch_offsets'], archive[f'{key}#sketches'].tobytes()
+            data[column] = [HyperLogLog.from_bytes(blob[offsets[i]:offsets[i + 1]]) for i in range(len(offsets) - 1)]
+        elif f'{key}#null' in archive:
+            series = pd.Series(archive[key], dtype=object)
+            data[column] = series.where(~archive[f'{key}#null'], None)
+        else:
+            data[column] = archive[key]
+    return pd.DataFrame(data)
+
+def save_partials(path, cube_cells, partials, metadata=None, queries=PARTIAL_QUERIES):
+    """Write one shard's cube cells and partial states to a compressed .npz"""
+    arrays = {f'cube/{col}': cube_cells[col].to_numpy() for col in CELL_DTYPES}
+    for name, df in partials.items():
+        arrays.update(_encode_frame(f'partial/{name}', df, queries[name].states))
+    arrays['__metadata__'] = np.array(json.dumps(metadata or {}))
+    np.savez_compressed(path, **arrays)
+
+def load_partials(path):
+    """Read a shard's cube cells, partial states and metadata"""
+    with np.load(path) as archive:
+        cube_cells = pd.DataFrame({col: archive[f'cube/{col}'] for col in CELL_DTYPES})
+        names = [key[len('partial/'):-len('#columns')] for key in archive.files
+                 if key.startswith('partial/') and key.endswith('#columns')]
+        partials = {name: _decode_frame(f'partial/{name}', archive) for name in names}
+        metadata = json.loads(str(archive['__metadata__'])) if '__metadata__' in archive.files else {}
+    return cube_cells, partials, metadata
@@ -3,61 +3,88 @@ Predictive Analytics Module for FMCG Healthcare Portfolio
 Implements ARIMA time-series forecasting for revenue and inventory requirements
 """
 
+import argparse
 import sqlite3
 import pandas as pd
 import numpy as np
-import json
 from datetime import datetime, timedelta
+from pathlib import Path
 from statsmodels.tsa.arima.model import ARIMA
 from sklearn.metrics import mean_absolute_error, mean_squared_error
 import warnings
+from typed_loading import read_sql_compact
+from sales_snapshot import load_snapshot, monthly_sales, product_monthly_sales
+from memory_db import connect
+from date_keys import has_date_keys
+from json_output import COMPRESSIONS, PUBLIC_DIR, write_json, resolve_public_dir, format_sizes
 warnings.filterwarnings('ignore')
 
 # Database path
 DB_PATH = '/home/ubuntu/fmcg-healthcare-portfolio/data/fmcg_healthcare.db'
 
-def load_monthly_data():
-    """Load monthly sales data from database"""
-    conn = sqlite3.connect(DB_PATH)
+def load_monthly_data(db_path=None, conn=None):
+    """Load monthly sales data from database (or an already open connection)"""
+    owns_conn = conn is None
+    conn = conn or sqlite3.connect(db_path or DB_PATH)
+    
+    if has_date_keys(conn):
+        # Group on the integer month key instead of formatting every sale_date
+        month, group = "printf('%04d-%02d', month_key / 100, month_key % 100)", "month_key"
+    else:
+        month, group = "strftime('%Y-%m', sale_date)", "strftime('%Y-%m', sale_date)"
     
-    query = """
+    query = f"""
     SELECT 
-        strftime('%Y-%m', sale_date) as month,
+        {month} as month,
         SUM(total_amount) as revenue,
         SUM(quantity_sold) as units_sold,
         COUNT(*) as transaction_count,
         AVG(total_amount) as avg_order_value
     FROM sales
-    GROUP BY strftime('%Y-%m', sale_date)
+    GROUP BY {group}
     ORDER BY month
     """
     
     df = pd.read_sql_query(query, conn)
-    conn.close()
+    if owns_conn:
+        conn.close()
     
     df['month'] = pd.to_datetime(df['month'])
     return df.sort_values('month')
 
-def load_product_monthly_data():
+def load_product_monthly_data(db_path=None, compact_dtypes=False, conn=None):
     """Load monthly product-level inventory data"""
-    conn = sqlite3.connect(DB_PATH)
+    owns_conn = conn is None
+    conn = conn or sqlite3.connect(db_path or DB_PATH)
+    
+    if has_date_keys(conn):
+        month, group = "printf('%04d-%02d', s.month_key / 100, s.month_key % 100)", "s.month_key"
+    else:
+        month, group = "strftime('%Y-%m', s.sale_date)", "strftime('%Y-%m', s.sale_date)"
     
-    query = """
+    query = f"""
     SELECT 
         p.product_id,
         p.product_name,
         p.category,
-        strftime('%Y-%m', s.sale_date) as month,
+        {month} as month,
         SUM(s.quantity_sold) as units_sold,
         SUM(s.total_amount) as revenue
     FROM sales s
     JOIN products p ON s.product_id = p.product_id
-    GROUP BY p.product_id, strftime('%Y-%m', s.sale_date)
+    GROUP BY p.product_id, {group}
     ORDER BY p.product_id, month
     """
     
-    df = pd.read_sql_query(query, conn)
-    conn.close()
+    if compact_dtypes:
+        # Categorical product_name/category and downcast product ids for large pulls
+        df, report = read_sql_compact(query, conn)
+        print(f"  product monthly data: {report['bytes_saved'] / 1024:,.1f} KB saved "
+              f"({report['reduction_pct']:.1f}%)")
+    else:
+        df = pd.read_sql_query(query, conn)
+    if owns_conn:
+        conn.close()
     
     df['month'] = pd.to_datetime(df['month'])
     return df
@@ -219,12 +246,33 @@ def calculate_quarterly_metrics(monthly_data, revenue_forecast):
         'historical_quarters': quarterly_data.to_dict('records')
     }
 
-def generate_forecasting_report():
+def load_from_snapshot(snapshot_dir, db_path=None):
+    """Load monthly and product-level data from the memory-mapped sales snapshot"""
+    snapshot = load_snapshot(db_path or DB_PATH, snapshot_dir)
+    conn = sqlite3.connect(db_path or DB_PATH)
+    try:
+        product_data = product_monthly_sales(snapshot, conn)
+    finally:
+        conn.close()
+    return monthly_sales(snapshot), product_data
+
+def generate_forecasting_report(snapshot_dir=None, in_memory=False):
     """Generate comprehensive forecasting report"""
     
     print("Loading data...")
-    monthly_data = load_monthly_data()
-    product_data = load_product_monthly_data()
+    if snapshot_dir:
+        monthly_data, product_data = load_from_snapshot(snapshot_dir)
+    elif in_memory:
+        # Both loaders read the same in-memory snapshot through one connection
+        conn = connect(DB_PATH, in_memory=True)
+        try:
+            monthly_data = load_monthly_data(conn=conn)
+            product_data = load_product_monthly_data(conn=conn)
+        finally:
+            conn.close()
+    else:
+        monthly_data = load_monthly_data()
+        product_data = load_product_monthly_data()
     
     print("Forecasting revenue...")
     revenue_forecast = forecast_revenue(monthly_data, periods=3)
@@ -266,25 +314,35 @@ def generate_forecasting_report():
     
     return report
 
-def save_forecast_report(report, output_path):
-    """Save forecast report to JSON file"""
-    with open(output_path, 'w') as f:
-        json.dump(report, f, indent=2, default=str)
-    print(f"Forecast report saved to {output_path}")
+def save_forecast_report(report, output_path, compressions=(), public_dir=None):
+    """Save forecast report to JSON file and publish it for the dashboard"""
+    sizes = write_json(report, output_path, compressions, public_dir)
+    print(f"Forecast report saved to {output_path} ({format_sizes(sizes)})")
+    if public_dir is not None:
+        print(f"Forecast report published to {public_dir}")
 
 def main():
     """Main execution"""
+    parser = argparse.ArgumentParser(description='FMCG Healthcare predictive analytics')
+    parser.add_argument('--in-memory', action='store_true',
+                        help='load the forecasting data from an in-memory snapshot of the database')
+    parser.add_argument('--compress', nargs='*', choices=COMPRESSIONS, default=[],
+                        help='also write pre-compressed copies of the report JSON')
+    parser.add_argument('--public-dir', type=Path, default=PUBLIC_DIR,
+                        help='directory the web server serves the report from')
+    args = parser.parse_args()
+    
     print("="*60)
     print("FMCG Healthcare Predictive Analytics")
     print("Revenue and Inventory Forecasting")
     print("="*60)
     
     # Generate report
-    report = generate_forecasting_report()
+    report = generate_forecasting_report(in_memory=args.in_memory)
     
     # Save report
     output_path = '/home/ubuntu/fmcg-healthcare-portfolio/analysis/forecast_report.json'
-    save_forecast_report(report, output_path)
+    save_forecast_report(report, output_path, args.compress, resolve_public_dir(args.public_dir))
     
     # Print summary
     print("\n" + "="*60)
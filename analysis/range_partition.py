@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Range-Partitioned SQL Analysis
+Splits the fact tables into id ranges and aggregates each range in its own process and read-only connection,
+then merges the partial states, so one large report uses every core instead of one
+"""
+
+import argparse
+import os
+import sqlite3
+import time
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from execute_sql_analysis import SQL_QUERIES, SQLAnalyzer
+from partial_aggregates import partial_queries
+from sales_cube import CUBE_SQL, CELL_DTYPES, CUBE_REPORTS
+from shard_analysis import merge_reports
+
+DB_PATH = '/home/ubuntu/fmcg-healthcare-portfolio/data/fmcg_healthcare.db'
+
+# Fact tables and the unique id each is sliced by. No report joins two of them row by row, so every slice is a
+# disjoint piece of each aggregate, exactly like a shard. The ids are used rather than rowid because
+# date_keys.py --cluster rebuilds sales WITHOUT ROWID (sale_id keeps a unique index there).
+PARTITION_KEYS = {'sales': 'sale_id', 'sales_by_customer': 'transaction_id', 'inventory': 'inventory_id'}
+PARTITIONED_TABLES = list(PARTITION_KEYS)
+
+REPORT_NAMES = [query_name for _, queries in SQL_QUERIES for query_name, _ in queries]
+
+def key_ranges(conn, table, partitions):
+    """Equal-width inclusive ranges of the table's partition key covering the table"""
+    key = PARTITION_KEYS[table]
+    low, high = conn.execute(f"SELECT MIN({key}), MAX({key}) FROM {table}").fetchone()
+    if low is None:
+        return [(0, -1)] * partitions
+    bounds = np.linspace(low, high + 1, partitions + 1).round().astype(np.int64)
+    return [(int(bounds[i]), int(bounds[i + 1]) - 1) for i in range(partitions)]
+
+def plan_partitions(db_path, partitions):
+    """One {table: (first_id, last_id)} mapping per partition"""
+    conn = _read_only(db_path)
+    try:
+        ranges = {table: key_ranges(conn, table, partitions) for table in PARTITIONED_TABLES}
+    finally:
+        conn.close()
+    return [{table: ranges[table][i] for table in PARTITIONED_TABLES} for i in range(partitions)]
+
+def _read_only(db_path):
+    return sqlite3.connect(f'file:{Path(db_path).resolve()}?mode=ro', uri=True)
+
+def partition_connection(db_path, ranges):
+    """Read-only connection where each fact table name resolves to its id slice.
+    
+    Unqualified names are looked up in the temp schema before main, so TEMP views shadow the tables and
+    the report SQL runs unchanged; SQLite turns the id filter into a range search on the primary key (or on
+    the unique sale_id index of a clustered sales table).
+    """
+    conn = _read_only(db_path)
+    for table, (first, last) in ranges.items():
+        conn.execute(f"CREATE TEMP VIEW {table} AS SELECT * FROM main.{table} "
+                     f"WHERE {PARTITION_KEYS[table]} BETWEEN {int(first)} AND {int(last)}")
+    return conn
+
+def map_partition(db_path, ranges, names, approximate=False):
+    """Cube cells (if any cube report is requested) and partial states for one id slice"""
+    start = time.perf_counter()
+    queries = partial_queries(approximate)
+    conn = partition_connection(db_path, ranges)
+    try:
+        conn.execute("BEGIN")
+        cube_cells = pd.read_sql_query(CUBE_SQL, conn).astype(CELL_DTYPES) \
+            if any(name in CUBE_REPORTS for name in names) else None
+        partials = {name: queries[name].run(conn) for name in names if name not in CUBE_REPORTS}
+        conn.execute("COMMIT")
+    finally:
+        conn.close()
+    return cube_cells, partials, time.perf_counter() - start
+
+class RangePartitionedSQLAnalyzer:
+    """SQLAnalyzer counterpart that runs every report across id slices of one database"""
+    
+    def __init__(self, db_path, partitions=None, workers=None, approximate=False):
+        self.db_path = str(db_path)
+        self.workers = workers or os.cpu_count()
+        self.partitions = partitions or self.workers
+        self.approximate = approximate
+        self.results = {}
+        self.failures = {}
+        self.timings = {}
+    
+    def _fan_out(self, names):
+        plan = plan_partitions(self.db_path, self.partitions)
+        count = len(plan)
+        if self.workers == 1:
+            mapped = [map_partition(self.db_path, ranges, names, self.approximate) for ranges in plan]
+        else:
+            with ProcessPoolExecutor(max_workers=min(self.workers, count)) as pool:
+                mapped = list(pool.map(map_partition, [self.db_path] * count, plan, [names] * count,
+                                       [self.approximate] * count))
+        cube_cells = [cells for cells, _, _ in mapped if cells is not None]
+        partials = {name: [p[name] for _, p, _ in mapped] for name in names if name not in CUBE_REPORTS}
+        conn = _read_only(self.db_path)
+        try:
+            return merge_reports(cube_cells, partials, conn, self.approximate, names), \
+                max(elapsed for _, _, elapsed in mapped)
+        finally:
+            conn.close()
+    
+    def run_query(self, query_name):
+        """One report, aggregated across all partitions in parallel"""
+        start = time.perf_counter()
+        results, _ = self._fan_out([query_name])
+        self.results[query_name] = results[query_name]
+        self.timings[query_name] = time.perf_counter() - start
+        return results[query_name]
+    
+    def run_all_queries(self):
+        """Every report from one fan-out: each partition computes all partial states in one transaction"""
+        print(f"Executing SQL Analysis Queries across {self.partitions} id partitions "
+              f"({self.workers} workers)...\n")
+        start = time.perf_counter()
+        self.results, slowest = self._fan_out(REPORT_NAMES)
+        elapsed = time.perf_counter() - start
+        print(f"  → map: slowest partition {slowest:.2f}s; total with merge {elapsed:.2f}s")
+        
+        for i, (section, queries) in enumerate(SQL_QUERIES):
+            print(("\n" if i else "") + section)
+            for query_name, _ in queries:
+                print(f"  ✓ {query_name}: {len(self.results[query_name])} rows")
+        
+        print("\n✓ All SQL queries executed successfully!")
+    
+    # Results have the same shape as SQLAnalyzer's, so exports are shared
+    export_results = SQLAnalyzer.export_results
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the SQL reports in parallel across sale_id ranges')
+    parser.add_argument('--db', default=DB_PATH)
+    parser.add_argument('--partitions', type=int, help='id ranges per fact table (default: one per worker)')
+    parser.add_argument('--workers', type=int, help='worker processes (default: all cores)')
+    parser.add_argument('--approximate', action='store_true',
+                        help='HyperLogLog sketches instead of exact distinct id sets')
+    parser.add_argument('--query', choices=REPORT_NAMES, help='run a single report and print it')
+    args = parser.parse_args()
+    
+    analyzer = RangePartitionedSQLAnalyzer(args.db, args.partitions, args.workers, args.approximate)
+    if args.query:
+        start = time.perf_counter()
+        df = analyzer.run_query(args.query)
+        print(df.head(20).to_string(index=False))
+        print(f"\n✓ {args.query}: {len(df)} rows in {time.perf_counter() - start:.2f}s "
+              f"across {analyzer.partitions} partitions")
+        return
+    analyzer.run_all_queries()
+    analyzer.export_results()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,402 @@
+#!/usr/bin/env python3
+"""
+Sales OLAP Cube
+Materializes sales at month x product x retailer x discount band grain once and
+answers the roll-up reports from the cube instead of re-joining the fact table
+"""
+
+import sqlite3
+import json
+import time
+import numpy as np
+import pandas as pd
+from decimal import Decimal, ROUND_HALF_UP
+from pathlib import Path
+from sales_snapshot import source_watermark
+
+DB_PATH = '/home/ubuntu/fmcg-healthcare-portfolio/data/fmcg_healthcare.db'
+CUBE_PATH = Path('/home/ubuntu/fmcg-healthcare-portfolio/data/sales_cube.npz')
+
+# Discount bands in the same order and labels as discount_impact_analysis
+DISCOUNT_BANDS = ['No Discount', '1-5% Discount', '6-10% Discount', '>10% Discount']
+
+# Finest-grain cells; month is months since 1970-01. revenue_sq and min/max amount
+# let order-value spread and range be rolled up alongside the additive measures
+CUBE_SQL = """
+SELECT
+    (CAST(strftime('%Y', sale_date) AS INTEGER) - 1970) * 12
+        + CAST(strftime('%m', sale_date) AS INTEGER) - 1 as month,
+    product_id,
+    retailer_id,
+    CASE
+        WHEN discount_percent = 0 THEN 0
+        WHEN discount_percent <= 5 THEN 1
+        WHEN discount_percent <= 10 THEN 2
+        ELSE 3
+    END as discount_band,
+    COUNT(sale_id) as transactions,
+    SUM(quantity_sold) as units,
+    SUM(total_amount) as revenue,
+    SUM(total_amount * total_amount) as revenue_sq,
+    SUM(discount_percent) as discount_sum,
+    MIN(total_amount) as min_amount,
+    MAX(total_amount) as max_amount
+FROM sales
+GROUP BY month, product_id, retailer_id, discount_band
+"""
+
+CELL_DTYPES = {
+    'month': np.int32,
+    'product_id': np.int32,
+    'retailer_id': np.int32,
+    'discount_band': np.int8,
+    'transactions': np.int32,
+    'units': np.int64,
+    'revenue': np.float64,
+    'revenue_sq': np.float64,
+    'discount_sum': np.float64,
+    'min_amount': np.float64,
+    'max_amount': np.float64,
+}
+
+ADDITIVE_MEASURES = ['transactions', 'units', 'revenue', 'revenue_sq', 'discount_sum']
+
+def _round(series, digits=2):
+    """Round half away from zero like SQLite ROUND(), leaving NULLs as NaN"""
+    quantum = Decimal(1).scaleb(-digits)
+    return series.map(lambda v: v if pd.isna(v) else
+                      float(Decimal(repr(float(v))).quantize(quantum, rounding=ROUND_HALF_UP)))
+
+class SalesCube:
+    def __init__(self, cells, watermark=None):
+        self.cells = cells
+        self.watermark = watermark
+        self._dimensions = None
+    
+    @classmethod
+    def materialize(cls, conn):
+        """Compute the finest-grain cells from the sales table in one pass"""
+        conn.execute("BEGIN")
+        try:
+            watermark = source_watermark(conn)
+            cells = pd.read_sql_query(CUBE_SQL, conn)
+        finally:
+            conn.execute("COMMIT")
+        cells = cells.astype({col: dtype for col, dtype in CELL_DTYPES.items()})
+        return cls(cells, watermark)
+    
+    def save(self, path=CUBE_PATH):
+        """Store the cells as a compressed column archive"""
+        path = Path(path)
+        arrays = {col: self.cells[col].to_numpy() for col in CELL_DTYPES}
+        arrays['__watermark__'] = np.array(json.dumps(self.watermark))
+        tmp_path = path.with_name(path.stem + '.tmp.npz')
+        np.savez_compressed(tmp_path, **arrays)
+        tmp_path.replace(path)
+    
+    @classmethod
+    def load(cls, path=CUBE_PATH):
+        with np.load(path) as archive:
+            cells = pd.DataFrame({col: archive[col] for col in CELL_DTYPES})
+            watermark = json.loads(str(archive['__watermark__']))
+        return cls(cells, watermark)
+    
+    def is_current(self, conn):
+        return source_watermark(conn) == self.watermark
+    
+    # ------------------------------------------------------------------------
+    # Dimension lookups
+    # ------------------------------------------------------------------------
+    
+    def attach_dimensions(self, conn):
+        """Load the (small) dimension tables used to roll cells up"""
+        products = pd.read_sql_query("""
+            SELECT p.product_id, p.product_name, p.category, p.subcategory, p.unit_price,
+                   p.manufacturer_id, m.manufacturer_name, m.country
+            FROM products p
+            LEFT JOIN manufacturers m ON p.manufacturer_id = m.manufacturer_id
+        """, conn).set_index('product_id')
+        retailers = pd.read_sql_query("""
+            SELECT r.retailer_id, r.retailer_name, r.retailer_type, r.city, r.state,
+                   r.distributor_id, d.distributor_name, d.region
+            FROM retailers r
+            LEFT JOIN distributors d ON r.distributor_id = d.distributor_id
+        """, conn).set_index('retailer_id')
+        manufacturers = pd.read_sql_query("SELECT * FROM manufacturers", conn)
+        self._dimensions = {'products': products, 'retailers': retailers, 'manufacturers': manufacturers}
+        return self
+    
+    def _attribute(self, name):
+        """Resolve a grouping attribute for every cell"""
+        cells = self.cells
+        if name in cells.columns:
+            return cells[name]
+        if name == 'month_label':
+            return pd.Series(cells['month'].to_numpy().astype('datetime64[M]').astype(str), index=cells.index)
+        if name == 'quarter':
+            return 'Q' + ((cells['month'] % 12) // 3 + 1).astype(str)
+        if name == 'year':
+            return cells['month'] // 12 + 1970
+        if name == 'discount_range':
+            return cells['discount_band'].map(dict(enumerate(DISCOUNT_BANDS)))
+        if self._dimensions is None:
+            raise RuntimeError("Call attach_dimensions() before rolling up by dimension attributes")
+        if name in self._dimensions['products'].columns:
+            return cells['product_id'].map(self._dimensions['products'][name])
+        if name in self._dimensions['retailers'].columns:
+            return cells['retailer_id'].map(self._dimensions['retailers'][name])
+        raise KeyError(f"Unknown cube attribute: {name}")
+    
+    def rollup(self, by, distinct=()):
+        """Aggregate the cube along any subset of attributes
+        
+        Returns additive measures plus min/max amount and, for each column in
+        distinct, the number of distinct values (e.g. retailer_id, product_id).
+        """
+        keys = {name: self._attribute(name) for name in by}
+        frame = pd.DataFrame(keys, index=self.cells.index)
+        for col in ADDITIVE_MEASURES + ['min_amount', 'max_amount'] + list(distinct):
+            frame[col] = self.cells[col]
+        
+        if not by:
+            frame['_all'] = 0
+            by = ['_all']
+        grouped = frame.groupby(list(by), sort=False, dropna=False)
+        result = grouped[ADDITIVE_MEASURES].sum()
+        result['min_amount'] = grouped['min_amount'].min()
+        result['max_amount'] = grouped['max_amount'].max()
+        for col in distinct:
+            result[f'distinct_{col}'] = grouped[col].nunique()
+        result = result.reset_index()
+        return result.drop(columns=['_all']) if '_all' in result.columns else result
+    
+    # ------------------------------------------------------------------------
+    # Named reports (same columns and order as execute_sql_analysis)
+    # ------------------------------------------------------------------------
+    
+    def answer(self, query_name):
+        """Answer a named SQLAnalyzer query from the cube"""
+        if query_name not in CUBE_REPORTS:
+            raise KeyError(f"{query_name} cannot be answered from the sales cube")
+        return CUBE_REPORTS[query_name](self)
+    
+    def total_revenue(self):
+        return float(self.cells['revenue'].sum())
+
+def _sales_by_category(cube):
+    df = cube.rollup(['category'])
+    out = pd.DataFrame({
+        'category': df['category'],
+        'transactions': df['transactions'],
+        'units_sold': df['units'],
+        'revenue': df['revenue'],
+        'avg_order_value': _round(df['revenue'] / df['transactions']),
+        'revenue_pct': _round(df['revenue'] * 100.0 / cube.total_revenue()),
+    })
+    return out.sort_values('revenue', ascending=False).reset_index(drop=True)
+
+def _monthly_sales_trend(cube):
+    df = cube.rollup(['month_label']).sort_values('month_label')
+    out = pd.DataFrame({
+        'month': df['month_label'],
+        'transaction_count': df['transactions'],
+        'units_sold': df['units'],
+        'monthly_revenue': df['revenue'],
+        'avg_order_value': _round(df['revenue'] / df['transactions']),
+        'avg_discount': _round(df['discount_sum'] / df['transactions']),
+    })
+    return out.reset_index(drop=True)
+
+def _top_10_products(cube):
+    df = cube.rollup(['product_id', 'product_name', 'category', 'unit_price'])
+    out = pd.DataFrame({
+        'product_id': df['product_id'],
+        'product_name': df['product_name'],
+        'category': df['category'],
+        'unit_price': df['unit_price'],
+        'times_sold': df['transactions'],
+        'total_quantity': df['units'],
+        'total_revenue': df['revenue'],
+        'avg_order_value': _round(df['revenue'] / df['transactions']),
+    })
+    return out.sort_values('total_revenue', ascending=False).head(10).reset_index(drop=True)
+
+def _sales_by_retailer_type(cube):
+    df = cube.rollup(['retailer_type'], distinct=['retailer_id'])
+    out = pd.DataFrame({
+        'retailer_type': df['retailer_type'],
+        'retailer_count': df['distinct_retailer_id'],
+        'total_transactions': df['transactions'],
+        'total_units': df['units'],
+        'total_revenue': df['revenue'],
+        'avg_transaction_value': _round(df['revenue'] / df['transactions']),
+        'revenue_per_retailer': _round(df['revenue'] / df['distinct_retailer_id']),
+    })
+    return out.sort_values('total_revenue', ascending=False).reset_index(drop=True)
+
+def _discount_impact_analysis(cube):
+    df = cube.rollup(['discount_band', 'discount_range']).sort_values('discount_band')
+    out = pd.DataFrame({
+        'discount_range': df['discount_range'],
+        'transaction_count': df['transactions'],
+        'units_sold': df['units'],
+        'revenue': df['revenue'],
+        'avg_units_per_transaction': _round(df['units'] / df['transactions']),
+        'avg_transaction_value': _round(df['revenue'] / df['transactions']),
+    })
+    return out.reset_index(drop=True)
+
+def _sales_by_region_distributor(cube):
+    df = cube.rollup(['distributor_id', 'region', 'distributor_name'], distinct=['retailer_id'])
+    df = df[df['distributor_id'].notna()]
+    out = pd.DataFrame({
+        'region': df['region'],
+        'distributor_name': df['distributor_name'],
+        'retailer_count': df['distinct_retailer_id'],
+        'total_sales': df['transactions'],
+        'total_revenue': df['revenue'],
+        'avg_order_value': _round(df['revenue'] / df['transactions']),
+        'revenue_per_retailer': _round(df['revenue'] / df['distinct_retailer_id']),
+    })
+    return out.sort_values('total_revenue', ascending=False).reset_index(drop=True)
+
+def _top_retailers(cube):
+    df = cube.rollup(['retailer_id', 'retailer_name', 'retailer_type', 'city', 'distributor_name'],
+                     distinct=['product_id'])
+    out = pd.DataFrame({
+        'retailer_id': df['retailer_id'],
+        'retailer_name': df['retailer_name'],
+        'retailer_type': df['retailer_type'],
+        'city': df['city'],
+        'distributor_name': df['distributor_name'],
+        'transaction_count': df['transactions'],
+        'total_units': df['units'],
+        'total_revenue': df['revenue'],
+        'avg_order_value': _round(df['revenue'] / df['transactions']),
+        'unique_products_sold': df['distinct_product_id'],
+    })
+    return out.sort_values('total_revenue', ascending=False).head(15).reset_index(drop=True)
+
+def _regional_sales_distribution(cube):
+    df = cube.rollup(['state'], distinct=['retailer_id'])
+    out = pd.DataFrame({
+        'state': df['state'],
+        'retailer_count': df['distinct_retailer_id'],
+        'total_transactions': df['transactions'],
+        'total_units': df['units'],
+        'total_revenue': df['revenue'],
+        'revenue_per_retailer': _round(df['revenue'] / df['distinct_retailer_id']),
+        'market_share_percentage': _round(df['revenue'] * 100.0 / cube.total_revenue()),
+    })
+    return out.sort_values('total_revenue', ascending=False).reset_index(drop=True)
+
+def _manufacturer_performance(cube):
+    products = cube._dimensions['products']
+    manufacturers = cube._dimensions['manufacturers']
+    sold = cube.rollup(['manufacturer_id'])
+    product_counts = products.groupby('manufacturer_id').size().rename('product_count')
+    df = manufacturers.merge(product_counts, left_on='manufacturer_id', right_index=True, how='left') \
+        .merge(sold, on='manufacturer_id', how='left')
+    df['product_count'] = df['product_count'].fillna(0).astype(int)
+    df['transactions'] = df['transactions'].fillna(0).astype(int)
+    out = pd.DataFrame({
+        'manufacturer_name': df['manufacturer_name'],
+        'country': df['country'],
+        'product_count': df['product_count'],
+        'total_sales': df['transactions'],
+        'total_units': df['units'],
+        'total_revenue': df['revenue'],
+        'avg_order_value': _round(df['revenue'] / df['transactions'].replace(0, np.nan)),
+        'revenue_per_product': _round(df['revenue'] / df['product_count'].replace(0, np.nan)),
+    })
+    return out.sort_values('total_revenue', ascending=False).reset_index(drop=True)
+
+def _product_category_performance(cube):
+    products = cube._dimensions['products']
+    sold = cube.rollup(['category', 'subcategory'])
+    product_counts = products.groupby(['category', 'subcategory']).size().rename('product_count').reset_index()
+    df = product_counts.merge(sold, on=['category', 'subcategory'], how='left')
+    df['transactions'] = df['transactions'].fillna(0).astype(int)
+    out = pd.DataFrame({
+        'category': df['category'],
+        'subcategory': df['subcategory'],
+        'product_count': df['product_count'],
+        'transaction_count': df['transactions'],
+        'total_quantity': df['units'],
+        'total_revenue': df['revenue'],
+        'avg_transaction_value': _round(df['revenue'] / df['transactions'].replace(0, np.nan)),
+        'revenue_per_product': _round(df['revenue'] / df['product_count']),
+        'market_share': _round(df['revenue'] * 100.0 / cube.total_revenue()),
+    })
+    return out.sort_values('total_revenue', ascending=False).reset_index(drop=True)
+
+def _business_kpis(cube):
+    df = cube.rollup([], distinct=['retailer_id', 'product_id'])
+    return pd.DataFrame({
+        'total_transactions': df['transactions'],
+        'total_units_sold': df['units'],
+        'total_revenue': _round(df['revenue']),
+        'avg_transaction_value': _round(df['revenue'] / df['transactions']),
+        'revenue_per_transaction': _round(df['revenue'] / df['transactions']),
+        'active_retailers': df['distinct_retailer_id'],
+        'products_sold': df['distinct_product_id'],
+        'avg_discount_rate': _round(df['discount_sum'] / df['transactions']),
+    })
+
+def _seasonal_trends(cube):
+    df = cube.rollup(['quarter', 'category'])
+    out = pd.DataFrame({
+        'quarter': df['quarter'],
+        'category': df['category'],
+        'transaction_count': df['transactions'],
+        'units_sold': df['units'],
+        'revenue': df['revenue'],
+        'avg_order_value': _round(df['revenue'] / df['transactions']),
+    })
+    return out.sort_values(['quarter', 'revenue'], ascending=[True, False]).reset_index(drop=True)
+
+# Reports that are pure roll-ups of the sales measures
+CUBE_REPORTS = {
+    'sales_by_category': _sales_by_category,
+    'monthly_sales_trend': _monthly_sales_trend,
+    'top_10_products': _top_10_products,
+    'sales_by_retailer_type': _sales_by_retailer_type,
+    'discount_impact_analysis': _discount_impact_analysis,
+    'sales_by_region_distributor': _sales_by_region_distributor,
+    'top_retailers': _top_retailers,
+    'regional_sales_distribution': _regional_sales_distribution,
+    'manufacturer_performance': _manufacturer_performance,
+    'product_category_performance': _product_category_performance,
+    'business_kpis': _business_kpis,
+    'seasonal_trends': _seasonal_trends,
+}
+
+def load_cube(conn, path=CUBE_PATH, refresh=True):
+    """Load the stored cube, re-materializing it if missing or stale"""
+    path = Path(path)
+    cube = SalesCube.load(path) if path.exists() else None
+    if cube is None or (refresh and not cube.is_current(conn)):
+        cube = SalesCube.materialize(conn)
+        cube.save(path)
+    return cube.attach_dimensions(conn)
+
+def main():
+    conn = sqlite3.connect(DB_PATH)
+    try:
+        start = time.perf_counter()
+        cube = SalesCube.materialize(conn)
+        cube.save(CUBE_PATH)
+        cube.attach_dimensions(conn)
+        elapsed = time.perf_counter() - start
+        print(f"✓ Cube materialized: {len(cube.cells):,} cells from "
+              f"{cube.watermark['row_count']:,} sales in {elapsed:.2f}s → {CUBE_PATH}")
+        
+        for query_name in CUBE_REPORTS:
+            start = time.perf_counter()
+            df = cube.answer(query_name)
+            print(f"  ✓ {query_name}: {len(df)} rows in {(time.perf_counter() - start) * 1000:.1f} ms")
+    finally:
+        conn.close()
+
+if __name__ == '__main__':
+    main()
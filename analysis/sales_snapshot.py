@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+"""
+Columnar Sales Snapshot
+Exports the sales fact table as per-column .npy files and memory-maps them back for instant reloads
+"""
+
+import sqlite3
+import json
+import os
+import shutil
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from pathlib import Path
+
+DB_PATH = '/home/ubuntu/fmcg-healthcare-portfolio/data/fmcg_healthcare.db'
+SNAPSHOT_DIR = Path('/home/ubuntu/fmcg-healthcare-portfolio/data/sales_snapshot')
+METADATA_FILE = 'metadata.json'
+SNAPSHOT_VERSION = 1
+
+# Column name -> (SQL expression, dtype); sale_day is days since 1970-01-01
+SNAPSHOT_COLUMNS = {
+    'sale_id': ('sale_id', np.int32),
+    'product_id': ('product_id', np.int32),
+    'retailer_id': ('retailer_id', np.int32),
+    'sale_day': ("CAST(julianday(sale_date) - 2440587.5 AS INTEGER)", np.int32),
+    'quantity_sold': ('quantity_sold', np.int32),
+    'unit_price': ('unit_price', np.float32),
+    'total_amount': ('total_amount', np.float64),
+    'discount_percent': ('discount_percent', np.float32),
+}
+
+# Content checksum over every column consumers read, weighted by sale_id so that values moved between rows
+# also change it; count and max id alone miss UPDATEs of existing rows
+WATERMARK_SQL = """
+SELECT COUNT(*), MAX(sale_id), TOTAL(total_amount), TOTAL(quantity_sold),
+       TOTAL((sale_id % 9973 + 1) * (product_id + 3 * retailer_id + 5 * julianday(sale_date)
+             + 7 * quantity_sold + 11 * unit_price + 13 * total_amount + 17 * IFNULL(discount_percent, 0)))
+FROM sales
+"""
+
+def source_watermark(conn, through_sale_id=None):
+    """Identify the state of the sales table (or of its rows up to through_sale_id) a snapshot was taken from"""
+    sql, params = WATERMARK_SQL, ()
+    if through_sale_id is not None:
+        sql, params = sql + "WHERE sale_id <= ?", (through_sale_id,)
+    row_count, max_sale_id, amount, quantity, checksum = conn.execute(sql, params).fetchone()
+    return {'row_count': row_count, 'max_sale_id': max_sale_id, 'total_amount': amount,
+            'quantity_sold': quantity, 'checksum': checksum}
+
+def export_snapshot(db_path=DB_PATH, snapshot_dir=SNAPSHOT_DIR, chunk_size=200_000):
+    """Write the sales table as one memory-mappable .npy file per column"""
+    snapshot_dir = Path(snapshot_dir)
+    staging_dir = snapshot_dir.with_name(snapshot_dir.name + '.tmp')
+    if staging_dir.exists():
+        shutil.rmtree(staging_dir)
+    staging_dir.mkdir(parents=True)
+    
+    conn = sqlite3.connect(db_path)
+    try:
+        # Read inside one transaction so the watermark matches the exported rows
+        conn.execute("BEGIN")
+        watermark = source_watermark(conn)
+        row_count = watermark['row_count']
+        if watermark['max_sale_id'] is not None and watermark['max_sale_id'] > np.iinfo(np.int32).max:
+            raise ValueError("sale_id exceeds int32 range; snapshot layout needs int64 ids")
+        
+        columns = {
+            name: np.lib.format.open_memmap(staging_dir / f'{name}.npy', mode='w+',
+                                            dtype=dtype, shape=(row_count,))
+            for name, (_, dtype) in SNAPSHOT_COLUMNS.items()
+        }
+        
+        select = ', '.join(expr for expr, _ in SNAPSHOT_COLUMNS.values())
+        cursor = conn.execute(f"SELECT {select} FROM sales ORDER BY sale_id")
+        offset = 0
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            block = np.asarray(rows, dtype=np.float64)
+            for i, (name, (_, dtype)) in enumerate(SNAPSHOT_COLUMNS.items()):
+                # NULL or an unparseable date reads as NaN, which has no int32 value
+                missing = np.isnan(block[:, i])
+                if missing.any() and np.issubdtype(dtype, np.integer):
+                    raise ValueError(f"{int(missing.sum())} sales rows have no valid {name} (e.g. sale_id "
+                                     f"{int(block[missing, 0][0])}); fix them (data/validate_data.py) and re-export")
+                columns[name][offset:offset + len(rows)] = block[:, i]
+            offset += len(rows)
+        conn.execute("COMMIT")
+    finally:
+        conn.close()
+    
+    for array in columns.values():
+        array.flush()
+    del columns
+    
+    metadata = {
+        'version': SNAPSHOT_VERSION,
+        'created': datetime.now().isoformat(),
+        'source': str(db_path),
+        'rows': row_count,
+        'columns': {name: np.dtype(dtype).str for name, (_, dtype) in SNAPSHOT_COLUMNS.items()},
+        'day_epoch': '1970-01-01',
+        'watermark': watermark,
+    }
+    with open(staging_dir / METADATA_FILE, 'w') as f:
+        json.dump(metadata, f, indent=2)
+    
+    # Swap the finished snapshot in so readers never see a half-written one
+    if snapshot_dir.exists():
+        retired_dir = snapshot_dir.with_name(snapshot_dir.name + '.old')
+        if retired_dir.exists():
+            shutil.rmtree(retired_dir)
+        os.rename(snapshot_dir, retired_dir)
+        os.rename(staging_dir, snapshot_dir)
+        shutil.rmtree(retired_dir)
+    else:
+        os.rename(staging_dir, snapshot_dir)
+    
+    return metadata
+
+class SalesSnapshot:
+    """Zero-copy, read-only view of an exported sales snapshot"""
+    
+    def __init__(self, snapshot_dir=SNAPSHOT_DIR):
+        self.snapshot_dir = Path(snapshot_dir)
+        with open(self.snapshot_dir / METADATA_FILE) as f:
+            self.metadata = json.load(f)
+        if self.metadata.get('version') != SNAPSHOT_VERSION:
+            raise ValueError(f"Unsupported snapshot version: {self.metadata.get('version')}")
+        self._columns = {}
+    
+    def __len__(self):
+        return self.metadata['rows']
+    
+    def __getitem__(self, name):
+        """Return a column as a read-only memory-mapped array"""
+        if name not in self._columns:
+            if name not in self.metadata['columns']:
+                raise KeyError(name)
+            self._columns[name] = np.load(self.snapshot_dir / f'{name}.npy', mmap_mode='r')
+        return self._columns[name]
+    
+    @property
+    def columns(self):
+        return list(self.metadata['columns'])
+    
+    def dates(self):
+        """Return sale dates as datetime64[D]"""
+        return self['sale_day'].astype('datetime64[D]')
+    
+    def month_index(self):
+        """Return months since 1970-01 for every sale"""
+        return self.dates().astype('datetime64[M]').astype(np.int64)
+    
+    def is_current(self, conn):
+        """Check whether the source sales table has changed since the export"""
+        return source_watermark(conn) == self.metadata['watermark']
+    
+    def to_dataframe(self, columns=None):
+        """Build a DataFrame over the selected columns"""
+        return pd.DataFrame({name: self[name] for name in (columns or self.columns)}, copy=False)
+
+def monthly_sales(snapshot):
+    """Monthly totals shaped like predictive_analytics.load_monthly_data()"""
+    months = snapshot.month_index()
+    if len(months) == 0:
+        return pd.DataFrame(columns=['month', 'revenue', 'units_sold', 'transaction_count', 'avg_order_value'])
+    
+    first = months.min()
+    bucket = months - first
+    counts = np.bincount(bucket)
+    revenue = np.bincount(bucket, weights=snapshot['total_amount'])
+    units = np.bincount(bucket, weights=snapshot['quantity_sold'])
+    present = counts > 0
+    
+    df = pd.DataFrame({
+        'month': (np.flatnonzero(present) + first).astype('datetime64[M]').astype('datetime64[ns]'),
+        'revenue': revenue[present],
+        'units_sold': units[present].astype(np.int64),
+        'transaction_count': counts[present],
+        'avg_order_value': revenue[present] / counts[present],
+    })
+    return df
+
+def product_monthly_sales(snapshot, conn):
+    """Product x month totals shaped like predictive_analytics.load_product_monthly_data()"""
+    months = snapshot.month_index()
+    product_ids = np.asarray(snapshot['product_id'], dtype=np.int64)
+    if len(months) == 0:
+        return pd.DataFrame(columns=['product_id', 'product_name', 'category', 'month', 'units_sold', 'revenue'])
+    
+    first = months.min()
+    n_months = int(months.max() - first + 1)
+    cell = product_ids * n_months + (months - first)
+    cells, inverse = np.unique(cell, return_inverse=True)
+    units = np.bincount(inverse, weights=snapshot['quantity_sold'])
+    revenue = np.bincount(inverse, weights=snapshot['total_amount'])
+    
+    df = pd.DataFrame({
+        'product_id': cells // n_months,
+        'month': (cells % n_months + first).astype('datetime64[M]').astype('datetime64[ns]'),
+        'units_sold': units.astype(np.int64),
+        'revenue': revenue,
+    })
+    products = pd.read_sql_query("SELECT product_id, product_name, category FROM products", conn)
+    df = df.merge(products, on='product_id', how='inner')
+    return df[['product_id', 'product_name', 'category', 'month', 'units_sold', 'revenue']] \
+        .sort_values(['product_id', 'month']).reset_index(drop=True)
+
+def load_snapshot(db_path=DB_PATH, snapshot_dir=SNAPSHOT_DIR, refresh=True):
+    """Open the snapshot, re-exporting it first if it is missing or stale"""
+    snapshot_dir = Path(snapshot_dir)
+    if (snapshot_dir / METADATA_FILE).exists():
+        snapshot = SalesSnapshot(snapshot_dir)
+        if not refresh:
+            return snapshot
+        conn = sqlite3.connect(db_path)
+        try:
+            if snapshot.is_current(conn):
+                return snapshot
+        finally:
+            conn.close()
+    export_snapshot(db_path, snapshot_dir)
+    return SalesSnapshot(snapshot_dir)
+
+def main():
+    print("Exporting sales snapshot...")
+    start = datetime.now()
+    metadata = export_snapshot(DB_PATH, SNAPSHOT_DIR)
+    elapsed = (datetime.now() - start).total_seconds()
+    print(f"✓ {metadata['rows']:,} sales rows exported in {elapsed:.2f}s to {SNAPSHOT_DIR}")
+    
+    start = datetime.now()
+    snapshot = SalesSnapshot(SNAPSHOT_DIR)
+    monthly = monthly_sales(snapshot)
+    elapsed = (datetime.now() - start).total_seconds()
+    print(f"✓ Snapshot reloaded and aggregated to {len(monthly)} months in {elapsed * 1000:.1f} ms")
+
+if __name__ == '__main__':
+    main()
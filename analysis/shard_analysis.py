@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+Sharded SQL Analysis
+Runs the SQL reports across many regional database files: partial aggregation per shard, then an exact merge
+"""
+
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from execute_sql_analysis import SQL_QUERIES, SQLAnalyzer
+from partial_aggregates import PARTIAL_QUERIES, partial_queries, save_partials, load_partials, merged_cube
+from sales_cube import CUBE_SQL, CELL_DTYPES, CUBE_REPORTS
+from sales_snapshot import source_watermark
+
+DIMENSION_TABLES = ['manufacturers', 'products', 'distributors', 'retailers', 'customer_demographics']
+
+def split_database(db_path, out_dir):
+    """Split one database into a shard per distributor (dimensions copied to every shard)"""
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    source = sqlite3.connect(db_path)
+    schema = [(name, sql) for (name, sql) in source.execute(
+        "SELECT name, sql FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' AND sql IS NOT NULL")]
+    tables = {name for name, _ in schema}
+    distributor_ids = [row[0] for row in source.execute(
+        "SELECT DISTINCT COALESCE(distributor_id, 0) FROM retailers ORDER BY 1")]
+    source.close()
+    
+    shard_paths = []
+    for distributor_id in distributor_ids:
+        shard_path = out_dir / f'shard_distributor_{distributor_id}.db'
+        if shard_path.exists():
+            shard_path.unlink()
+        conn = sqlite3.connect(shard_path)
+        for _, sql in schema:
+            conn.execute(sql)
+        conn.execute("ATTACH DATABASE ? AS src", (str(db_path),))
+        with conn:
+            for table in DIMENSION_TABLES + (['date_dim'] if 'date_dim' in tables else []):
+                conn.execute(f"INSERT INTO main.{table} SELECT * FROM src.{table}")
+            retailers = "SELECT retailer_id FROM src.retailers WHERE COALESCE(distributor_id, 0) = ?"
+            conn.execute(f"INSERT INTO main.sales SELECT * FROM src.sales WHERE retailer_id IN ({retailers})",
+                         (distributor_id,))
+            conn.execute(f"INSERT INTO main.inventory SELECT * FROM src.inventory WHERE retailer_id IN ({retailers})",
+                         (distributor_id,))
+            conn.execute("INSERT INTO main.sales_by_customer SELECT * FROM src.sales_by_customer "
+                         "WHERE sale_id IN (SELECT sale_id FROM main.sales)")
+        conn.execute("DETACH DATABASE src")
+        conn.close()
+        shard_paths.append(shard_path)
+    return shard_paths
+
+def map_shard(shard_path, partial_dir, approximate=False):
+    """Compute one shard's cube cells and partial states and write them to partial_dir"""
+    queries = partial_queries(approximate)
+    start = time.perf_counter()
+    conn = sqlite3.connect(f'file:{shard_path}?mode=ro', uri=True)
+    try:
+        # One read transaction so every partial describes the same shard state
+        conn.execute("BEGIN")
+        watermark = source_watermark(conn)
+        cube_cells = pd.read_sql_query(CUBE_SQL, conn).astype(CELL_DTYPES)
+        partials = {name: query.run(conn) for name, query in queries.items()}
+        conn.execute("COMMIT")
+    finally:
+        conn.close()
+    
+    partial_path = Path(partial_dir) / f'{Path(shard_path).stem}.partial.npz'
+    save_partials(partial_path, cube_cells, partials,
+                  {'shard': str(shard_path), 'watermark': watermark, 'approximate': approximate}, queries)
+    return str(partial_path), time.perf_counter() - start
+
+def merge_reports(cube_cells, partials, dimension_conn, approximate=False, names=None):
+    """Finalize reports from cube cells and partial states gathered from any number of slices"""
+    names = names or [query_name for _, queries in SQL_QUERIES for query_name, _ in queries]
+    cube = merged_cube(cube_cells, dimension_conn) if any(name in CUBE_REPORTS for name in names) else None
+    results = {}
+    for query_name in names:
+        if query_name in CUBE_REPORTS:
+            results[query_name] = cube.answer(query_name)
+        else:
+            query = partial_queries(approximate)[query_name]
+            results[query_name] = query.finalize(query.merge(partials[query_name]))
+    return results
+
+def reduce_partials(partial_paths, dimension_db, approximate=None):
+    """Merge every shard's partial states into the full set of SQL reports
+    
+    Exact and sketch partials cannot be merged with each other. With approximate=None the mode is
+    taken from the partials' metadata; an explicit mode must match it. Returns the reports and the mode used.
+    """
+    cube_cells, partials = [], {name: [] for name in PARTIAL_QUERIES}
+    modes = {}
+    for path in partial_paths:
+        cells, shard_partials, metadata = load_partials(path)
+        modes.setdefault(bool(metadata.get('approximate', False)), []).append(Path(path).name)
+        cube_cells.append(cells)
+        for name, df in shard_partials.items():
+            partials[name].append(df)
+    if len(modes) > 1:
+        raise ValueError(f"Cannot merge exact partials ({', '.join(modes[False])}) with approximate "
+                         f"HyperLogLog partials ({', '.join(modes[True])}); re-run map with one setting")
+    mapped = next(iter(modes), False)
+    if approximate is not None and approximate != mapped:
+        raise ValueError(f"Partials were mapped {'with' if mapped else 'without'} --approximate; "
+                         f"reduce them {'with' if mapped else 'without'} it")
+    approximate = mapped
+    
+    conn = sqlite3.connect(dimension_db)
+    try:
+        return merge_reports(cube_cells, partials, conn, approximate), approximate
+    finally:
+        conn.close()
+
+class ShardedSQLAnalyzer:
+    """Fan-out counterpart of SQLAnalyzer over many shard databases"""
+    
+    def __init__(self, shard_paths, partial_dir=None, workers=None, approximate=False):
+        self.shard_paths = [str(p) for p in shard_paths]
+        self.partial_dir = partial_dir
+        self.approximate = approximate
+        self.workers = workers or min(len(self.shard_paths), os.cpu_count())
+        self.results = {}
+        self.failures = {}
+        self.timings = {}
+    
+    def run_all_queries(self):
+        """Map every shard in a process pool, then reduce into the report results"""
+        print(f"Executing SQL Analysis Queries across {len(self.shard_paths)} shards...\n")
+        with tempfile.TemporaryDirectory(prefix='fmcg_partials_') as tmp:
+            partial_dir = Path(self.partial_dir or tmp)
+            partial_dir.mkdir(parents=True, exist_ok=True)
+            
+            start = time.perf_counter()
+            with ProcessPoolExecutor(max_workers=self.workers) as pool:
+                mapped = list(pool.map(map_shard, self.shard_paths, [partial_dir] * len(self.shard_paths),
+                                       [self.approximate] * len(self.shard_paths)))
+            print(f"  → map: {len(mapped)} shards in {time.perf_counter() - start:.2f}s")
+            
+            start = time.perf_counter()
+            self.results, _ = reduce_partials([path for path, _ in mapped], self.shard_paths[0], self.approximate)
+            print(f"  → reduce: {len(self.results)} reports in {time.perf_counter() - start:.2f}s")
+        
+        for i, (section, queries) in enumerate(SQL_QUERIES):
+            print(("\n" if i else "") + section)
+            for query_name, _ in queries:
+                print(f"  ✓ {query_name}: {len(self.results[query_name])} rows")
+        
+        print("\n✓ All SQL queries executed successfully!")
+    
+    # Results have the same shape as SQLAnalyzer's, so exports are shared
+    export_results = SQLAnalyzer.export_results
+
+def main():
+    parser = argparse.ArgumentParser(description='Map-reduce SQL analysis across shard databases')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    
+    split = subparsers.add_parser('split', help='split a database into one shard per distributor')
+    split.add_argument('db')
+    split.add_argument('out_dir')
+    
+    map_cmd = subparsers.add_parser('map', help='write partial states for shards into a (shared) directory')
+    map_cmd.add_argument('shards', nargs='+')
+    map_cmd.add_argument('--partial-dir', required=True)
+    
+    reduce_cmd = subparsers.add_parser('reduce', help='merge partial states and export the reports')
+    reduce_cmd.add_argument('--partial-dir', required=True)
+    reduce_cmd.add_argument('--dimension-db', required=True, help='any shard, used for dimension lookups')
+    
+    run = subparsers.add_parser('run', help='map and reduce in one process pool')
+    run.add_argument('shards', nargs='+')
+    run.add_argument('--workers', type=int)
+    for command in (map_cmd, reduce_cmd, run):
+        command.add_argument('--approximate', action='store_true',
+                             help='HyperLogLog sketches instead of exact distinct id sets')
+    args = parser.parse_args()
+    
+    if args.command == 'split':
+        for path in split_database(args.db, args.out_dir):
+            print(f"  ✓ {path}")
+    elif args.command == 'map':
+        Path(args.partial_dir).mkdir(parents=True, exist_ok=True)
+        for shard in args.shards:
+            path, elapsed = map_shard(shard, args.partial_dir, args.approximate)
+            print(f"  ✓ {shard} → {path} ({elapsed:.2f}s)")
+    elif args.command == 'reduce':
+        # Without --approximate the mode recorded by map is used, and exported as the run's mode
+        analyzer = ShardedSQLAnalyzer([])
+        analyzer.results, analyzer.approximate = reduce_partials(
+            sorted(Path(args.partial_dir).glob('*.partial.npz')), args.dimension_db, args.approximate or None)
+        analyzer.export_results()
+    else:
+        analyzer = ShardedSQLAnalyzer(args.shards, workers=args.workers, approximate=args.approximate)
+        analyzer.run_all_queries()
+        analyzer.export_results()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Typed DataFrame Loading
+Loads query results with dictionary-encoded dimension columns and downcast key columns
+"""
+
+import sqlite3
+import pandas as pd
+from pathlib import Path
+
+DB_PATH = '/home/ubuntu/fmcg-healthcare-portfolio/data/fmcg_healthcare.db'
+
+# Low-cardinality string columns and the dimension tables that define their values
+DIMENSION_COLUMNS = {
+    'category': [('products', 'category')],
+    'subcategory': [('products', 'subcategory')],
+    'product_name': [('products', 'product_name')],
+    'manufacturer_name': [('manufacturers', 'manufacturer_name')],
+    'country': [('manufacturers', 'country')],
+    'distributor_name': [('distributors', 'distributor_name')],
+    'region': [('distributors', 'region')],
+    'retailer_name': [('retailers', 'retailer_name')],
+    'retailer_type': [('retailers', 'retailer_type')],
+    'city': [('retailers', 'city'), ('distributors', 'city'), ('customer_demographics', 'city')],
+    'state': [('retailers', 'state'), ('distributors', 'state')],
+    'age_group': [('customer_demographics', 'age_group')],
+    'gender': [('customer_demographics', 'gender')],
+    'income_level': [('customer_demographics', 'income_level')],
+    'health_condition': [('customer_demographics', 'health_condition')],
+}
+
+# Category dictionaries shared by every loader, keyed by database file and its mtime
+_DICTIONARY_CACHE = {}
+
+class CategoryDictionaries:
+    """Lazily loaded, cached category lists for the dimension columns of one database"""
+    
+    def __init__(self, conn):
+        self.conn = conn
+        self._categories = {}
+    
+    def get(self, column):
+        """Return the sorted category values for a dimension column"""
+        if column not in self._categories:
+            values = set()
+            for table, source_column in DIMENSION_COLUMNS[column]:
+                try:
+                    rows = self.conn.execute(
+                        f"SELECT DISTINCT {source_column} FROM {table} WHERE {source_column} IS NOT NULL"
+                    ).fetchall()
+                except sqlite3.OperationalError:
+                    continue
+                values.update(row[0] for row in rows)
+            self._categories[column] = pd.Index(sorted(values), dtype=object)
+        return self._categories[column]
+    
+    def dtype(self, column):
+        """Return a CategoricalDtype whose codes are stable across every query"""
+        return pd.CategoricalDtype(self.get(column))
+
+def get_category_dictionaries(conn):
+    """Return the shared dictionaries for the database behind a connection"""
+    db_file = conn.execute("PRAGMA database_list").fetchone()[2]
+    if not db_file:
+        # In-memory databases cannot be identified across connections
+        return CategoryDictionaries(conn)
+    
+    key = (db_file, Path(db_file).stat().st_mtime_ns)
+    dictionaries = _DICTIONARY_CACHE.get(key)
+    if dictionaries is None:
+        for stale in [k for k in _DICTIONARY_CACHE if k[0] == db_file]:
+            del _DICTIONARY_CACHE[stale]
+        dictionaries = CategoryDictionaries(conn)
+        _DICTIONARY_CACHE[key] = dictionaries
+    # Later lookups read through whichever connection is currently open
+    dictionaries.conn = conn
+    return dictionaries
+
+def _is_string_column(series):
+    """True for object or string-typed columns that are not yet categorical"""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return False
+    return series.dtype == object or pd.api.types.is_string_dtype(series.dtype)
+
+def _to_dictionary_categorical(series, dictionaries, column):
+    """Encode a string column against its shared dictionary"""
+    dtype = dictionaries.dtype(column)
+    encoded = series.astype(dtype)
+    if encoded.isna().sum() != series.isna().sum():
+        # Values missing from the dimension table keep their own, extended categories
+        extra = pd.Index(series.dropna().unique()).difference(dtype.categories)
+        encoded = series.astype(pd.CategoricalDtype(dtype.categories.append(extra)))
+    return encoded
+
+def _is_key_column(column):
+    """Identifier and code columns, which are compared and joined but never summed or scaled"""
+    return str(column).endswith(('_id', '_key'))
+
+def _downcast_numeric(series, column):
+    """Downcast integer key columns to the smallest type; measures keep int64/float64.
+    
+    Measures feed arithmetic (sums, scaling, differences), which wraps around or loses precision in
+    narrow dtypes, so only identifiers are narrowed.
+    """
+    if pd.api.types.is_integer_dtype(series) and not pd.api.types.is_bool_dtype(series) \
+            and _is_key_column(column):
+        return pd.to_numeric(series, downcast='integer')
+    return series
+
+def compact_dataframe(df, dictionaries=None):
+    """Dictionary-encode dimension columns and downcast key columns; return (df, report)"""
+    before = int(df.memory_usage(deep=True).sum())
+    compacted = {}
+    for column in df.columns:
+        series = df[column]
+        if dictionaries is not None and column in DIMENSION_COLUMNS and _is_string_column(series):
+            encoded = _to_dictionary_categorical(series, dictionaries, column)
+            # A short result would carry the whole dictionary; keep the strings unless encoding is smaller
+            if encoded.memory_usage(deep=True, index=False) < series.memory_usage(deep=True, index=False):
+                series = encoded
+            compacted[column] = series
+        else:
+            compacted[column] = _downcast_numeric(series, column)
+    result = pd.DataFrame(compacted, index=df.index)
+    after = int(result.memory_usage(deep=True).sum())
+    
+    report = {
+        'rows': len(df),
+        'bytes_before': before,
+        'bytes_after': after,
+        'bytes_saved': before - after,
+        'reduction_pct': round((before - after) * 100.0 / before, 2) if before else 0.0,
+    }
+    return result, report
+
+def read_sql_compact(query, conn, params=None):
+    """Run a query and return (compact DataFrame, memory report)"""
+    df = pd.read_sql_query(query, conn, params=params)
+    return compact_dataframe(df, get_category_dictionaries(conn))
+
+def format_memory_report(reports):
+    """Format per-query memory reports as printable lines"""
+    lines = []
+    total_before = total_after = 0
+    for name, report in reports.items():
+        total_before += report['bytes_before']
+        total_after += report['bytes_after']
+        lines.append(f"  {name:<40} {report['bytes_before'] / 1024:>10.1f} KB → "
+                     f"{report['bytes_after'] / 1024:>10.1f} KB ({report['reduction_pct']:.1f}% saved)")
+    if total_before:
+        lines.append(f"  {'TOTAL':<40} {total_before / 1024:>10.1f} KB → {total_after / 1024:>10.1f} KB "
+                     f"({(total_before - total_after) * 100.0 / total_before:.1f}% saved)")
+    return lines
+
+def main():
+    conn = sqlite3.connect(DB_PATH)
+    reports = {}
+    try:
+        from execute_sql_analysis import SQL_QUERIES
+        for _, queries in SQL_QUERIES:
+            for query_name, query in queries:
+                _, reports[query_name] = read_sql_compact(query, conn)
+    finally:
+        conn.close()
+    
+    print("Memory footprint of compact query results:")
+    for line in format_memory_report(reports):
+        print(line)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+"""
+Scale-Factor Benchmark Suite
+Times data generation, every named SQL query, every analysis method and every
+forecast function on synthetic databases generated at several scale factors
+"""
+
+import argparse
+import gc
+import inspect
+import json
+import os
+import platform
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+
+# Render charts off-screen; must be set before matplotlib is imported
+os.environ.setdefault('MPLBACKEND', 'Agg')
+
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_DIR / 'data'))
+sys.path.insert(0, str(PROJECT_DIR / 'analysis'))
+
+import generate_data
+import execute_sql_analysis
+import data_analysis
+import predictive_analytics
+import sales_cube
+
+BASELINE_DIR = PROJECT_DIR / 'benchmarks' / 'baselines'
+DEFAULT_SCALES = [1, 100]
+DEFAULT_THRESHOLD = 0.25
+
+# Metrics compared against the baseline; higher values are regressions
+TRACKED_METRICS = ['seconds', 'peak_memory_mb']
+
+# Absolute noise floors below which a regression is not reported
+NOISE_FLOOR = {'seconds': 0.005, 'peak_memory_mb': 1.0}
+
+class BenchmarkRunner:
+    def __init__(self, scales, repeat=3, work_dir=None):
+        self.scales = scales
+        self.repeat = repeat
+        self.work_dir = Path(work_dir) if work_dir else None
+        self.results = {}
+    
+    def measure(self, func, *args, **kwargs):
+        """Time a call over several repeats, then record its peak traced memory"""
+        timings = []
+        for _ in range(self.repeat):
+            gc.collect()
+            start = time.perf_counter()
+            func(*args, **kwargs)
+            timings.append(time.perf_counter() - start)
+        
+        # Separate traced run so tracemalloc overhead never skews the timings
+        gc.collect()
+        tracemalloc.start()
+        result = func(*args, **kwargs)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        
+        timings.sort()
+        return result, {
+            'seconds': timings[len(timings) // 2],
+            'min_seconds': timings[0],
+            'peak_memory_mb': peak / (1024 * 1024),
+        }
+    
+    def record(self, scale, case, metrics, rows):
+        """Store a benchmark case with its throughput in fact rows per second"""
+        metrics['rows'] = rows
+        metrics['rows_per_sec'] = rows / metrics['seconds'] if metrics['seconds'] > 0 else None
+        self.results.setdefault(str(scale), {})[case] = metrics
+        print(f"  {case:<55} {metrics['seconds'] * 1000:>10.1f} ms"
+              f" {metrics['peak_memory_mb']:>9.1f} MB")
+    
+    def bench_generation(self, scale, db_path):
+        """Generate the database for a scale factor and time it"""
+        start = time.perf_counter()
+        counts = generate_data.generate_database(db_path, scale=scale, verbose=False)
+        elapsed = time.perf_counter() - start
+        rows = sum(counts.values())
+        self.record(scale, 'generate/generate_database',
+                    {'seconds': elapsed, 'min_seconds': elapsed, 'peak_memory_mb': 0.0}, rows)
+        return counts['sales']
+    
+    def bench_sql_queries(self, scale, db_path, sales_rows):
+        """Time every named query in execute_sql_analysis"""
+        analyzer = execute_sql_analysis.SQLAnalyzer(db_path)
+        try:
+            for _, queries in execute_sql_analysis.SQL_QUERIES:
+                for query_name, query in queries:
+                    _, metrics = self.measure(self._quiet, analyzer.execute_query, query_name, query)
+                    self.record(scale, f'sql/{query_name}', metrics, sales_rows)
+        finally:
+            analyzer.close()
+    
+    def bench_cube(self, scale, db_path, sales_rows):
+        """Time cube materialization and every report answered from the cube"""
+        conn = sqlite3.connect(db_path)
+        try:
+            cube, metrics = self.measure(sales_cube.SalesCube.materialize, conn)
+            self.record(scale, 'cube/materialize', metrics, sales_rows)
+            cube.attach_dimensions(conn)
+            for query_name in sales_cube.CUBE_REPORTS:
+                _, metrics = self.measure(cube.answer, query_name)
+                self.record(scale, f'cube/{query_name}', metrics, sales_rows)
+        finally:
+            conn.close()
+    
+    def bench_analysis(self, scale, db_path, sales_rows, viz_dir):
+        """Time every analyze_* method of FMCGAnalyzer plus the statistical summary"""
+        data_analysis.VISUALIZATIONS_DIR = viz_dir
+        analyzer = data_analysis.FMCGAnalyzer(db_path)
+        methods = [name for name, _ in inspect.getmembers(data_analysis.FMCGAnalyzer, inspect.isfunction)
+                   if name.startswith('analyze_')]
+        methods.append('generate_statistical_summary')
+        try:
+            for name in methods:
+                _, metrics = self.measure(getattr(analyzer, name))
+                self.record(scale, f'analysis/{name}', metrics, sales_rows)
+        finally:
+            analyzer.conn.close()
+    
+    def bench_forecasting(self, scale, db_path, sales_rows):
+        """Time the data loaders and every forecast function"""
+        monthly_data, metrics = self.measure(predictive_analytics.load_monthly_data, db_path)
+        self.record(scale, 'forecast/load_monthly_data', metrics, sales_rows)
+        
+        product_data, metrics = self.measure(predictive_analytics.load_product_monthly_data, db_path)
+        self.record(scale, 'forecast/load_product_monthly_data', metrics, sales_rows)
+        
+        revenue_forecast, metrics = self.measure(predictive_analytics.forecast_revenue, monthly_data)
+        self.record(scale, 'forecast/forecast_revenue', metrics, sales_rows)
+        
+        _, metrics = self.measure(predictive_analytics.forecast_inventory_requirements,
+                                  monthly_data, product_data)
+        self.record(scale, 'forecast/forecast_inventory_requirements', metrics, sales_rows)
+        
+        _, metrics = self.measure(predictive_analytics.forecast_by_category, product_data)
+        self.record(scale, 'forecast/forecast_by_category', metrics, sales_rows)
+        
+        # calculate_quarterly_metrics adds a column, so hand it a fresh copy each call
+        _, metrics = self.measure(lambda: predictive_analytics.calculate_quarterly_metrics(
+            monthly_data.copy(), revenue_forecast))
+        self.record(scale, 'forecast/calculate_quarterly_metrics', metrics, sales_rows)
+    
+    def run(self):
+        """Run the full suite for every scale factor"""
+        with tempfile.TemporaryDirectory(prefix='fmcg_bench_', dir=self.work_dir) as tmp:
+            tmp = Path(tmp)
+            for scale in self.scales:
+                print(f"\nScale factor {scale}x ({generate_data.NUM_SALES * scale:,} sales)")
+                db_path = str(tmp / f'fmcg_healthcare_x{scale}.db')
+                viz_dir = tmp / f'visualizations_x{scale}'
+                viz_dir.mkdir()
+                
+                sales_rows = self.bench_generation(scale, db_path)
+                self.bench_sql_queries(scale, db_path, sales_rows)
+                self.bench_cube(scale, db_path, sales_rows)
+                self.bench_analysis(scale, db_path, sales_rows, viz_dir)
+                self.bench_forecasting(scale, db_path, sales_rows)
+                
+                os.remove(db_path)
+        return self.results
+    
+    @staticmethod
+    def _quiet(func, *args):
+        """Call a function with stdout suppressed"""
+        with open(os.devnull, 'w') as devnull:
+            stdout = sys.stdout
+            sys.stdout = devnull
+            try:
+                return func(*args)
+            finally:
+                sys.stdout = stdout
+
+def environment_info():
+    """Describe the machine so baselines are only compared like-for-like"""
+    return {
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'platform': platform.platform(),
+        'processor': platform.processor() or platform.machine(),
+        'cpu_count': os.cpu_count(),
+    }
+
+def save_baseline(results, path):
+    """Write benchmark results to a baseline file"""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump({
+            'created': datetime.now().isoformat(),
+            'environment': environment_info(),
+            'results': results,
+        }, f, indent=2)
+    print(f"\n✓ Baseline saved to {path}")
+
+def compare_to_baseline(results, path, threshold):
+    """Return the tracked metrics that regressed beyond the threshold"""
+    with open(path) as f:
+        baseline = json.load(f)
+    
+    if baseline.get('environment') != environment_info():
+        print("  ! Baseline was recorded on a different environment; comparison may be noisy")
+    
+    regressions = []
+    for scale, cases in results.items():
+        for case, metrics in cases.items():
+            previous = baseline['results'].get(scale, {}).get(case)
+            if previous is None:
+                continue
+            for metric in TRACKED_METRICS:
+                old, new = previous.get(metric), metrics.get(metric)
+                if not old or new is None or new - old < NOISE_FLOOR[metric]:
+                    continue
+                change = (new - old) / old
+                if change > threshold:
+                    regressions.append({
+                        'scale': scale,
+                        'case': case,
+                        'metric': metric,
+                        'baseline': old,
+                        'current': new,
+                        'change_pct': round(change * 100, 1),
+                    })
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description='FMCG Healthcare scale-factor benchmarks')
+    parser.add_argument('--scales', type=int, nargs='+', default=DEFAULT_SCALES,
+                        help='scale factors relative to the base 2000-sale dataset, e.g. 1 100 10000')
+    parser.add_argument('--repeat', type=int, default=3, help='timed repetitions per case')
+    parser.add_argument('--work-dir', help='directory for the temporary databases (default: system temp)')
+    parser.add_argument('--output', help='also write the raw results of this run to a JSON file')
+    parser.add_argument('--save-baseline', metavar='NAME',
+                        help='write the results to benchmarks/baselines/NAME.json')
+    parser.add_argument('--compare', metavar='NAME',
+                        help='compare against benchmarks/baselines/NAME.json and fail on regressions')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='allowed relative regression before failing (default: 0.25)')
+    args = parser.parse_args()
+    
+    runner = BenchmarkRunner(args.scales, repeat=args.repeat, work_dir=args.work_dir)
+    results = runner.run()
+    
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'environment': environment_info(), 'results': results}, f, indent=2)
+    
+    if args.save_baseline:
+        save_baseline(results, BASELINE_DIR / f'{args.save_baseline}.json')
+    
+    if args.compare:
+        print(f"\nComparing against baseline '{args.compare}' (threshold {args.threshold:.0%})...")
+        regressions = compare_to_baseline(results, BASELINE_DIR / f'{args.compare}.json', args.threshold)
+        for r in regressions:
+            print(f"  ✗ [{r['scale']}x] {r['case']} {r['metric']}: "
+                  f"{r['baseline']:.4g} → {r['current']:.4g} (+{r['change_pct']}%)")
+        if regressions:
+            print(f"\n✗ {len(regressions)} regression(s) beyond threshold")
+            return 1
+        print("  ✓ No regressions beyond threshold")
+    
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
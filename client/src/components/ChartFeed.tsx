@@ -0,0 +1,177 @@
+import { useEffect, useState } from 'react';
+import {
+  Area,
+  AreaChart,
+  Bar,
+  BarChart,
+  CartesianGrid,
+  Cell,
+  ComposedChart,
+  Line,
+  LineChart,
+  Pie,
+  PieChart,
+  Scatter,
+  ScatterChart,
+  XAxis,
+  YAxis,
+  ZAxis,
+} from 'recharts';
+import {
+  ChartConfig,
+  ChartContainer,
+  ChartLegend,
+  ChartLegendContent,
+  ChartTooltip,
+  ChartTooltipContent,
+} from '@/components/ui/chart';
+import {
+  loadChartData,
+  getPanelRows,
+  ChartDataFeed,
+  ChartPanelSpec,
+  ChartSpec,
+} from '@/lib/dashboardData';
+
+const COLORS = ['var(--chart-1)', 'var(--chart-2)', 'var(--chart-3)', 'var(--chart-4)', 'var(--chart-5)'];
+
+function panelConfig(panel: ChartPanelSpec): ChartConfig {
+  return Object.fromEntries(
+    panel.y.map((key, i) => [
+      key,
+      { label: panel.y.length > 1 ? key : panel.label ?? key, color: COLORS[(i + 1) % COLORS.length] },
+    ])
+  );
+}
+
+function PanelChart({ chart, panel }: { chart: ChartSpec; panel: ChartPanelSpec }) {
+  const rows = getPanelRows(chart, panel);
+  const config = panelConfig(panel);
+  const tooltip = <ChartTooltip content={<ChartTooltipContent />} />;
+  const legend = panel.y.length > 1 ? <ChartLegend content={<ChartLegendContent />} /> : null;
+
+  switch (panel.type) {
+    case 'pie':
+      return (
+        <ChartContainer config={config}>
+          <PieChart>
+            {tooltip}
+            <Pie data={rows} dataKey={panel.y[0]} nameKey={panel.x} outerRadius="80%">
+              {rows.map((_, i) => (
+                <Cell key={i} fill={COLORS[i % COLORS.length]} />
+              ))}
+            </Pie>
+          </PieChart>
+        </ChartContainer>
+      );
+    case 'scatter':
+      return (
+        <ChartContainer config={config}>
+          <ScatterChart>
+            <CartesianGrid />
+            <XAxis dataKey={panel.x} type="number" name={panel.x} />
+            <YAxis dataKey={panel.y[0]} type="number" name={panel.label ?? panel.y[0]} />
+            {panel.size && <ZAxis dataKey={panel.size} range={[40, 400]} name={panel.size} />}
+            {tooltip}
+            <Scatter data={rows} fill={COLORS[1]} fillOpacity={0.6} />
+          </ScatterChart>
+        </ChartContainer>
+      );
+    case 'line':
+    case 'area': {
+      const Chart = panel.type === 'area' ? AreaChart : LineChart;
+      return (
+        <ChartContainer config={config}>
+          <Chart data={rows}>
+            <CartesianGrid vertical={false} />
+            <XAxis dataKey={panel.x} />
+            <YAxis />
+            {tooltip}
+            {panel.y.map(key =>
+              panel.type === 'area' ? (
+                <Area key={key} dataKey={key} stroke={`var(--color-${key})`} fill={`var(--color-${key})`} fillOpacity={0.3} />
+              ) : (
+                <Line key={key} dataKey={key} stroke={`var(--color-${key})`} strokeWidth={2} />
+              )
+            )}
+          </Chart>
+        </ChartContainer>
+      );
+    }
+    case 'composed':
+      return (
+        <ChartContainer config={config}>
+          <ComposedChart data={rows}>
+            <CartesianGrid vertical={false} />
+            <XAxis dataKey={panel.x} />
+            <YAxis yAxisId="left" />
+            <YAxis yAxisId="right" orientation="right" />
+            {tooltip}
+            {legend}
+            {panel.y.map(key =>
+              key === panel.secondary ? (
+                <Line key={key} yAxisId="right" dataKey={key} stroke={`var(--color-${key})`} strokeWidth={2} />
+              ) : (
+                <Bar key={key} yAxisId="left" dataKey={key} fill={`var(--color-${key})`} />
+              )
+            )}
+          </ComposedChart>
+        </ChartContainer>
+      );
+    default:
+      return (
+        <ChartContainer config={config}>
+          <BarChart data={rows} layout={panel.horizontal ? 'vertical' : 'horizontal'}>
+            <CartesianGrid />
+            {panel.horizontal ? (
+              <>
+                <XAxis type="number" />
+                <YAxis type="category" dataKey={panel.x} width={140} />
+              </>
+            ) : (
+              <>
+                <XAxis dataKey={panel.x} />
+                <YAxis />
+              </>
+            )}
+            {tooltip}
+            {legend}
+            {panel.y.map(key => (
+              <Bar key={key} dataKey={key} fill={`var(--color-${key})`} radius={2} />
+            ))}
+          </BarChart>
+        </ChartContainer>
+      );
+  }
+}
+
+/**
+ * Draws an analysis chart from the chart data feed, falling back to the rendered PNG
+ */
+export default function ChartFeed({ chart, alt }: { chart: string; alt: string }) {
+  const [feed, setFeed] = useState<ChartDataFeed | null | undefined>(undefined);
+
+  useEffect(() => {
+    loadChartData().then(setFeed);
+  }, []);
+
+  if (feed === undefined) {
+    return <div className="w-full aspect-video animate-pulse rounded-lg bg-muted" />;
+  }
+
+  const spec = feed?.charts[chart];
+  if (!spec) {
+    return <img src={`/${chart}.png`} alt={alt} className="w-full h-auto rounded-lg" />;
+  }
+
+  return (
+    <div className="grid gap-6 md:grid-cols-2">
+      {spec.panels.map(panel => (
+        <div key={panel.title}>
+          <p className="mb-2 text-sm font-medium">{panel.title}</p>
+          <PanelChart chart={spec} panel={panel} />
+        </div>
+      ))}
+    </div>
+  );
+}
@@ -31,7 +31,34 @@ export interface AnalysisInsights {
   inventory_status: any[];
 }
 
+export type ChartColumns = Record<string, (string | number | null)[]>;
+
+export interface ChartPanelSpec {
+  title: string;
+  type: 'bar' | 'line' | 'area' | 'pie' | 'scatter' | 'composed';
+  x: string;
+  y: string[];
+  label?: string;
+  data?: ChartColumns;
+  horizontal?: boolean;
+  size?: string;
+  secondary?: string;
+  legend?: string;
+}
+
+export interface ChartSpec {
+  title: string;
+  data?: ChartColumns;
+  panels: ChartPanelSpec[];
+}
+
+export interface ChartDataFeed {
+  version: number;
+  charts: Record<string, ChartSpec>;
+}
+
 let cachedInsights: AnalysisInsights | null = null;
+let chartDataRequest: Promise<ChartDataFeed | null> | null = null;
 
 export async function loadAnalysisInsights(): Promise<AnalysisInsights> {
   if (cachedInsights) {
@@ -52,6 +79,33 @@ export async function loadAnalysisInsights(): Promise<AnalysisInsights> {
   }
 }
 
+/**
+ * Load the compact chart data feed written by data_analysis.py (chart_data.json).
+ * Resolves to null when the feed is not published, so charts fall back to their PNGs.
+ */
+export function loadChartData(): Promise<ChartDataFeed | null> {
+  if (!chartDataRequest) {
+    chartDataRequest = fetch('/chart_data.json')
+      .then(response => (response.ok ? response.json() : null))
+      .catch(error => {
+        console.error('Error loading chart data:', error);
+        return null;
+      });
+  }
+  return chartDataRequest;
+}
+
+/**
+ * Turn a panel's columnar data (or its chart's) into the row objects recharts expects
+ */
+export function getPanelRows(chart: ChartSpec, panel: ChartPanelSpec): Record<string, string | number | null>[] {
+  const columns = panel.data ?? chart.data ?? {};
+  const length = columns[panel.x]?.length ?? 0;
+  return Array.from({ length }, (_, i) =>
+    Object.fromEntries(Object.entries(columns).map(([name, values]) => [name, values[i]]))
+  );
+}
+
 export function getBusinessKPIs(insights: AnalysisInsights): KPI[] {
   const summary = insights.statistical_summary;
   
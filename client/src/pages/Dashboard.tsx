@@ -3,6 +3,7 @@ import { Card, CardContent, CardDescription, CardHeader, CardTitle } from '@/com
 import { Tabs, TabsContent, TabsList, TabsTrigger } from '@/components/ui/tabs';
 import { TrendingUp, TrendingDown, BarChart3, Users, Package, MapPin } from 'lucide-react';
 import Navigation from '@/components/Navigation';
+import ChartFeed from '@/components/ChartFeed';
 import {
   loadAnalysisInsights,
   getBusinessKPIs,
@@ -135,13 +136,7 @@ export default function Dashboard() {
                 <CardDescription>Revenue distribution across product categories</CardDescription>
               </CardHeader>
               <CardContent>
-                <div className="w-full">
-                  <img 
-                    src="/sales_by_category.png" 
-                    alt="Sales by Category" 
-                    className="w-full h-auto rounded-lg"
-                  />
-                </div>
+                <ChartFeed chart="sales_by_category" alt="Sales by Category" />
               </CardContent>
             </Card>
 
@@ -151,13 +146,7 @@ export default function Dashboard() {
                 <CardDescription>24-month revenue and transaction analysis</CardDescription>
               </CardHeader>
               <CardContent>
-                <div className="w-full">
-                  <img 
-                    src="/monthly_trends.png" 
-                    alt="Monthly Trends" 
-                    className="w-full h-auto rounded-lg"
-                  />
-                </div>
+                <ChartFeed chart="monthly_trends" alt="Monthly Trends" />
               </CardContent>
             </Card>
 
@@ -194,13 +183,7 @@ export default function Dashboard() {
                 <CardDescription>Best-performing products by revenue</CardDescription>
               </CardHeader>
               <CardContent>
-                <div className="w-full">
-                  <img 
-                    src="/top_products.png" 
-                    alt="Top Products" 
-                    className="w-full h-auto rounded-lg"
-                  />
-                </div>
+                <ChartFeed chart="top_products" alt="Top Products" />
               </CardContent>
             </Card>
 
@@ -235,13 +218,7 @@ export default function Dashboard() {
                 <CardDescription>Top retailers by revenue and efficiency</CardDescription>
               </CardHeader>
               <CardContent>
-                <div className="w-full">
-                  <img 
-                    src="/retailer_performance.png" 
-                    alt="Retailer Performance" 
-                    className="w-full h-auto rounded-lg"
-                  />
-                </div>
+                <ChartFeed chart="retailer_performance" alt="Retailer Performance" />
               </CardContent>
             </Card>
 
@@ -251,13 +228,7 @@ export default function Dashboard() {
                 <CardDescription>Sales performance by state</CardDescription>
               </CardHeader>
               <CardContent>
-                <div className="w-full">
-                  <img 
-                    src="/regional_sales.png" 
-                    alt="Regional Sales" 
-                    className="w-full h-auto rounded-lg"
-                  />
-                </div>
+                <ChartFeed chart="regional_sales" alt="Regional Sales" />
               </CardContent>
             </Card>
 
@@ -297,13 +268,7 @@ export default function Dashboard() {
                 <CardDescription>Customer segmentation and purchasing behavior</CardDescription>
               </CardHeader>
               <CardContent>
-                <div className="w-full">
-                  <img 
-                    src="/customer_demographics.png" 
-                    alt="Customer Demographics" 
-                    className="w-full h-auto rounded-lg"
-                  />
-                </div>
+                <ChartFeed chart="customer_demographics" alt="Customer Demographics" />
               </CardContent>
             </Card>
 
@@ -345,13 +310,7 @@ export default function Dashboard() {
                 <CardDescription>Current stock levels and reorder analysis</CardDescription>
               </CardHeader>
               <CardContent>
-                <div className="w-full">
-                  <img 
-                    src="/inventory_status.png" 
-                    alt="Inventory Status" 
-                    className="w-full h-auto rounded-lg"
-                  />
-                </div>
+                <ChartFeed chart="inventory_status" alt="Inventory Status" />
               </CardContent>
             </Card>
 
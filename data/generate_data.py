@@ -16,9 +16,13 @@ random.seed(42)
 # Database setup
 DB_PATH = '/home/ubuntu/fmcg-healthcare-portfolio/data/fmcg_healthcare.db'
 
-def create_database():
+# Base dataset size (scale factor 1)
+NUM_CUSTOMERS = 500
+NUM_SALES = 2000
+
+def create_database(db_path=DB_PATH):
     """Create SQLite database with FMCG Healthcare schema"""
-    conn = sqlite3.connect(DB_PATH)
+    conn = sqlite3.connect(db_path)
     cursor = conn.cursor()
     
     # Products table
@@ -224,7 +228,7 @@ def insert_retailers(cursor):
     VALUES (?, ?, ?, ?, ?, ?)
     ''', retailers)
 
-def insert_customer_demographics(cursor):
+def insert_customer_demographics(cursor, num_customers=NUM_CUSTOMERS):
     """Insert customer demographic data"""
     age_groups = ['18-25', '26-35', '36-45', '46-55', '56-65', '65+']
     genders = ['Male', 'Female']
@@ -232,42 +236,43 @@ def insert_customer_demographics(cursor):
     health_conditions = ['Diabetes', 'Hypertension', 'Asthma', 'Arthritis', 'None', 'Allergy', 'Thyroid']
     cities = ['Delhi', 'Mumbai', 'Bangalore', 'Hyderabad', 'Chennai', 'Kolkata', 'Pune', 'Ahmedabad', 'Jaipur', 'Lucknow']
     
-    customers = []
-    for i in range(1, 501):
-        customers.append((
+    # Rows are streamed into executemany so large scale factors stay memory-bounded
+    customers = (
+        (
             i,
             random.choice(age_groups),
             random.choice(genders),
             random.choice(income_levels),
             random.choice(health_conditions),
             random.choice(cities)
-        ))
+        )
+        for i in range(1, num_customers + 1)
+    )
     
     cursor.executemany('''
     INSERT INTO customer_demographics (customer_id, age_group, gender, income_level, health_condition, city)
     VALUES (?, ?, ?, ?, ?, ?)
     ''', customers)
 
-def insert_sales(cursor):
-    """Insert sales transaction data"""
-    sales = []
-    sale_id = 1
+def generate_sales_rows(num_sales=NUM_SALES):
+    """Yield sales transaction rows"""
     start_date = datetime(2023, 1, 1)
     
-    for _ in range(2000):
+    # Get unit price from products (we'll use a fixed mapping for simplicity)
+    unit_prices = {i: 100 + i*10 for i in range(1, 21)}
+    
+    for sale_id in range(1, num_sales + 1):
         product_id = random.randint(1, 20)
         retailer_id = random.randint(1, 15)
         sale_date = start_date + timedelta(days=random.randint(0, 730))
         quantity = random.randint(1, 50)
         
-        # Get unit price from products (we'll use a fixed mapping for simplicity)
-        unit_prices = {i: 100 + i*10 for i in range(1, 21)}
         unit_price = unit_prices[product_id]
         
         discount = random.choice([0, 0, 0, 5, 10, 15])
         total_amount = quantity * unit_price * (1 - discount/100)
         
-        sales.append((
+        yield (
             sale_id,
             product_id,
             retailer_id,
@@ -276,13 +281,14 @@ def insert_sales(cursor):
             unit_price,
             total_amount,
             discount
-        ))
-        sale_id += 1
-    
+        )
+
+def insert_sales(cursor, num_sales=NUM_SALES):
+    """Insert sales transaction data"""
     cursor.executemany('''
     INSERT INTO sales (sale_id, product_id, retailer_id, sale_date, quantity_sold, unit_price, total_amount, discount_percent)
     VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-    ''', sales)
+    ''', generate_sales_rows(num_sales))
 
 def insert_inventory(cursor):
     """Insert inventory data"""
@@ -306,74 +312,97 @@ def insert_inventory(cursor):
     VALUES (?, ?, ?, ?, ?, ?)
     ''', inventory)
 
-def insert_sales_by_customer(cursor):
-    """Insert customer-level sales data"""
-    sales_by_customer = []
+def generate_sales_by_customer_rows(num_sales=NUM_SALES, num_customers=NUM_CUSTOMERS):
+    """Yield customer-level sales rows"""
     trans_id = 1
     
-    for sale_id in range(1, 2001):
-        customer_id = random.randint(1, 500)
+    for sale_id in range(1, num_sales + 1):
+        customer_id = random.randint(1, num_customers)
         product_id = random.randint(1, 20)
         quantity = random.randint(1, 10)
         purchase_date = (datetime(2023, 1, 1) + timedelta(days=random.randint(0, 730))).strftime('%Y-%m-%d')
         
-        sales_by_customer.append((
+        yield (
             trans_id,
             sale_id,
             customer_id,
             product_id,
             quantity,
             purchase_date
-        ))
+        )
         trans_id += 1
-    
+
+def insert_sales_by_customer(cursor, num_sales=NUM_SALES, num_customers=NUM_CUSTOMERS):
+    """Insert customer-level sales data"""
     cursor.executemany('''
     INSERT INTO sales_by_customer (transaction_id, sale_id, customer_id, product_id, quantity, purchase_date)
     VALUES (?, ?, ?, ?, ?, ?)
-    ''', sales_by_customer)
+    ''', generate_sales_by_customer_rows(num_sales, num_customers))
 
-def main():
-    """Main function to generate dataset"""
-    print("Creating FMCG Healthcare database...")
-    conn, cursor = create_database()
+def generate_database(db_path=DB_PATH, scale=1, verbose=True):
+    """Generate the full dataset, with customers and sales multiplied by scale"""
+    log = print if verbose else (lambda *args, **kwargs: None)
+    
+    # Re-seed so every scale factor is reproducible on its own
+    random.seed(42)
+    num_customers = NUM_CUSTOMERS * scale
+    num_sales = NUM_SALES * scale
+    
+    log("Creating FMCG Healthcare database...")
+    conn, cursor = create_database(db_path)
     
-    print("Inserting manufacturers...")
+    log("Inserting manufacturers...")
     insert_manufacturers(cursor)
     
-    print("Inserting products...")
+    log("Inserting products...")
     insert_products(cursor)
     
-    print("Inserting distributors...")
+    log("Inserting distributors...")
     insert_distributors(cursor)
     
-    print("Inserting retailers...")
+    log("Inserting retailers...")
     insert_retailers(cursor)
     
-    print("Inserting customer demographics...")
-    insert_customer_demographics(cursor)
+    log("Inserting customer demographics...")
+    insert_customer_demographics(cursor, num_customers)
     
-    print("Inserting sales transactions...")
-    insert_sales(cursor)
+    log("Inserting sales transactions...")
+    insert_sales(cursor, num_sales)
     
-    print("Inserting inventory...")
+    log("Inserting inventory...")
     insert_inventory(cursor)
     
-    print("Inserting customer sales data...")
-    insert_sales_by_customer(cursor)
+    log("Inserting customer sales data...")
+    insert_sales_by_customer(cursor, num_sales, num_customers)
     
     conn.commit()
     conn.close()
     
+    return {
+        'manufacturers': 8,
+        'products': 20,
+        'distributors': 6,
+        'retailers': 15,
+        'customers': num_customers,
+        'sales': num_sales,
+        'inventory': 300,
+        'sales_by_customer': num_sales,
+    }
+
+def main():
+    """Main function to generate dataset"""
+    counts = generate_database(DB_PATH)
+    
     print(f"✓ Database created successfully at {DB_PATH}")
     print("✓ Total records inserted:")
-    print("  - 8 Manufacturers")
-    print("  - 20 Products")
-    print("  - 6 Distributors")
-    print("  - 15 Retailers")
-    print("  - 500 Customers")
-    print("  - 2000 Sales Transactions")
-    print("  - 300 Inventory Records")
-    print("  - 2000 Customer Sales Records")
+    print(f"  - {counts['manufacturers']} Manufacturers")
+    print(f"  - {counts['products']} Products")
+    print(f"  - {counts['distributors']} Distributors")
+    print(f"  - {counts['retailers']} Retailers")
+    print(f"  - {counts['customers']} Customers")
+    print(f"  - {counts['sales']} Sales Transactions")
+    print(f"  - {counts['inventory']} Inventory Records")
+    print(f"  - {counts['sales_by_customer']} Customer Sales Records")
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+"""
+Bulk Sales Ingestion
+Streams sales and customer-transaction extracts (CSV or Parquet) into the database in validated, resumable batches
+"""
+
+import argparse
+import os
+import sqlite3
+import time
+import numpy as np
+import pandas as pd
+from pathlib import Path
+
+try:
+    import pyarrow.parquet as pq
+except ImportError:
+    pq = None
+
+DB_PATH = '/home/ubuntu/fmcg-healthcare-portfolio/data/fmcg_healthcare.db'
+
+DEFAULT_CHUNK_SIZE = 100_000
+DEFAULT_COMMIT_ROWS = 500_000
+
+# Ingestible tables: column dtypes, dedupe key, foreign keys and row-level checks
+TABLE_SPECS = {
+    'sales': {
+        'columns': {
+            'sale_id': 'int',
+            'product_id': 'int',
+            'retailer_id': 'int',
+            'sale_date': 'date',
+            'quantity_sold': 'int',
+            'unit_price': 'float',
+            'total_amount': 'float',
+            'discount_percent': 'float',
+        },
+        'key': 'sale_id',
+        'foreign_keys': {'product_id': ('products', 'product_id'), 'retailer_id': ('retailers', 'retailer_id')},
+        'defaults': {'discount_percent': 0.0},
+        'date_keys': ('sale_date', 'day_key', 'month_key'),
+        'checks': {
+            'quantity_sold': lambda s: s > 0,
+            'unit_price': lambda s: s >= 0,
+            'total_amount': lambda s: s >= 0,
+            'discount_percent': lambda s: (s >= 0) & (s <= 100),
+        },
+    },
+    'sales_by_customer': {
+        'columns': {
+            'transaction_id': 'int',
+            'sale_id': 'int',
+            'customer_id': 'int',
+            'product_id': 'int',
+            'quantity': 'int',
+            'purchase_date': 'date',
+        },
+        'key': 'transaction_id',
+        'foreign_keys': {
+            'sale_id': ('sales', 'sale_id'),
+            'customer_id': ('customer_demographics', 'customer_id'),
+            'product_id': ('products', 'product_id'),
+        },
+        'defaults': {},
+        'date_keys': ('purchase_date', 'purchase_day_key', 'purchase_month_key'),
+        'checks': {'quantity': lambda s: s > 0},
+    },
+}
+
+# date_dim row for a date (?1), as built by analysis/date_keys.py. Its insert trigger skips rows that
+# arrive with their keys, so ingestion adds each batch's dates here instead.
+DATE_DIM_INSERT = """
+INSERT OR IGNORE INTO date_dim (day_key, date, month_key, month_label, year, quarter, month, day_of_week)
+VALUES (CAST(julianday(?1) - 2440587.5 AS INTEGER), ?1, CAST(strftime('%Y%m', ?1) AS INTEGER),
+        strftime('%Y-%m', ?1), CAST(strftime('%Y', ?1) AS INTEGER),
+        'Q' || ((CAST(strftime('%m', ?1) AS INTEGER) + 2) / 3), CAST(strftime('%m', ?1) AS INTEGER),
+        CAST(strftime('%w', ?1) AS INTEGER))
+"""
+
+CHECKPOINT_SCHEMA = """
+CREATE TABLE IF NOT EXISTS ingestion_checkpoints (
+    source TEXT PRIMARY KEY,
+    table_name TEXT NOT NULL,
+    rows_read INTEGER NOT NULL DEFAULT 0,
+    rows_inserted INTEGER NOT NULL DEFAULT 0,
+    rows_duplicate INTEGER NOT NULL DEFAULT 0,
+    rows_rejected INTEGER NOT NULL DEFAULT 0,
+    completed INTEGER NOT NULL DEFAULT 0,
+    updated_at TEXT
+)
+"""
+
+class DimensionIds:
+    """Sorted key arrays of referenced tables, loaded once and extended as rows are ingested"""
+    
+    def __init__(self, conn):
+        self.conn = conn
+        self._ids = {}
+    
+    def get(self, table, column):
+        if (table, column) not in self._ids:
+            ids = np.array([row[0] for row in self.conn.execute(f"SELECT {column} FROM {table}")], dtype=np.int64)
+            self._ids[(table, column)] = np.sort(ids)
+        return self._ids[(table, column)]
+    
+    def add(self, table, column, ids):
+        """Register keys inserted by this run so later files can reference them"""
+        if (table, column) in self._ids and len(ids):
+            self._ids[(table, column)] = np.union1d(self._ids[(table, column)], ids)
+    
+    def contains(self, table, column, values):
+        ids = self.get(table, column)
+        if len(ids) == 0:
+            return np.zeros(len(values), dtype=bool)
+        positions = np.searchsorted(ids, values).clip(max=len(ids) - 1)
+        return ids[positions] == values
+
+def read_chunks(path, chunk_size=DEFAULT_CHUNK_SIZE, skip_rows=0):
+    """Yield DataFrame chunks of a CSV or Parquet file, skipping rows already committed"""
+    path = Path(path)
+    if path.suffix.lower() in ('.parquet', '.pq'):
+        if pq is None:
+            raise ImportError("Parquet ingestion requires pyarrow (pip install pyarrow)")
+        parquet_file = pq.ParquetFile(path)
+        seen = 0
+        for batch in parquet_file.iter_batches(batch_size=chunk_size):
+            if seen + batch.num_rows <= skip_rows:
+                seen += batch.num_rows
+                continue
+            df = batch.to_pandas()
+            if seen < skip_rows:
+                df = df.iloc[skip_rows - seen:]
+            seen += batch.num_rows
+            yield df
+    else:
+        # skip_rows counts parsed records, so they are dropped after parsing: skipping physical lines would
+        # drift on blank lines and on quoted fields with embedded newlines
+        seen = 0
+        for df in pd.read_csv(path, chunksize=chunk_size, dtype=str, keep_default_na=True):
+            if seen + len(df) > skip_rows:
+                yield df.iloc[max(skip_rows - seen, 0):]
+            seen += len(df)
+
+def validate_chunk(df, spec, dimensions):
+    """Coerce types and check rows with vectorized masks; return (valid rows, rejected rows)"""
+    missing = [c for c in spec['columns'] if c not in df.columns and c not in spec['defaults']]
+    if missing:
+        raise ValueError(f"Input is missing required columns: {', '.join(missing)}")
+    
+    typed = {}
+    reason = pd.Series('', index=df.index, dtype=object)
+    for column, kind in spec['columns'].items():
+        raw = df[column] if column in df.columns else pd.Series(spec['defaults'][column], index=df.index)
+        if column in spec['defaults']:
+            raw = raw.fillna(spec['defaults'][column])
+        if kind == 'date':
+            parsed = pd.to_datetime(raw, format='%Y-%m-%d', errors='coerce')
+            value = parsed.dt.strftime('%Y-%m-%d')
+        else:
+            value = pd.to_numeric(raw, errors='coerce')
+            if kind == 'int':
+                value = value.where(value == value.round())
+        bad = value.isna()
+        reason = reason.mask(bad & (reason == ''), f'invalid {column}')
+        typed[column] = value
+    
+    for column, check in spec['checks'].items():
+        failed = ~check(typed[column]).fillna(False).astype(bool)
+        reason = reason.mask(failed & (reason == ''), f'out-of-range {column}')
+    
+    for column, (table, ref_column) in spec['foreign_keys'].items():
+        values = typed[column].fillna(-1).to_numpy(dtype=np.int64)
+        unknown = pd.Series(~dimensions.contains(table, ref_column, values), index=df.index)
+        reason = reason.mask(unknown & (reason == ''), f'unknown {column}')
+    
+    key = spec['key']
+    duplicate = typed[key].duplicated(keep='first') & (reason == '')
+    reason = reason.mask(duplicate, f'duplicate {key} in file')
+    
+    valid = reason == ''
+    rows = pd.DataFrame({c: typed[c][valid] for c in spec['columns']})
+    for column, kind in spec['columns'].items():
+        if kind == 'int':
+            rows[column] = rows[column].astype(np.int64)
+    rejects = df[~valid].assign(reject_reason=reason[~valid])
+    return rows, rejects
+
+def source_fingerprint(path):
+    """Identify an input file so a changed file is not resumed from a stale checkpoint"""
+    stat = os.stat(path)
+    return f"{Path(path).resolve()}:{stat.st_size}:{int(stat.st_mtime)}"
+
+def add_date_keys(rows, date_col, day_col, month_col):
+    """Fill the integer day/month keys added by analysis/date_keys.py (days since 1970, YYYYMM)"""
+    dates = pd.to_datetime(rows[date_col], format='%Y-%m-%d')
+    rows[day_col] = dates.to_numpy(dtype='datetime64[D]').astype(np.int64)
+    rows[month_col] = (dates.dt.year * 100 + dates.dt.month).astype(np.int64)
+    return rows
+
+def _insert_rows(conn, table, key, rows):
+    """Insert a validated chunk, skipping keys that already exist; return rows inserted
+    
+    Only conflicts on the key are skipped (OR IGNORE would also swallow NOT NULL and CHECK failures
+    and count them as duplicates); any other constraint failure aborts the batch.
+    """
+    columns = list(rows.columns)
+    placeholders = ', '.join('?' for _ in columns)
+    cursor = conn.executemany(f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders}) "
+                              f"ON CONFLICT({key}) DO NOTHING", rows.itertuples(index=False, name=None))
+    return max(cursor.rowcount, 0)
+
+def _write_rejects(reject_path, rejects):
+    """Append buffered rejects once the rows they came with are committed"""
+    if reject_path and rejects:
+        batch = pd.concat(rejects, ignore_index=True)
+        batch.to_csv(reject_path, mode='a', index=False, header=not Path(reject_path).exists())
+    rejects.clear()
+
+def _save_checkpoint(conn, source, table, stats, completed=False):
+    conn.execute("""
+        INSERT INTO ingestion_checkpoints
+            (source, table_name, rows_read, rows_inserted, rows_duplicate, rows_rejected, completed, updated_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, datetime('now'))
+        ON CONFLICT(source) DO UPDATE SET
+            rows_read = excluded.rows_read,
+            rows_inserted = excluded.rows_inserted,
+            rows_duplicate = excluded.rows_duplicate,
+            rows_rejected = excluded.rows_rejected,
+            completed = excluded.completed,
+            updated_at = excluded.updated_at
+    """, (source, table, stats['rows_read'], stats['rows_inserted'], stats['rows_duplicate'],
+          stats['rows_rejected'], int(completed)))
+
+def ingest_file(conn, path, table='sales', chunk_size=DEFAULT_CHUNK_SIZE, commit_rows=DEFAULT_COMMIT_ROWS,
+                dimensions=None, reject_path=None, verbose=True):
+    """Append one file to a table, committing in large batches and resuming after a crash"""
+    spec = TABLE_SPECS[table]
+    dimensions = dimensions or DimensionIds(conn)
+    conn.execute(CHECKPOINT_SCHEMA)
+    source = source_fingerprint(path)
+    table_columns = {r[1] for r in conn.execute(f"PRAGMA table_info({table})")}
+    date_keys = spec['date_keys'] if set(spec['date_keys'][1:]) <= table_columns else None
+    
+    row = conn.execute("SELECT rows_read, rows_inserted, rows_duplicate, rows_rejected, completed "
+                       "FROM ingestion_checkpoints WHERE source = ?", (source,)).fetchone()
+    stats = dict(zip(['rows_read', 'rows_inserted', 'rows_duplicate', 'rows_rejected'], row[:4])) if row else \
+        {'rows_read': 0, 'rows_inserted': 0, 'rows_duplicate': 0, 'rows_rejected': 0}
+    if row and row[4]:
+        if verbose:
+            print(f"  ✓ {path}: already ingested ({stats['rows_inserted']:,} rows)")
+        return dict(stats, rows_processed=0, seconds=0.0, rows_per_sec=None, resumed=True)
+    if row and verbose:
+        print(f"  → {path}: resuming after {stats['rows_read']:,} committed rows")
+    
+    start = time.perf_counter()
+    rows_this_run = 0
+    pending = 0
+    # Rejects of the open transaction; written only after it commits, so a resumed run does not repeat them
+    pending_rejects = []
+    conn.execute("BEGIN")
+    try:
+        for chunk in read_chunks(path, chunk_size, skip_rows=stats['rows_read']):
+            rows, rejects = validate_chunk(chunk, spec, dimensions)
+            if date_keys:
+                rows = add_date_keys(rows, *date_keys)
+                conn.executemany(DATE_DIM_INSERT, ((d,) for d in rows[date_keys[0]].unique()))
+            inserted = _insert_rows(conn, table, spec['key'], rows)
+            stats['rows_read'] += len(chunk)
+            stats['rows_inserted'] += inserted
+            stats['rows_duplicate'] += len(rows) - inserted
+            stats['rows_rejected'] += len(rejects)
+            rows_this_run += len(chunk)
+            pending += len(chunk)
+            dimensions.add(table, spec['key'], rows[spec['key']].to_numpy())
+            
+            if len(rejects) and reject_path:
+                pending_rejects.append(rejects)
+            
+            if pending >= commit_rows:
+                # The checkpoint commits atomically with the rows it describes
+                _save_checkpoint(conn, source, table, stats)
+                conn.execute("COMMIT")
+                _write_rejects(reject_path, pending_rejects)
+                conn.execute("BEGIN")
+                pending = 0
+        _save_checkpoint(conn, source, table, stats, completed=True)
+        conn.execute("COMMIT")
+        _write_rejects(reject_path, pending_rejects)
+    except BaseException:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        raise
+    
+    elapsed = time.perf_counter() - start
+    rate = rows_this_run / elapsed if elapsed > 0 else None
+    if verbose:
+        print(f"  ✓ {path}: {stats['rows_inserted']:,} inserted, {stats['rows_duplicate']:,} duplicates, "
+              f"{stats['rows_rejected']:,} rejected — {rows_this_run:,} rows in {elapsed:.2f}s"
+              + (f" ({rate:,.0f} rows/sec)" if rate else ""))
+    return dict(stats, rows_processed=rows_this_run, seconds=elapsed, rows_per_sec=rate, resumed=bool(row))
+
+def connect_for_ingestion(db_path=DB_PATH):
+    """Open the database with settings suited to large append batches"""
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute("PRAGMA cache_size = -262144")
+    conn.execute("PRAGMA temp_store = MEMORY")
+    return conn
+
+def main():
+    parser = argparse.ArgumentParser(description='Append sales or customer-transaction files to the database')
+    parser.add_argument('files', nargs='+', help='CSV or Parquet files with the target table\'s columns')
+    parser.add_argument('--table', choices=list(TABLE_SPECS), default='sales')
+    parser.add_argument('--db', default=DB_PATH, help='database to append to')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help='rows parsed and validated at once')
+    parser.add_argument('--commit-rows', type=int, default=DEFAULT_COMMIT_ROWS, help='rows per committed transaction')
+    parser.add_argument('--rejects', help='append rejected rows with their reason to this CSV')
+    args = parser.parse_args()
+    
+    conn = connect_for_ingestion(args.db)
+    dimensions = DimensionIds(conn)
+    print(f"Ingesting {len(args.files)} file(s) into {args.table}...")
+    totals = {'rows_processed': 0, 'rows_inserted': 0, 'seconds': 0.0}
+    try:
+        for path in args.files:
+            result = ingest_file(conn, path, args.table, args.chunk_size, args.commit_rows,
+                                 dimensions=dimensions, reject_path=args.rejects)
+            for key in totals:
+                totals[key] += result[key]
+    finally:
+        conn.close()
+    
+    if totals['seconds'] > 0:
+        print(f"\n✓ {totals['rows_inserted']:,} rows inserted at "
+              f"{totals['rows_processed'] / totals['seconds']:,.0f} rows/sec overall")
+
+if __name__ == '__main__':
+    main()
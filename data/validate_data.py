@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+"""
+Data Quality Validation
+Checks the fact tables in chunked, vectorized passes: arithmetic invariants, value ranges, foreign keys, date
+ranges and duplicates. Writes a compact violation report and exits non-zero when errors are found
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from ingest_sales import TABLE_SPECS, DimensionIds
+
+DB_PATH = '/home/ubuntu/fmcg-healthcare-portfolio/data/fmcg_healthcare.db'
+REPORT_PATH = Path('/home/ubuntu/fmcg-healthcare-portfolio/data/data_quality_report.json')
+
+CHUNK_ROWS = 500_000
+SAMPLE_KEYS = 5
+MIN_DATE = '2000-01-01'
+# total_amount must equal quantity * unit_price * (1 - discount / 100) to within a cent (stored as REAL)
+AMOUNT_TOLERANCE = 0.01
+PRICE_TOLERANCE = 0.005
+
+# Checks reported as warnings; every other check is an error. --strict makes warnings fatal too.
+#   unit_price_mismatch   sale price differs from the product's list price (the generator prices by id)
+#   duplicate_row         identical rows under different keys, e.g. a file ingested twice under new ids
+WARNINGS = {'unit_price_mismatch', 'duplicate_row'}
+
+# Per table: key, the columns read (dates come back as a day number and an ISO-format flag, NULL when
+# unparseable), the date column, and the columns that define a duplicate
+TABLES = {
+    'sales': {
+        'key': 'sale_id',
+        'columns': ['sale_id', 'product_id', 'retailer_id', 'sale_date', 'quantity_sold', 'unit_price',
+                    'total_amount', 'discount_percent'],
+        'date': 'sale_date',
+        'duplicate': ['product_id', 'retailer_id', 'sale_date', 'quantity_sold', 'unit_price', 'total_amount',
+                      'discount_percent'],
+    },
+    'sales_by_customer': {
+        'key': 'transaction_id',
+        'columns': ['transaction_id', 'sale_id', 'customer_id', 'product_id', 'quantity', 'purchase_date'],
+        'date': 'purchase_date',
+        'duplicate': ['sale_id', 'customer_id', 'product_id', 'quantity', 'purchase_date'],
+    },
+    'inventory': {
+        'key': 'inventory_id',
+        'columns': ['inventory_id', 'product_id', 'retailer_id', 'stock_quantity', 'reorder_level',
+                    'last_updated'],
+        'date': 'last_updated',
+        # One stock row per product and retailer
+        'duplicate': ['product_id', 'retailer_id'],
+        'duplicate_check': 'duplicate_stock_row',
+    },
+}
+
+INVENTORY_SPEC = {
+    'foreign_keys': {'product_id': ('products', 'product_id'), 'retailer_id': ('retailers', 'retailer_id')},
+    'checks': {
+        'stock_quantity': lambda s: s >= 0,
+        'reorder_level': lambda s: s >= 0,
+    },
+}
+
+def _read_only(db_path):
+    return sqlite3.connect(f'file:{Path(db_path).resolve()}?mode=ro', uri=True)
+
+def _select_sql(table, first, last):
+    spec = TABLES[table]
+    columns = []
+    for column in spec['columns']:
+        if column == spec['date']:
+            columns += [f"CAST(julianday({column}) - 2440587.5 AS INTEGER) as {column}",
+                        # date() passes '2024-02-30' through unchanged; '+0 days' normalizes it to 2024-03-01
+                        f"date({column}, '+0 days') IS {column} as {column}_iso"]
+        else:
+            columns.append(column)
+    return (f"SELECT {', '.join(columns)} FROM {table} WHERE {spec['key']} BETWEEN {int(first)} AND {int(last)} "
+            f"ORDER BY {spec['key']}")
+
+def _day(value):
+    return int(np.datetime64(value, 'D').astype(np.int64))
+
+class ListPrices:
+    """Product list prices as sorted arrays for vectorized lookup"""
+    
+    def __init__(self, conn):
+        rows = conn.execute("SELECT product_id, unit_price FROM products ORDER BY product_id").fetchall()
+        self.ids = np.array([r[0] for r in rows], dtype=np.int64)
+        self.prices = np.array([r[1] for r in rows], dtype=np.float64)
+    
+    def lookup(self, product_ids):
+        if not len(self.ids):
+            return np.full(len(product_ids), np.nan)
+        pos = np.searchsorted(self.ids, product_ids).clip(max=len(self.ids) - 1)
+        return np.where(self.ids[pos] == product_ids, self.prices[pos], np.nan)
+
+def check_chunk(table, chunk, dimensions, prices, min_day, max_day):
+    """Boolean violation masks for one chunk, by check name"""
+    spec = TABLES[table]
+    rules = TABLE_SPECS.get(table, INVENTORY_SPEC)
+    masks = {}
+    for column, check in rules['checks'].items():
+        values = chunk[column].to_numpy(dtype=np.float64)
+        masks[f'out_of_range_{column}'] = np.isnan(values) | ~check(values)
+    for column, (ref_table, ref_column) in rules['foreign_keys'].items():
+        values = chunk[column].fillna(-1).to_numpy().astype(np.int64)
+        masks[f'unknown_{column}'] = ~dimensions.contains(ref_table, ref_column, values)
+    
+    days = chunk[spec['date']].to_numpy(dtype=np.float64)
+    iso = chunk[f"{spec['date']}_iso"].fillna(0).to_numpy(dtype=bool)
+    masks[f'invalid_{spec["date"]}'] = np.isnan(days) | ~iso
+    masks[f'{spec["date"]}_out_of_range'] = ~np.isnan(days) & ((days < min_day) | (days > max_day))
+    
+    if table == 'sales':
+        quantity = chunk['quantity_sold'].to_numpy(dtype=np.float64)
+        price = chunk['unit_price'].to_numpy(dtype=np.float64)
+        discount = chunk['discount_percent'].fillna(0).to_numpy(dtype=np.float64)
+        expected = quantity * price * (1 - discount / 100)
+        masks['total_amount_mismatch'] = ~(np.abs(chunk['total_amount'].to_numpy(dtype=np.float64) - expected)
+                                           <= AMOUNT_TOLERANCE)
+        list_price = prices.lookup(chunk['product_id'].fillna(-1).to_numpy().astype(np.int64))
+        # Unknown products are already reported by the foreign-key check
+        masks['unit_price_mismatch'] = ~np.isnan(list_price) & (np.abs(price - list_price) > PRICE_TOLERANCE)
+    return masks
+
+class Violations:
+    """Violation counts and a few example keys per check"""
+    
+    def __init__(self):
+        self.counts = {}
+        self.samples = {}
+    
+    def add(self, check, keys):
+        self.counts[check] = self.counts.get(check, 0) + len(keys)
+        samples = self.samples.setdefault(check, [])
+        if len(samples) < SAMPLE_KEYS:
+            samples.extend(int(k) for k in keys[:SAMPLE_KEYS - len(samples)])
+    
+    def merge(self, other):
+        for check, count in other.counts.items():
+            self.counts[check] = self.counts.get(check, 0) + count
+            samples = self.samples.setdefault(check, [])
+            samples.extend(other.samples[check][:SAMPLE_KEYS - len(samples)])
+    
+    def report(self):
+        return {check: {'severity': 'warning' if check in WARNINGS else 'error', 'violations': count,
+                        'examples': self.samples[check]} for check, count in sorted(self.counts.items())}
+
+def _duplicates(hashes, keys):
+    """Keys of every row whose content hash was already seen under a smaller key"""
+    if not hashes:
+        return np.empty(0, dtype=np.int64)
+    hashes, keys = np.concatenate(hashes), np.concatenate(keys)
+    order = np.lexsort((keys, hashes))
+    hashes, keys = hashes[order], keys[order]
+    repeated = np.r_[False, hashes[1:] == hashes[:-1]]
+    return np.sort(keys[repeated])
+
+def scan_range(db_path, table, first, last, min_day, max_day, chunk_rows=CHUNK_ROWS, duplicates=True):
+    """Check one inclusive key range over its own read-only connection.
+    
+    Returns the violations, the row count and, for the duplicate pass, 64-bit content hashes with their keys
+    (16 bytes per row rather than the rows themselves).
+    """
+    spec = TABLES[table]
+    violations = Violations()
+    hashes, keys = [], []
+    rows = 0
+    conn = _read_only(db_path)
+    try:
+        dimensions, prices = DimensionIds(conn), ListPrices(conn)
+        cursor = conn.execute(_select_sql(table, first, last))
+        names = [d[0] for d in cursor.description]
+        while True:
+            batch = cursor.fetchmany(chunk_rows)
+            if not batch:
+                break
+            # One float64 array per column (NULL becomes NaN); far cheaper than DataFrame.from_records
+            chunk = pd.DataFrame({name: np.array(values, dtype=np.float64)
+                                  for name, values in zip(names, zip(*batch))})
+            chunk_keys = chunk[spec['key']].to_numpy(dtype=np.int64)
+            for check, mask in check_chunk(table, chunk, dimensions, prices, min_day, max_day).items():
+                violations.add(check, chunk_keys[mask])
+            if duplicates:
+                hashes.append(pd.util.hash_pandas_object(chunk[spec['duplicate']], index=False).to_numpy())
+                keys.append(chunk_keys)
+            rows += len(chunk)
+    finally:
+        conn.close()
+    return violations, rows, hashes, keys
+
+def key_ranges(conn, table, after_key, parts):
+    """Up to `parts` equal-width inclusive key ranges covering the rows after after_key"""
+    key = TABLES[table]['key']
+    low, high = conn.execute(f"SELECT MIN({key}), MAX({key}) FROM {table} "
+                             f"WHERE {key} > ?", (-1 if after_key is None else int(after_key),)).fetchone()
+    if low is None:
+        return []
+    bounds = np.unique(np.linspace(low, high + 1, parts + 1).round().astype(np.int64))
+    return [(int(bounds[i]), int(bounds[i + 1]) - 1) for i in range(len(bounds) - 1)]
+
+def validate_table(db_path, table, min_day, max_day, after_key=None, chunk_rows=CHUNK_ROWS, duplicates=True,
+                   workers=1):
+    """Validate a table across key ranges (one process each when workers > 1); returns its report entry"""
+    spec = TABLES[table]
+    conn = _read_only(db_path)
+    try:
+        ranges = key_ranges(conn, table, after_key, workers)
+    finally:
+        conn.close()
+    count = len(ranges)
+    args = ([db_path] * count, [table] * count, [first for first, _ in ranges], [last for _, last in ranges],
+            [min_day] * count, [max_day] * count, [chunk_rows] * count, [duplicates] * count)
+    if workers > 1 and count > 1:
+        with ProcessPoolExecutor(max_workers=count) as pool:
+            scanned = list(pool.map(scan_range, *args))
+    else:
+        scanned = list(map(scan_range, *args))
+    
+    # Ranges are in key order, so merging keeps the smallest example keys
+    violations = Violations()
+    for part, _, _, _ in scanned:
+        violations.merge(part)
+    if duplicates:
+        violations.add(spec.get('duplicate_check', 'duplicate_row'),
+                       _duplicates([h for _, _, hashes, _ in scanned for h in hashes],
+                                   [k for _, _, _, keys in scanned for k in keys]))
+    return {'rows': sum(rows for _, rows, _, _ in scanned), 'after_key': after_key,
+            'max_key': ranges[-1][1] if ranges else after_key, 'checks': violations.report()}
+
+def validate(db_path, tables=tuple(TABLES), min_date=MIN_DATE, max_date=None, previous=None, chunk_rows=CHUNK_ROWS,
+             duplicates=True, workers=1):
+    """Validate the fact tables; with a previous report, only rows added after its max keys"""
+    max_date = max_date or date.today().isoformat()
+    report = {'checked_at': pd.Timestamp.now().isoformat(timespec='seconds'), 'date_range': [min_date, max_date],
+              'incremental': previous is not None, 'tables': {}}
+    for table in tables:
+        start = time.perf_counter()
+        after_key = (previous or {}).get('tables', {}).get(table, {}).get('max_key')
+        entry = validate_table(db_path, table, _day(min_date), _day(max_date), after_key, chunk_rows, duplicates,
+                               workers)
+        entry['seconds'] = round(time.perf_counter() - start, 3)
+        report['tables'][table] = entry
+    return report
+
+def failed_checks(report, strict=False):
+    return [(table, check) for table, entry in report['tables'].items()
+            for check, result in entry['checks'].items()
+            if result['violations'] and (strict or result['severity'] == 'error')]
+
+def main():
+    parser = argparse.ArgumentParser(description='Validate the sales fact tables')
+    parser.add_argument('--db', default=DB_PATH)
+    parser.add_argument('--tables', nargs='+', choices=list(TABLES), default=list(TABLES))
+    parser.add_argument('--min-date', default=MIN_DATE)
+    parser.add_argument('--max-date', help='latest valid date (default: today)')
+    parser.add_argument('--incremental', action='store_true',
+                        help='check only rows added since the last report (duplicates among the new rows only)')
+    parser.add_argument('--no-duplicates', action='store_true', help='skip the duplicate-row checks')
+    parser.add_argument('--strict', action='store_true', help='fail on warnings as well as errors')
+    parser.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS)
+    parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                        help='processes, each checking one key range (default: all cores)')
+    parser.add_argument('--report', type=Path, default=REPORT_PATH)
+    args = parser.parse_args()
+    
+    previous = json.loads(args.report.read_text()) if args.incremental and args.report.exists() else None
+    report = validate(args.db, args.tables, args.min_date, args.max_date, previous, args.chunk_rows,
+                      not args.no_duplicates, args.workers)
+    failures = failed_checks(report, args.strict)
+    report['status'] = 'failed' if failures else 'passed'
+    args.report.write_text(json.dumps(report, indent=2))
+    
+    for table, entry in report['tables'].items():
+        rate = entry['rows'] / entry['seconds'] if entry['seconds'] else 0
+        print(f"{table}: {entry['rows']:,} rows in {entry['seconds']:.2f}s ({rate:,.0f} rows/sec)")
+        for check, result in entry['checks'].items():
+            if not result['violations']:
+                continue
+            mark = '✗' if (table, check) in failures else '⚠'
+            print(f"  {mark} {check}: {result['violations']:,} ({result['severity']}; "
+                  f"e.g. {', '.join(map(str, result['examples']))})")
+    print(f"\n{'✗ Validation failed' if failures else '✓ Validation passed'}; report saved to {args.report}")
+    sys.exit(1 if failures else 0)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,340 @@
+#!/usr/bin/env python3
+"""
+Pipeline Orchestrator
+Runs generate → SQL → analysis → forecast as a dependency graph, skipping stages
+whose code and input tables are unchanged and running independent stages in parallel
+"""
+
+import argparse
+import ast
+import hashlib
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from datetime import datetime
+from pathlib import Path
+
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+PORTFOLIO_DIR = Path('/home/ubuntu/fmcg-healthcare-portfolio')
+DB_PATH = PORTFOLIO_DIR / 'data' / 'fmcg_healthcare.db'
+STATE_PATH = PORTFOLIO_DIR / 'analysis' / '.pipeline_state.json'
+LOG_DIR = PORTFOLIO_DIR / 'analysis' / 'pipeline_logs'
+
+# Stages: script (relative to the project), upstream stages, the tables each one reads
+# and the artifacts it writes (globs relative to the portfolio directory). A source stage
+# builds its outputs from scratch, so it only runs when they are missing or when forced
+# (otherwise a generator edit would wipe ingested data). Stages that write to the database
+# (writes_db) run alone: readers holding it open would otherwise make their commits fail as locked
+STAGES = {
+    'generate': {
+        'script': 'data/generate_data.py',
+        'after': [],
+        'tables': [],
+        'outputs': ['data/fmcg_healthcare.db'],
+        'source': True,
+        'writes_db': True,
+    },
+    'sql': {
+        'script': 'analysis/execute_sql_analysis.py',
+        'after': ['generate'],
+        'tables': ['manufacturers', 'products', 'distributors', 'retailers', 'customer_demographics',
+                   'sales', 'inventory', 'sales_by_customer', 'date_dim'],
+        'outputs': ['analysis/sql_results/*.csv', 'analysis/sql_results/*.json'],
+    },
+    'analysis': {
+        'script': 'analysis/data_analysis.py',
+        'after': ['generate'],
+        'tables': ['products', 'retailers', 'customer_demographics', 'sales', 'inventory', 'sales_by_customer'],
+        'outputs': ['analysis/visualizations/*.png', 'analysis/analysis_insights.json', 'analysis/chart_data.json'],
+    },
+    'forecast': {
+        'script': 'analysis/predictive_analytics.py',
+        'after': ['generate'],
+        'tables': ['products', 'sales', 'date_dim'],
+        'outputs': ['analysis/forecast_report.json'],
+    },
+    'customers': {
+        'script': 'analysis/customer_analytics.py',
+        'after': ['generate'],
+        'tables': ['sales', 'sales_by_customer', 'customer_demographics'],
+        'outputs': ['analysis/customer_analytics.json'],
+        'writes_db': True,
+    },
+    'elasticity': {
+        'script': 'analysis/price_elasticity.py',
+        'after': ['generate'],
+        'tables': ['products', 'retailers', 'distributors', 'sales'],
+        'outputs': ['analysis/price_elasticity.csv'],
+    },
+    'anomalies': {
+        'script': 'analysis/anomaly_detection.py',
+        'after': ['generate'],
+        'tables': ['sales'],
+        'outputs': ['data/anomaly_state.npz'],
+        'writes_db': True,
+    },
+    'validate': {
+        'script': 'data/validate_data.py',
+        'after': ['generate'],
+        'tables': ['products', 'retailers', 'customer_demographics', 'sales', 'sales_by_customer', 'inventory'],
+        'outputs': ['data/data_quality_report.json'],
+    },
+}
+
+def local_modules(script):
+    """The script plus every sibling module it imports, followed transitively"""
+    script = Path(script)
+    seen, pending = set(), [script]
+    while pending:
+        path = pending.pop()
+        if path in seen:
+            continue
+        seen.add(path)
+        for node in ast.walk(ast.parse(path.read_text())):
+            if isinstance(node, ast.Import):
+                names = [alias.name for alias in node.names]
+            elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+                names = [node.module]
+            else:
+                continue
+            for name in names:
+                candidate = script.parent / f"{name.split('.')[0]}.py"
+                if candidate.exists():
+                    pending.append(candidate)
+    return sorted(seen)
+
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def _db_stat(db_path):
+    """Cheap change detector for the database file, including its WAL"""
+    stat = []
+    for path in (Path(db_path), Path(f'{db_path}-wal')):
+        if path.exists():
+            s = path.stat()
+            stat += [s.st_size, s.st_mtime_ns]
+    return stat
+
+class TableDigests:
+    """Per-table change markers, recomputed only when the database file has changed
+    
+    A marker is the row count, the largest key, per-column totals and one key-weighted total over
+    all columns (text by length and first and last characters, dates as day numbers), taken in a single
+    aggregate scan. That is far cheaper than hashing every row while still catching appends, deletes
+    and edits of existing rows.
+    """
+    
+    def __init__(self, db_path, cache=None):
+        self.db_path = db_path
+        self.cache = cache or {'stat': None, 'tables': {}}
+    
+    def get(self, tables):
+        stat = _db_stat(self.db_path)
+        if not stat:
+            return None
+        if stat != self.cache['stat']:
+            self.cache = {'stat': stat, 'tables': {}}
+        missing = [t for t in tables if t not in self.cache['tables']]
+        if missing:
+            conn = sqlite3.connect(f'file:{Path(self.db_path).resolve()}?mode=ro', uri=True)
+            try:
+                conn.execute("BEGIN")
+                for table in missing:
+                    self.cache['tables'][table] = self._digest(conn, table)
+                conn.execute("COMMIT")
+            finally:
+                conn.close()
+        return {t: self.cache['tables'][t] for t in tables}
+    
+    @staticmethod
+    def _marker_sql(conn, table, schema):
+        columns = conn.execute(f"PRAGMA table_info({table})").fetchall()
+        if 'WITHOUT ROWID' in schema.upper():
+            key = ' + '.join(name for _, name, _, _, _, pk in sorted(columns, key=lambda c: c[5]) if pk)
+        else:
+            key = 'rowid'
+        values = []
+        for _, name, declared, _, _, _ in columns:
+            declared = (declared or '').upper()
+            if any(t in declared for t in ('CHAR', 'TEXT', 'CLOB')):
+                value = f"length({name}) + 3 * unicode({name}) + 5 * unicode(substr({name}, -1))"
+            elif 'DATE' in declared or 'TIME' in declared:
+                value = f"julianday({name})"
+            else:
+                value = name
+            values.append(f"IFNULL({value}, 0)")
+        # Weighting by key also catches values moved between rows, which per-column totals miss
+        weighted = ' + '.join(f"{2 * i + 3} * {value}" for i, value in enumerate(values))
+        totals = ', '.join(f"TOTAL({value})" for value in values)
+        return f"SELECT COUNT(*), MAX({key}), {totals}, TOTAL(({key} % 9973 + 1) * ({weighted})) FROM {table}"
+    
+    @classmethod
+    def _digest(cls, conn, table):
+        schema = conn.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?",
+                              (table,)).fetchone()
+        if schema is None:
+            return None
+        marker = conn.execute(cls._marker_sql(conn, table, schema[0])).fetchone()
+        return hashlib.sha256(f"{schema[0]}\n{marker!r}".encode()).hexdigest()
+
+def outputs_present(spec):
+    return all(any(PORTFOLIO_DIR.glob(pattern)) for pattern in spec['outputs'])
+
+def _changed(old, new):
+    return sorted(k for k in new if (old or {}).get(k) != new[k])
+
+class Pipeline:
+    def __init__(self, stages=STAGES, state_path=STATE_PATH, jobs=None, force=(), dry_run=False):
+        self.stages = stages
+        self.state_path = Path(state_path)
+        self.jobs = jobs or len(stages)
+        self.force = set(stages) if 'all' in force else set(force)
+        self.dry_run = dry_run
+        self.state = json.loads(self.state_path.read_text()) if self.state_path.exists() else {}
+        self.digests = TableDigests(DB_PATH, self.state.get('_db'))
+        self.summary = {}
+    
+    def fingerprint(self, name):
+        """Digests of the stage's code and of the tables it reads"""
+        spec = self.stages[name]
+        code = {str(p.relative_to(PROJECT_DIR)): file_digest(p)
+                for p in local_modules(PROJECT_DIR / spec['script'])}
+        tables = self.digests.get(spec['tables']) if spec['tables'] else {}
+        return {'code': code, 'tables': tables or {}}
+    
+    def plan(self, name):
+        """Return (fingerprint, reason to run or None to skip)"""
+        fingerprint = self.fingerprint(name)
+        previous = self.state.get(name)
+        if name in self.force:
+            return fingerprint, 'forced'
+        if self.stages[name].get('source'):
+            return fingerprint, None if outputs_present(self.stages[name]) else 'outputs missing'
+        if previous is None:
+            return fingerprint, 'never run'
+        code = _changed(previous['fingerprint']['code'], fingerprint['code'])
+        if code:
+            return fingerprint, f"code changed: {', '.join(code)}"
+        tables = _changed(previous['fingerprint']['tables'], fingerprint['tables'])
+        if tables:
+            return fingerprint, f"data changed: {', '.join(tables)}"
+        if not outputs_present(self.stages[name]):
+            return fingerprint, 'outputs missing'
+        return fingerprint, None
+    
+    def run_stage(self, name):
+        """Run one stage's script in its own process, logging its output"""
+        spec = self.stages[name]
+        script = PROJECT_DIR / spec['script']
+        if spec.get('source'):
+            for pattern in spec['outputs']:
+                for path in PORTFOLIO_DIR.glob(pattern):
+                    path.unlink()
+        LOG_DIR.mkdir(parents=True, exist_ok=True)
+        env = dict(os.environ, MPLBACKEND='Agg')
+        start = time.perf_counter()
+        with open(LOG_DIR / f'{name}.log', 'w') as log:
+            result = subprocess.run([sys.executable, str(script)], cwd=script.parent, env=env,
+                                    stdout=log, stderr=subprocess.STDOUT)
+        return result.returncode, time.perf_counter() - start
+    
+    def _save_state(self):
+        self.state['_db'] = self.digests.cache
+        self.state_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.state_path.with_suffix('.tmp')
+        tmp.write_text(json.dumps(self.state, indent=2))
+        tmp.replace(self.state_path)
+    
+    def _finish(self, name, status, **info):
+        self.summary[name] = dict(info, status=status)
+        detail = info.get('reason') or ''
+        seconds = f" ({info['seconds']:.1f}s)" if 'seconds' in info else ''
+        marker = {'ran': '✓', 'skipped': '→', 'planned': '→'}.get(status, '✗')
+        print(f"  {marker} {name}: {status}{seconds}" + (f" — {detail}" if detail else ""))
+    
+    def run(self):
+        """Run the stages in dependency order, launching every ready stage concurrently"""
+        pending = dict(self.stages)
+        running = {}
+        with ThreadPoolExecutor(max_workers=self.jobs) as pool:
+            while pending or running:
+                # Database writers run alone; a ready writer goes first and holds back new readers
+                writer_running = any(self.stages[n].get('writes_db') for n, _, _ in running.values())
+                writer_waiting = False
+                for name, spec in sorted(pending.items(), key=lambda item: not item[1].get('writes_db')):
+                    upstream = [self.summary.get(u, {}).get('status') for u in spec['after']]
+                    if any(s in ('failed', 'blocked') for s in upstream):
+                        del pending[name]
+                        self._finish(name, 'blocked', reason='upstream stage failed')
+                        continue
+                    if not all(s in ('ran', 'skipped', 'planned') for s in upstream):
+                        continue
+                    if writer_running or writer_waiting or (spec.get('writes_db') and running):
+                        writer_waiting = writer_waiting or bool(spec.get('writes_db'))
+                        continue
+                    del pending[name]
+                    if self.dry_run and 'planned' in upstream:
+                        self._finish(name, 'planned', reason='after upstream stages')
+                        continue
+                    fingerprint, reason = self.plan(name)
+                    if reason is None:
+                        self._finish(name, 'skipped', reason='inputs unchanged')
+                    elif self.dry_run:
+                        self._finish(name, 'planned', reason=reason)
+                    else:
+                        print(f"  → {name}: running ({reason})")
+                        running[pool.submit(self.run_stage, name)] = (name, fingerprint, reason)
+                        writer_running = writer_running or bool(spec.get('writes_db'))
+                
+                if not running:
+                    continue
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name, fingerprint, reason = running.pop(future)
+                    returncode, seconds = future.result()
+                    if returncode != 0:
+                        self._finish(name, 'failed', seconds=seconds,
+                                     reason=f"exit code {returncode}, see {LOG_DIR / f'{name}.log'}")
+                        continue
+                    self.state[name] = {
+                        'fingerprint': fingerprint,
+                        'seconds': round(seconds, 3),
+                        'finished_at': datetime.now().isoformat(timespec='seconds'),
+                    }
+                    self._save_state()
+                    self._finish(name, 'ran', seconds=seconds, reason=reason)
+        return self.summary
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the FMCG pipeline, skipping stages whose inputs are unchanged')
+    parser.add_argument('--force', nargs='+', default=[], choices=list(STAGES) + ['all'],
+                        help='stages to re-run regardless of their fingerprints')
+    parser.add_argument('--jobs', type=int, help='maximum stages running at once (default: all ready stages)')
+    parser.add_argument('--dry-run', action='store_true', help='show which stages would run')
+    args = parser.parse_args()
+    
+    print("Running FMCG pipeline...\n")
+    start = time.perf_counter()
+    summary = Pipeline(jobs=args.jobs, force=args.force, dry_run=args.dry_run).run()
+    
+    statuses = [info['status'] for info in summary.values()]
+    failed = [name for name, info in summary.items() if info['status'] in ('failed', 'blocked')]
+    if args.dry_run:
+        print(f"\n→ {statuses.count('planned')} stages would run, {statuses.count('skipped')} skipped")
+    else:
+        print(f"\n✓ {statuses.count('ran')} stages ran, {statuses.count('skipped')} skipped "
+              f"in {time.perf_counter() - start:.1f}s")
+    if failed:
+        print(f"✗ Not completed: {', '.join(failed)}")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,5 @@
 import express from "express";
+import fs from "fs";
 import { createServer } from "http";
 import path from "path";
 import { fileURLToPath } from "url";
@@ -6,6 +7,21 @@ import { fileURLToPath } from "url";
 const __filename = fileURLToPath(import.meta.url);
 const __dirname = path.dirname(__filename);
 
+// Accept-Encoding as coding -> q-value; "br;q=0" means the client refuses br
+function parseAcceptEncoding(header: string | undefined): Map<string, number> {
+  const accepted = new Map<string, number>();
+  for (const part of (header ?? "").split(",")) {
+    const [coding, ...params] = part
+      .split(";")
+      .map(p => p.trim().toLowerCase());
+    if (!coding) continue;
+    const q = params.find(p => p.startsWith("q="));
+    const quality = q === undefined ? 1 : Number(q.slice(2));
+    accepted.set(coding, Number.isFinite(quality) ? quality : 0);
+  }
+  return accepted;
+}
+
 async function startServer() {
   const app = express();
   const server = createServer(app);
@@ -16,6 +32,34 @@ async function startServer() {
       ? path.resolve(__dirname, "public")
       : path.resolve(__dirname, "..", "dist", "public");
 
+  // Serve the pre-compressed .br/.gz copies written by analysis/json_output.py
+  app.get("*.json", (req, res, next) => {
+    const accepted = parseAcceptEncoding(req.headers["accept-encoding"]);
+    const candidates = [
+      { encoding: "br", ext: ".br" },
+      { encoding: "gzip", ext: ".gz" },
+    ]
+      .map(c => ({
+        ...c,
+        q: accepted.get(c.encoding) ?? accepted.get("*") ?? 0,
+      }))
+      .filter(c => c.q > 0)
+      .sort((a, b) => b.q - a.q);
+    for (const { encoding, ext } of candidates) {
+      const file = path.join(staticPath, req.path + ext);
+      if (!file.startsWith(staticPath + path.sep)) break;
+      if (fs.existsSync(file)) {
+        res.set({
+          "Content-Encoding": encoding,
+          "Content-Type": "application/json",
+          Vary: "Accept-Encoding",
+        });
+        return res.sendFile(file);
+      }
+    }
+    next();
+  });
+
   app.use(express.static(staticPath));
 
   // Handle client-side routing - serve index.html for all routes
@@ -184,5 +184,9 @@ export default defineConfig({
       strict: true,
       deny: ["**/.*"],
     },
+    // analysis/api_server.py
+    proxy: {
+      "/api": "http://127.0.0.1:8000",
+    },
   },
 });